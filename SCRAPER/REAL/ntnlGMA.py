@@ -1,117 +1,66 @@
-import time
-import requests
-import csv
-from selenium import webdriver
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
-from bs4 import BeautifulSoup
-
-base_url = "https://www.gmanetwork.com/news/archives/news-nation/"
-num_articles_to_scrape = 80000  
-scraped_urls = set()  
-
-driver = webdriver.Chrome()
-driver.get(base_url)
-
-# Initialize soup_base with the initial page source before the loop starts
-initial_page_source = driver.page_source
-soup_base = BeautifulSoup(initial_page_source, 'html.parser')
-
-# Open a CSV file to store the scraped data
+import os
+import sys
+from dataclasses import replace
+
+# Make the shared helpers in SCRAPER/scraper importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scraper.engine import CrawlSettings, run
+from scraper.sites import SITES
+
+# GMA national news archive: listing, selectors, label and year window live in scraper/sites.py
+site = SITES['gma-nation']
+num_articles_to_scrape = 80000
+# Define the path for the output CSV file
 csv_file_path = 'gma_nation.csv'
-with open(csv_file_path, 'w', encoding='utf-8-sig', newline='') as csv_file:
-    csv_writer = csv.writer(csv_file)
-    csv_writer.writerow(['label', 'article'])  
-
-    articles_scraped = 0
-    
-    stop_global_scraping = False 
-
-    while articles_scraped < num_articles_to_scrape and not stop_global_scraping:
-        print(f"Scraping from the main page... Articles scraped so far: {articles_scraped}")
-
-        # Get the number of articles before the scroll
-        initial_article_count = len(soup_base.find_all('li', class_='story left-grid'))
-
-        # Scroll down to the bottom of the page
-        driver.find_element("tag name", 'body').send_keys(Keys.END)
-
-        try:
-            WebDriverWait(driver, 20).until(
-                lambda driver: len(BeautifulSoup(driver.page_source, 'html.parser').find_all('li', class_='story left-grid')) > initial_article_count
-            )
-        except TimeoutException:
-            print("Timeout occurred. No new content was loaded after 20 seconds. Exiting scrolling loop.")
-            break
-        
-        time.sleep(2)  
-
-        updated_page_source = driver.page_source
-        soup_base = BeautifulSoup(updated_page_source, 'html.parser')
-
-        list_items = soup_base.find_all('li', class_='story left-grid')
-        
-        for list_item in list_items:
-            if stop_global_scraping:
-                break
-
-            try:
-                anchor_tag = list_item.find('a', class_='story_link story')
-                if anchor_tag: 
-                    article_link = anchor_tag['href']
-                    
-                    if article_link in scraped_urls:
-                        continue
-                    
-                    scraped_urls.add(article_link)
-                    
-                    print(f"Checking article link: {article_link}")
-
-                    response_article = requests.get(article_link, allow_redirects=True)
-                    if response_article.status_code == 200:
-                        soup_article = BeautifulSoup(response_article.text, 'html.parser')
-                        
-                        time_element = soup_article.find('time')
-                        if time_element:
-                            article_date_text = time_element.get_text()
-                            
-                            # Check if the date is from 2024 or 2025
-                            if '2024' in article_date_text or '2025' in article_date_text:
-                                article_content_div = soup_article.find('div', class_='story_main') 
-                                
-                                if article_content_div:
-                                    # Extract the text from all <p> elements
-                                    paragraphs = article_content_div.find_all('p')
-                                    content_text = ' '.join([p.get_text().strip() for p in paragraphs])
-                                    
-                                    # Write the scraped data to the CSV file
-                                    csv_writer.writerow(['1', content_text])
-                                    articles_scraped += 1
-                                    print(f"Scraped Article {articles_scraped}: {article_link}")
-
-                                    if articles_scraped >= num_articles_to_scrape:
-                                        stop_global_scraping = True 
-                                        break 
-                                else:
-                                    print(f"Skipped article without content: {article_link}")
-                            else:
-                                print(f"Found an article with date not in 2024/2025: {article_date_text}")
-                                print("Stopping the entire scraping process as per instruction.")
-                                stop_global_scraping = True 
-                                break 
-                        else:
-                            print(f"Skipped article, no <time> element found: {article_link}")
-                    else:
-                        print(f"Failed to retrieve article. Status code: {response_article.status_code}")
-            except Exception as e:
-                print(f"An error occurred while processing an article: {e}")
-        
-        if stop_global_scraping:
-            break
-
-print(f"\nScraping finished. {articles_scraped} articles have been saved to {csv_file_path}")
-
-driver.quit()
\ No newline at end of file
+# Also write the rows, with url, source, date and extraction version columns, as a
+# Parquet and/or Arrow dataset next to the CSV: ('csv', 'parquet'), ('csv', 'arrow'), ...
+output_formats = ('csv',)
+# 'http' reads the listing directly and only starts Chrome if it fails; 'selenium' always uses Chrome
+discovery_mode = 'http'
+# Number of article pages fetched at the same time, in total and per host
+fetch_concurrency = 8
+per_host_limit = 8
+# Requests per second to each site; robots.txt Crawl-delay and throttling responses lower it
+requests_per_second = 4
+# HTML parser for article pages: 'html.parser', 'lxml' or 'selectolax'
+parser_backend = 'lxml'
+# Worker processes that parse article pages while the fetchers keep downloading; 0 parses inline
+parse_workers = os.cpu_count() or 1
+# SQLite file recording which articles are done, so an interrupted run can pick up where it stopped
+state_path = 'crawl_state.sqlite'
+# Compressed copy of every fetched article page, so `python -m scraper reextract` can rebuild
+# the CSV after an extractor fix without crawling again; None keeps no copy
+archive_dir = 'html_archive'
+# Append to the existing CSV and skip finished articles instead of starting over
+resume = True
+# Only pick up stories published since the last run: start from the first listing page,
+# request pages seen before conditionally and stop at the first article already saved
+incremental = False
+# 'DEBUG' prints a line for every article as before; 'INFO' only what ends or summarises the crawl
+log_level = 'INFO'
+# Serve live crawl metrics on http://127.0.0.1:<port>/metrics (Prometheus) and /metrics.json; None is off
+metrics_port = None
+
+
+def main():
+    settings = CrawlSettings(
+        discovery_mode=discovery_mode,
+        fetch_concurrency=fetch_concurrency,
+        per_host_limit=per_host_limit,
+        requests_per_second=requests_per_second,
+        parser_backend=parser_backend,
+        parse_workers=parse_workers,
+        state_path=state_path,
+        archive_dir=archive_dir,
+        output_formats=output_formats,
+        resume=resume,
+        incremental=incremental,
+        log_level=log_level,
+        metrics_port=metrics_port,
+    )
+    run([replace(site, output=csv_file_path, max_articles=num_articles_to_scrape)], settings)
+
+
+# Guarded so the parser worker processes can import this file without starting a crawl
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Throughput of the Tsek claim stage, in documents per second.
+
+Reports, over the Tsek fixtures (recorded pages, else synthetic ones):
+
+* ``page``: ``extract_tsek`` one page at a time, parse and rules together;
+* ``parse``: ``read_tsek_page`` alone;
+* ``rules``: ``claim_texts`` over the parsed pages, in batches;
+* ``clean``: ``clean_text`` over the extracted articles, as ``claims --csv`` does;
+* ``pool``: parse on a ``ParsePool`` of ``--workers`` processes plus the
+  batched rules, as ``claims --archive`` does.
+
+    python bench/bench_claims.py --documents 2000 --workers 4
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench.fixtures import load_fixtures
+from scraper.claims import DEFAULT_BATCH_SIZE, claim_texts, clean_text, read_tsek_page
+from scraper.extractors import extract_tsek
+from scraper.fetch import FetchResult
+from scraper.parsing import BACKENDS
+from scraper.pipeline import ParsePool
+
+
+def _rate(documents, started):
+    return documents / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--backend', choices=BACKENDS, default='lxml')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    fixtures = [html for _, html in load_fixtures('tsek', synthetic_count=50)]
+    pages = [fixtures[number % len(fixtures)] for number in range(args.documents)]
+    rates = {}
+
+    started = time.perf_counter()
+    for html in pages:
+        extract_tsek(html, backend=args.backend)
+    rates['page'] = _rate(len(pages), started)
+
+    started = time.perf_counter()
+    parsed = [read_tsek_page(html, backend=args.backend) for html in pages]
+    rates['parse'] = _rate(len(pages), started)
+
+    started = time.perf_counter()
+    extracted = []
+    for start in range(0, len(parsed), args.batch_size):
+        extracted += claim_texts(parsed[start:start + args.batch_size])
+    rates['rules'] = _rate(len(parsed), started)
+
+    started = time.perf_counter()
+    for text, _ in extracted:
+        clean_text(text)
+    rates['clean'] = _rate(len(extracted), started)
+
+    results = [FetchResult(f'https://tsek.ph/{number}/', 200, html) for number, html in enumerate(pages)]
+    started = time.perf_counter()
+    with ParsePool(read_tsek_page, workers=args.workers, backend=args.backend) as parse_pool:
+        batch = []
+        for _, page in parse_pool.parse(results):
+            batch.append(page)
+            if len(batch) >= args.batch_size:
+                claim_texts(batch)
+                batch = []
+        claim_texts(batch)
+    rates['pool'] = _rate(len(results), started)
+
+    print(f"{len(pages)} documents, backend {args.backend}, batches of {args.batch_size}, {args.workers} workers")
+    for stage, rate in rates.items():
+        print(f"{stage:<6} {rate:>12.0f} documents/sec")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""End-to-end crawl benchmark against a local replay of the sites.
+
+Serves the recorded (or synthetic) listing and article pages of the chosen
+sources from ``MockSite``, with injected latency and 503s, and runs the real
+crawl engine against it: discovery, politeness, fetching, extraction on the
+parser processes and CSV output. Reports articles/sec, p50/p99 fetch+parse
+latency per article, CPU time (crawler plus parser processes) and peak RSS.
+The crawl runs in its own process so CPU and memory figures only cover it.
+
+Save a run and compare a later one against it, e.g. before and after a
+change to concurrency or the parser:
+
+    python bench/bench_crawl.py --articles 400 --latency 0.02 --save before.json
+    python bench/bench_crawl.py --articles 400 --latency 0.02 --backend selectolax --baseline before.json
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import replace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench.fixtures import SOURCES, listing_path, site_pages
+from bench.mock_server import MockSite
+from scraper.engine import CrawlSettings, run
+from scraper.metrics import Metrics
+from scraper.parsing import BACKENDS
+from scraper.sites import SITES
+
+COLUMNS = ('articles', 'seconds', 'articles_per_sec', 'p50_ms', 'p99_ms', 'cpu_seconds', 'peak_rss_mib')
+
+
+def _rusage_peak_mib(who):
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def worker(config):
+    """Crawl the mock site described by ``config`` and print one JSON line of results."""
+    specs = [replace(SITES[source], listing_url=config['base_url'] + listing_path(source), max_articles=None)
+             for source in config['sources']]
+    metrics = Metrics()
+    with tempfile.TemporaryDirectory() as scratch:
+        settings = CrawlSettings(
+            fetch_concurrency=config['concurrency'],
+            per_host_limit=config['per_host'],
+            adaptive_concurrency=not config['fixed_concurrency'],
+            hedge_requests=not config['no_hedge'],
+            requests_per_second=config['rate'],
+            parser_backend=config['backend'],
+            parse_workers=config['parse_workers'],
+            state_path=os.path.join(scratch, 'state.sqlite'),
+            resume=False,
+            output_dir=scratch,
+            archive_dir=os.path.join(scratch, 'archive') if config['archive'] else None,
+            log_level='WARNING',
+            progress=False,
+        )
+        started = time.perf_counter()
+        written = run(specs, settings, metrics)
+        elapsed = time.perf_counter() - started
+
+    cpu = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        cpu += usage.ru_utime + usage.ru_stime
+    latency = metrics.histogram('article')
+    articles = sum(written.values())
+    print(json.dumps({
+        'articles': articles,
+        'seconds': elapsed,
+        'articles_per_sec': articles / elapsed,
+        'p50_ms': 1000 * (latency.quantile(0.5) or 0),
+        'p99_ms': 1000 * (latency.quantile(0.99) or 0),
+        'cpu_seconds': cpu,
+        'peak_rss_mib': max(_rusage_peak_mib(resource.RUSAGE_SELF), _rusage_peak_mib(resource.RUSAGE_CHILDREN)),
+        'requests': metrics.total('requests'),
+        'retries': metrics.total('retries'),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--source', action='append', choices=SOURCES, help='default: all')
+    parser.add_argument('--articles', type=int, default=200, help='articles per synthetic site')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many extra seconds, at random')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of 503 responses')
+    parser.add_argument('--concurrency', type=int, default=CrawlSettings.fetch_concurrency)
+    parser.add_argument('--per-host', type=int, default=CrawlSettings.per_host_limit)
+    parser.add_argument('--fixed-concurrency', action='store_true', help='do not adapt the per-host concurrency')
+    parser.add_argument('--no-hedge', action='store_true', help='do not hedge slow requests')
+    parser.add_argument('--rate', type=float, default=1000.0,
+                        help='requests per second per host (default: %(default)s, effectively unlimited)')
+    parser.add_argument('--backend', choices=BACKENDS, default=CrawlSettings.parser_backend)
+    parser.add_argument('--parse-workers', type=int, default=None)
+    parser.add_argument('--archive', action='store_true', help='also keep the HTML archive')
+    parser.add_argument('--save', metavar='JSON', help='write the results here')
+    parser.add_argument('--baseline', metavar='JSON', help='compare with results saved earlier')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(json.loads(args.worker))
+        return
+
+    sources = args.source or list(SOURCES)
+    with MockSite(latency=args.latency, latency_jitter=args.jitter, error_rate=args.error_rate) as site:
+        for source in sources:
+            site.pages.update(site_pages(source, site.base_url, articles=args.articles))
+        config = {
+            'base_url': site.base_url, 'sources': sources, 'concurrency': args.concurrency,
+            'per_host': args.per_host, 'rate': args.rate, 'backend': args.backend,
+            'parse_workers': args.parse_workers, 'archive': args.archive,
+            'fixed_concurrency': args.fixed_concurrency, 'no_hedge': args.no_hedge,
+        }
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', json.dumps(config)],
+                                check=True, capture_output=True, text=True).stdout
+    results = json.loads(output.splitlines()[-1])
+    results['config'] = {key: value for key, value in vars(args).items() if key not in ('save', 'baseline', 'worker')}
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+    print(f"{'':<18} {'this run':>12}" + (f" {'baseline':>12} {'change':>8}" if baseline else ''))
+    for column in COLUMNS:
+        line = f"{column:<18} {results[column]:>12.2f}"
+        if baseline:
+            before = baseline[column]
+            change = f"{100 * (results[column] - before) / before:+.1f}%" if before else 'n/a'
+            line += f" {before:>12.2f} {change:>8}"
+        print(line)
+    print(f"requests: {results['requests']}, retries: {results['retries']}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as save_file:
+            json.dump(results, save_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
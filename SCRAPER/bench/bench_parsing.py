@@ -0,0 +1,89 @@
+"""Compare parser backends on article fixtures from every source.
+
+For each backend (and, for the BeautifulSoup ones, with and without restricted
+parsing) reports the parse+extract time per article, the peak memory the
+parsing added, and whether the extracted text matches the original
+``html.parser`` output. Each configuration runs in its own process so the
+peak RSS figures do not bleed into each other.
+
+    python bench/bench_parsing.py --rounds 5
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench.fixtures import SOURCES, load_fixtures
+from scraper.extractors import extract_article
+from scraper.parsing import available_backends
+from scraper.sites import SITES
+
+
+def peak_rss_kib():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def worker(backend, restricted, rounds):
+    """Run one configuration and print one JSON line per source."""
+    fixtures = {source: load_fixtures(source) for source in SOURCES}
+    baseline = peak_rss_kib()
+    for source in SOURCES:
+        spec = SITES[source]
+        digest = hashlib.sha1()
+        started = time.perf_counter()
+        for round_number in range(rounds):
+            for _, html in fixtures[source]:
+                article = extract_article(html, spec, backend=backend, restricted=restricted)
+                if round_number == 0:
+                    digest.update(f'{article.year}|{article.date_text}|{article.text}\n'.encode('utf-8'))
+        elapsed = time.perf_counter() - started
+        print(json.dumps({
+            'source': source,
+            'ms_per_article': 1000 * elapsed / (rounds * len(fixtures[source])),
+            'peak_kib': peak_rss_kib() - baseline,
+            'digest': digest.hexdigest(),
+        }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--worker', nargs=2, metavar=('BACKEND', 'RESTRICTED'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        backend, restricted = args.worker
+        worker(backend, restricted == 'restricted', args.rounds)
+        return
+
+    configs = []
+    for backend in available_backends():
+        configs.append((backend, 'full'))
+        if backend != 'selectolax':
+            configs.append((backend, 'restricted'))
+
+    reference = {}
+    print(f"{'backend':<12} {'tree':<10} {'source':<18} {'ms/article':>10} {'peak KiB':>9}  same text")
+    for backend, restricted in configs:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--rounds', str(args.rounds), '--worker', backend, restricted],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        for line in output.splitlines():
+            row = json.loads(line)
+            reference.setdefault(row['source'], row['digest'])
+            same = 'yes' if row['digest'] == reference[row['source']] else 'NO'
+            print(f"{backend:<12} {restricted:<10} {row['source']:<18} {row['ms_per_article']:>10.2f} "
+                  f"{row['peak_kib']:>9}  {same}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Compare one-connection-per-request fetching with the pooled session.
+
+Runs entirely against ``MockSite`` on localhost, e.g.
+
+    python bench/bench_session.py --articles 200 --handshake 0.03 --latency 0.01
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench.mock_server import MockSite
+from scraper import FetchPool, make_session
+
+
+class UnpooledSession:
+    """The old behaviour: module-level ``requests.get``, a new connection every time."""
+
+    def get(self, url, **kwargs):
+        return requests.get(url, **kwargs)
+
+    def close(self):
+        pass
+
+
+def run(label, session, args):
+    with MockSite(latency=args.latency, handshake_latency=args.handshake,
+                  error_rate=args.error_rate) as site:
+        urls = [site.url(f'/article/{i}') for i in range(args.articles)]
+        started = time.perf_counter()
+        ok = failed = retries = 0
+        with FetchPool(concurrency=args.concurrency, per_host=args.concurrency, session=session) as pool:
+            for result in pool.fetch(urls):
+                retries += result.retries
+                if result.ok:
+                    ok += 1
+                else:
+                    failed += 1
+        elapsed = time.perf_counter() - started
+        print(f"{label:<10} {elapsed:8.2f}s {ok / elapsed:10.1f} art/s "
+              f"{site.connections:6d} conns {site.bytes_sent / 1024:9.1f} KiB "
+              f"ok={ok} failed={failed} retries={retries}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--articles', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.01, help='seconds per request')
+    parser.add_argument('--handshake', type=float, default=0.03, help='seconds per new connection')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of 503 responses')
+    args = parser.parse_args()
+
+    run('unpooled', UnpooledSession(), args)
+    run('pooled', make_session(pool_size=args.concurrency, backoff_factor=0), args)
+
+
+if __name__ == '__main__':
+    main()
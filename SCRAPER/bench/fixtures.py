@@ -0,0 +1,152 @@
+"""Article page fixtures for offline benchmarks.
+
+Recorded pages are read from ``bench/fixtures/<source>/*.html`` when that
+directory exists. Otherwise each source gets deterministic synthetic pages
+with the same structure the extractors rely on, padded with the navigation,
+script and related-story boilerplate real pages carry, so parse costs are in
+a realistic range.
+
+``site_pages`` gives a whole replayable site per source, listing pages
+included, for end-to-end runs against ``MockSite``. ``bench/record.py``
+saves one from the live site as ``bench/fixtures/<source>/site.json`` (the
+URL path of every page, and the listing URL) next to the page files;
+without a recording the site is synthetic.
+"""
+
+import glob
+import json
+import os
+import random
+from urllib.parse import urlsplit
+
+from scraper.sites import SITES
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+SOURCES = ('gma-politics', 'gma-nation', 'philstar-politics', 'tsek')
+
+WORDS = ('senate house bill president budget election poll party mayor governor congress '
+         'committee hearing speaker vote law court ombudsman campaign survey province city '
+         'Marcos Duterte Robredo Padilla Romualdez Escudero Hontiveros Pimentel Zubiri').split()
+
+
+def _sentence(rng, words=18):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def _paragraphs(rng, count):
+    return [' '.join(_sentence(rng) for _ in range(rng.randint(2, 4))) for _ in range(count)]
+
+
+def _boilerplate(rng):
+    nav = ''.join(f'<li><a href="/news/section-{i}/">{rng.choice(WORDS)}</a></li>' for i in range(150))
+    scripts = ''.join(f'<script>window.dataLayer=window.dataLayer||[];dataLayer.push({{"k{i}":"{"x" * 200}"}});</script>'
+                      for i in range(20))
+    related = ''.join(f'<li class="related"><a href="/news/story/{rng.randint(1, 10 ** 6)}/">{_sentence(rng, 8)}</a></li>'
+                      for _ in range(40))
+    header = f'<header><nav><ul>{nav}</ul></nav></header>'
+    aside = f'<aside><ul>{related}</ul></aside>'
+    footer = f'<footer><ul>{nav}</ul></footer>'
+    return f'<head><title>News</title>{scripts}</head>', header, aside, footer
+
+
+def synthetic_article(source, number, year=2024):
+    """A page shaped like an article from ``source``."""
+    rng = random.Random(f'{source}-{number}')
+    head, header, aside, footer = _boilerplate(rng)
+    body_paragraphs = ''.join(f'<p>{text}</p>' for text in _paragraphs(rng, rng.randint(8, 20)))
+
+    if source in ('gma-politics', 'gma-nation'):
+        main = (f'<div class="article-date"><time datetime="{year}-05-12T08:00:00+08:00">'
+                f'May 12, {year} 8:00am</time></div>'
+                f'<div class="story_main">{body_paragraphs}<p></p></div>')
+    elif source == 'philstar-politics':
+        main = (f'<div class="article__date-published">May 12, {year} | 12:00am</div>'
+                f'<div class="article__writeup">{body_paragraphs}</div>')
+    elif source == 'tsek':
+        claim = ' '.join(rng.choice(WORDS) for _ in range(12))
+        quoted = ''.join(f'<p>He said “{_sentence(rng, 9)}” during the hearing.</p>' for _ in range(3))
+        main = (f'<div class="main-content"><figure><img src="/rating.png" alt="false"></figure>'
+                f'<p><strong>CLAIM</strong>: “{claim}” rating{{}}</p>{quoted}{body_paragraphs}</div>')
+    else:
+        raise ValueError(f'Unknown source {source!r}')
+    return f'<!DOCTYPE html><html>{head}<body>{header}<main><article>{main}</article>{aside}</main>{footer}</body></html>'
+
+
+def load_fixtures(source, synthetic_count=20):
+    """Return ``[(name, html), ...]`` for ``source``, preferring recorded pages."""
+    recorded = sorted(glob.glob(os.path.join(FIXTURES_DIR, source, '*.html')))
+    if recorded:
+        pages = []
+        for path in recorded:
+            with open(path, encoding='utf-8') as page_file:
+                pages.append((os.path.basename(path), page_file.read()))
+        return pages
+    return [(f'synthetic-{number}', synthetic_article(source, number)) for number in range(synthetic_count)]
+
+
+def manifest_path(source):
+    return os.path.join(FIXTURES_DIR, source, 'site.json')
+
+
+def _path_and_query(url):
+    parts = urlsplit(url)
+    return parts.path + ('?' + parts.query if parts.query else '')
+
+
+def listing_path(source):
+    """The listing URL of ``source`` without its origin, with its ``{page}`` placeholder."""
+    if os.path.exists(manifest_path(source)):
+        with open(manifest_path(source), encoding='utf-8') as manifest_file:
+            return json.load(manifest_file)['listing_path']
+    return _path_and_query(SITES[source].listing_url)
+
+
+def _synthetic_article_path(source, number):
+    # Prefixed with the source, so several synthetic sites can share one server
+    return f'/{source}/story/{number}/'
+
+
+def _synthetic_listing(source, numbers):
+    if source in ('gma-politics', 'gma-nation'):
+        return json.dumps({'data': [{'article_url': _synthetic_article_path(source, number)} for number in numbers]})
+    if source == 'philstar-politics':
+        cards = ''.join(f'<div class="titleForFeature"><a href="{_synthetic_article_path(source, number)}">'
+                        f'Story {number}</a></div>'
+                        for number in numbers)
+    else:
+        cards = ''.join(f'<article><a href="{_synthetic_article_path(source, number)}">Fact check {number}</a>'
+                        f'<footer class="entry-meta"><time>May 12, 2024</time></footer></article>'
+                        for number in numbers)
+    return f'<html><body><main>{cards}</main></body></html>'
+
+
+def site_pages(source, base_url, articles=200, per_page=20):
+    """``{path: body}`` of a replayable ``source`` site whose links point at ``base_url``.
+
+    A recorded site is served as recorded, with the live origins rewritten
+    to ``base_url``. A synthetic one has ``articles`` article pages on
+    listing pages of ``per_page``, all inside the source's year window.
+    """
+    if os.path.exists(manifest_path(source)):
+        with open(manifest_path(source), encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+        pages = {}
+        for path, filename in manifest['pages'].items():
+            with open(os.path.join(FIXTURES_DIR, source, filename), encoding='utf-8') as page_file:
+                body = page_file.read()
+            for origin in manifest['origins']:
+                body = body.replace(origin, base_url)
+                # JSON feeds often escape the slashes in their links
+                body = body.replace(origin.replace('/', '\\/'), base_url.replace('/', '\\/'))
+            pages[path] = body
+        return pages
+
+    pages = {}
+    template = listing_path(source)
+    numbers = list(range(1, articles + 1))
+    for page, start in enumerate(range(0, articles, per_page), start=1):
+        batch = numbers[start:start + per_page]
+        pages[template.format(page=page)] = _synthetic_listing(source, batch)
+        for number in batch:
+            pages[_synthetic_article_path(source, number)] = synthetic_article(source, number)
+    return pages
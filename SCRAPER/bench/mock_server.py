@@ -0,0 +1,148 @@
+"""Local stand-in HTTP server for offline scraper benchmarks.
+
+``MockSite`` serves article pages shaped like the GMA/Philstar/Tsek ones from
+a thread on localhost. It can add a per-request latency (fixed, plus up to
+``latency_jitter`` at random), a per-connection "handshake" delay (standing
+in for TCP+TLS setup to the real sites) and a fraction of 503 responses, and it counts connections and requests so the
+effect of keep-alive and retries can be measured without the network.
+Pages carry an ``ETag`` and conditional requests that match it get a 304.
+"""
+
+import gzip
+import hashlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def article_html(number, year=2024):
+    """A small GMA-style article page with a dated ``story_main`` body."""
+    paragraphs = ''.join(
+        f'<p>Paragraph {i} of article {number}, with the usual political reporting text.</p>'
+        for i in range(12)
+    )
+    return (
+        '<html><head><title>Article</title></head><body>'
+        f'<time datetime="{year}-05-12T08:00:00+08:00">May 12, {year}</time>'
+        f'<div class="story_main">{paragraphs}</div>'
+        '</body></html>'
+    )
+
+
+class MockSite:
+    """Serve ``pages`` (path -> HTML) or synthetic articles on a local port."""
+
+    def __init__(self, pages=None, latency=0.0, handshake_latency=0.0, error_rate=0.0,
+                 seed=0, host='127.0.0.1', port=0, latency_jitter=0.0):
+        self.pages = pages or {}
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.handshake_latency = handshake_latency
+        self.error_rate = error_rate
+        self.connections = 0
+        self.requests = 0
+        self.bytes_sent = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def url(self, path):
+        return self.base_url + path
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _count(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                setattr(self, name, getattr(self, name) + amount)
+
+    def _should_fail(self):
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def _delay(self):
+        with self._lock:
+            return self.latency + self._random.random() * self.latency_jitter
+
+    def _page(self, path):
+        # Pages may be keyed with their query string (?page=2) or without it
+        if path in self.pages:
+            return self.pages[path]
+        path = path.split('?', 1)[0]
+        if path in self.pages:
+            return self.pages[path]
+        # Any other /article/<n> path gets a synthetic article
+        if path.startswith('/article/'):
+            return article_html(path.rsplit('/', 1)[-1])
+        return None
+
+    def _handler_class(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                site._count(connections=1)
+                if site.handshake_latency:
+                    time.sleep(site.handshake_latency)
+
+            def do_GET(self):
+                site._count(requests=1)
+                delay = site._delay()
+                if delay:
+                    time.sleep(delay)
+                if site._should_fail():
+                    self._send(503, b'busy', {'Retry-After': '0'})
+                    return
+                page = site._page(self.path)
+                if page is None:
+                    self._send(404, b'not found')
+                    return
+                body = page.encode('utf-8') if isinstance(page, str) else page
+                etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+                if self.headers.get('If-None-Match') == etag:
+                    self._send(304, b'', {'ETag': etag})
+                    return
+                headers = {'Content-Type': 'text/html; charset=utf-8', 'ETag': etag}
+                if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    body = gzip.compress(body)
+                    headers['Content-Encoding'] = 'gzip'
+                self._send(200, body, headers)
+
+            def _send(self, status, body, headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                site._count(bytes_sent=len(body))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
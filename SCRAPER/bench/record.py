@@ -0,0 +1,93 @@
+"""Record listing and article pages from the live sites as benchmark fixtures.
+
+Fetches the first ``--pages`` listing pages of each source and up to
+``--articles`` of the articles they link to, politely (robots.txt and the
+per-host rate limit apply), and saves them under ``bench/fixtures/<source>/``:
+
+    site.json        listing URL path, live origins, and URL path -> file of every page
+    listing-1.txt    listing pages as served (JSON feed or HTML)
+    0001.html        article pages, also picked up by bench_parsing.py
+
+``bench_crawl.py`` then replays the recording through ``MockSite``.
+
+    python bench/record.py --source gma-politics --pages 2 --articles 40
+"""
+
+import argparse
+import json
+import os
+import sys
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench.fixtures import FIXTURES_DIR, SOURCES
+from scraper.discovery import parse_listing
+from scraper.fetch import FetchPool
+from scraper.sites import SITES
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return f'{parts.scheme}://{parts.netloc}'
+
+
+def _path(url):
+    parts = urlsplit(url)
+    return parts.path + ('?' + parts.query if parts.query else '')
+
+
+def record(source, pages, articles, rate):
+    spec = SITES[source]
+    directory = os.path.join(FIXTURES_DIR, source)
+    os.makedirs(directory, exist_ok=True)
+    manifest = {'listing_path': _path(spec.listing_url), 'origins': [], 'pages': {}}
+    origins = {_origin(spec.listing_url)}
+    article_urls = []
+
+    with FetchPool(concurrency=4, per_host=4, rate=rate) as fetch_pool:
+        for page in range(1, pages + 1):
+            url = spec.listing_url.format(page=page)
+            response = fetch_pool.get(url)
+            if response.status_code != 200:
+                print(f"[{source}] Listing page {url} answered {response.status_code}; stopping.")
+                break
+            filename = f'listing-{page}.txt'
+            with open(os.path.join(directory, filename), 'w', encoding='utf-8') as page_file:
+                page_file.write(response.text)
+            manifest['pages'][_path(url)] = filename
+            items = parse_listing(response, spec.listing_item_selector, spec.listing_link_selector,
+                                  spec.listing_date_selector)
+            article_urls += [item.url for item in items]
+            print(f"[{source}] Listing page {page}: {len(items)} articles")
+
+        saved = 0
+        for result in fetch_pool.fetch(article_urls[:articles]):
+            if not result.ok:
+                print(f"[{source}] Skipped {result.url}: {result.error or result.status_code}")
+                continue
+            saved += 1
+            filename = f'{saved:04d}.html'
+            with open(os.path.join(directory, filename), 'w', encoding='utf-8') as page_file:
+                page_file.write(result.text)
+            manifest['pages'][_path(result.url)] = filename
+            origins.add(_origin(result.url))
+
+    manifest['origins'] = sorted(origins)
+    with open(os.path.join(directory, 'site.json'), 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    print(f"[{source}] Saved {saved} articles to {directory}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--source', action='append', choices=SOURCES, help='default: all')
+    parser.add_argument('--pages', type=int, default=2, help='listing pages per source')
+    parser.add_argument('--articles', type=int, default=40, help='article pages per source')
+    parser.add_argument('--rate', type=float, default=1.0, help='requests per second per host')
+    args = parser.parse_args()
+    for source in args.source or SOURCES:
+        record(source, args.pages, args.articles, args.rate)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+"""Shared crawling helpers used by the GMA, Philstar and Tsek scrapers."""
+
+from .fetch import FetchPool, FetchResult
+from .session import make_session
+
+__all__ = ['FetchPool', 'FetchResult', 'make_session']
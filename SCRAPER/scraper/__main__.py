@@ -0,0 +1,265 @@
+"""Command line entry point.
+
+``python -m scraper crawl --source NAME ...``
+    Crawl the named sources (every registered source by default) at the same
+    time in one process, on shared fetch and parse pools. ``--source`` takes
+    comma separated names; ``--async`` runs the crawl on one asyncio event
+    loop (``aio``).
+``python -m scraper crawl --workers N ...``
+    Crawl with N worker processes sharing a SQLite frontier, then merge their
+    output shards (``distributed``).
+``python -m scraper serve-frontier PATH --listen tcp://HOST:PORT``, ``discover``, ``work``, ``merge``
+    The steps of a distributed crawl run separately, for workers on several
+    machines.
+``python -m scraper reextract --source NAME ...``
+    Rebuild the sources' CSVs from the HTML archive with the current
+    extractors, without any network access.
+``python -m scraper compile CSV ... --output-dir DIR``
+    Merge, deduplicate and balance scraped CSVs into train/validation/test
+    CSVs.
+``python -m scraper claims (--archive DIR | --csv CSV ...) --output CSV``
+    Extract Tsek claims from the archived pages, or clean the articles of
+    existing CSVs, in batches.
+
+Each command imports the modules it runs when it is chosen, so ``--help``
+and the light commands do not load the crawl stack.
+"""
+
+import argparse
+from collections import Counter
+
+from .metrics import configure_logging
+from .output import FORMATS
+from .parsing import BACKENDS
+from .settings import CrawlSettings
+from .sites import SITES
+
+
+def _source_names(value):
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SITES]
+    if unknown or not names:
+        raise argparse.ArgumentTypeError(
+            f"unknown source {', '.join(unknown) or repr(value)} (choose from {', '.join(sorted(SITES))})")
+    return names
+
+
+def _add_common_arguments(command):
+    command.add_argument('--source', action='extend', type=_source_names,
+                         help='sources to process, comma separated or repeated (default: all)')
+    command.add_argument('--backend', choices=BACKENDS, default=CrawlSettings.parser_backend)
+    command.add_argument('--parse-workers', type=int, default=None)
+    command.add_argument('--output-dir', default=None)
+    command.add_argument('--format', action='append', choices=FORMATS[1:], dest='formats',
+                         help='also write this columnar format next to each CSV; repeat for both')
+    command.add_argument('--archive', default=CrawlSettings.archive_dir,
+                         help='HTML archive directory (default: %(default)s)')
+    command.add_argument('-v', '--verbose', action='store_const', const='DEBUG', dest='log_level',
+                         default=CrawlSettings.log_level, help='log every article as it is handled')
+    command.add_argument('-q', '--quiet', action='store_const', const='WARNING', dest='log_level',
+                         help='only log problems')
+
+
+def _add_crawl_arguments(command):
+    command.add_argument('--discovery', choices=('http', 'selenium', 'sitemap'), default='http',
+                         help="'sitemap' backfills from the sitemaps in date shards")
+    command.add_argument('--shard-months', type=int, default=CrawlSettings.shard_months,
+                         help='months per sitemap date shard (default: %(default)s)')
+    command.add_argument('--browsers', type=int, default=CrawlSettings.browser_instances,
+                         help='headless browsers shared by the sources that need one (default: %(default)s)')
+    command.add_argument('--concurrency', type=int, default=CrawlSettings.fetch_concurrency)
+    command.add_argument('--per-host', type=int, default=CrawlSettings.per_host_limit,
+                         help='most article requests in flight per host (default: %(default)s)')
+    command.add_argument('--fixed-concurrency', action='store_true',
+                         help='always use --per-host instead of adapting it to each host\'s latency and errors')
+    command.add_argument('--no-hedge', action='store_true', help='never send a second copy of a slow request')
+    command.add_argument('--timeouts', type=float, nargs=3, metavar=('CONNECT', 'READ', 'TOTAL'),
+                         default=(CrawlSettings.connect_timeout, CrawlSettings.read_timeout,
+                                  CrawlSettings.total_timeout),
+                         help='seconds to connect, between reads and for a whole request (default: %(default)s)')
+    command.add_argument('--rate', type=float, default=CrawlSettings.requests_per_second,
+                         help='requests per second per site (default: %(default)s)')
+    command.add_argument('--state', default=CrawlSettings.state_path)
+    command.add_argument('--no-archive', action='store_true', help='do not keep the fetched HTML')
+    command.add_argument('--fresh', action='store_true', help='start over instead of resuming')
+    command.add_argument('--incremental', action='store_true', help='only pick up stories since the last run')
+
+
+def _add_frontier_arguments(command):
+    command.add_argument('--frontier', default=CrawlSettings.frontier_path,
+                         help='SQLite frontier file, or tcp://HOST:PORT of serve-frontier (default: %(default)s)')
+    command.add_argument('--shard-dir', default=CrawlSettings.shard_dir,
+                         help='directory of the workers\' output shards (default: %(default)s)')
+
+
+def _apply_crawl_arguments(settings, args):
+    settings.discovery_mode = args.discovery
+    settings.shard_months = args.shard_months
+    settings.browser_instances = args.browsers
+    settings.fetch_concurrency = args.concurrency
+    settings.per_host_limit = args.per_host
+    settings.adaptive_concurrency = not args.fixed_concurrency
+    settings.hedge_requests = not args.no_hedge
+    settings.connect_timeout, settings.read_timeout, settings.total_timeout = args.timeouts
+    settings.requests_per_second = args.rate
+    settings.state_path = args.state
+    settings.resume = not args.fresh
+    settings.incremental = args.incremental
+    if args.no_archive:
+        settings.archive_dir = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m scraper')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    crawl = commands.add_parser('crawl', help='crawl one or more sources')
+    _add_common_arguments(crawl)
+    _add_crawl_arguments(crawl)
+    crawl.add_argument('--no-progress', action='store_true', help='do not show the live progress line')
+    crawl.add_argument('--async', action='store_true', dest='use_async',
+                       help='run every source on one asyncio event loop')
+    crawl.add_argument('--metrics-port', type=int, default=None,
+                       help='serve metrics on http://127.0.0.1:PORT/metrics (Prometheus) and /metrics.json')
+    crawl.add_argument('--workers', type=int, default=None,
+                       help='crawl with this many worker processes sharing a frontier, then merge their shards')
+    _add_frontier_arguments(crawl)
+
+    serve_command = commands.add_parser('serve-frontier', help='share a frontier with workers on other hosts')
+    serve_command.add_argument('path', help='SQLite frontier file')
+    serve_command.add_argument('--listen', required=True, metavar='tcp://HOST:PORT')
+
+    discover_command = commands.add_parser('discover', help='add the sources\' article links to a frontier')
+    _add_common_arguments(discover_command)
+    _add_crawl_arguments(discover_command)
+    _add_frontier_arguments(discover_command)
+
+    work_command = commands.add_parser('work', help='crawl article links leased from a frontier')
+    _add_common_arguments(work_command)
+    _add_crawl_arguments(work_command)
+    _add_frontier_arguments(work_command)
+    work_command.add_argument('--worker', default=None, help='name of this worker and its shards (default: host-pid)')
+
+    merge_command = commands.add_parser('merge', help='merge the workers\' shards into the sources\' outputs')
+    _add_common_arguments(merge_command)
+    _add_frontier_arguments(merge_command)
+
+    reextract_command = commands.add_parser('reextract', help='rebuild CSVs from the HTML archive')
+    _add_common_arguments(reextract_command)
+
+    compile_command = commands.add_parser('compile', help='build a deduplicated train/validation/test set')
+    compile_command.add_argument('inputs', nargs='+', metavar='CSV',
+                                 help='label,article CSVs; on duplicates the earlier file wins')
+    compile_command.add_argument('--output-dir', required=True)
+    compile_command.add_argument('--splits', type=float, nargs=3, default=None,
+                                 metavar=('TRAIN', 'VALIDATION', 'TEST'))
+    compile_command.add_argument('--threshold', type=float, default=None,
+                                 help='estimated Jaccard similarity that makes a near duplicate')
+    compile_command.add_argument('--no-balance', action='store_true', help='keep every article of every label')
+    compile_command.add_argument('--min-words', type=int, default=1)
+    compile_command.add_argument('--seed', type=int, default=0)
+
+    claims_command = commands.add_parser('claims', help='extract Tsek claims, or clean CSV articles, in batches')
+    claims_input = claims_command.add_mutually_exclusive_group(required=True)
+    claims_input.add_argument('--archive', help='HTML archive to read the Tsek pages from')
+    claims_input.add_argument('--csv', action='append', dest='csv_inputs', metavar='CSV',
+                              help='label,article CSV to clean; repeat for several')
+    claims_command.add_argument('--output', required=True, help='label,article CSV to write')
+    claims_command.add_argument('--batch-size', type=int, default=None)
+    claims_command.add_argument('--backend', choices=BACKENDS, default=CrawlSettings.parser_backend)
+    claims_command.add_argument('--parse-workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve-frontier':
+        from .frontier import serve_frontier
+
+        serve_frontier(args.path, args.listen)
+        return
+
+    if args.command == 'claims':
+        from .claims import DEFAULT_BATCH_SIZE, claims_from_archive, clean_csv
+
+        batch_size = DEFAULT_BATCH_SIZE if args.batch_size is None else args.batch_size
+        if args.archive:
+            stats = claims_from_archive(args.archive, args.output, workers=args.parse_workers,
+                                        backend=args.backend, batch_size=batch_size)
+        else:
+            stats = clean_csv(args.csv_inputs, args.output, batch_size=batch_size)
+        print(f"Read {stats['documents']} documents, wrote {stats['written']} "
+              f"({stats['documents_per_second']:.0f} documents/sec).")
+        for note, count in Counter(stats.get('skipped', {})).most_common():
+            print(f"Skipped {count}: {note}")
+        return
+
+    if args.command == 'compile':
+        from .dataset import DEFAULT_SPLITS, DEFAULT_THRESHOLD, compile_dataset
+
+        stats = compile_dataset(args.inputs, args.output_dir, splits=tuple(args.splits or DEFAULT_SPLITS),
+                                balance=not args.no_balance,
+                                threshold=DEFAULT_THRESHOLD if args.threshold is None else args.threshold,
+                                seed=args.seed, min_words=args.min_words)
+        print(f"Read {stats['read']} rows: dropped {stats['exact_duplicates']} exact and "
+              f"{stats['near_duplicates']} near duplicates, {stats['too_short']} too short.")
+        print("Kept per label: " + ', '.join(f'{label}: {count}' for label, count in stats['kept'].items()))
+        print("Wrote " + ', '.join(f'{split}: {count}' for split, count in stats['splits'].items()))
+        return
+
+    settings = CrawlSettings(
+        parser_backend=args.backend,
+        parse_workers=args.parse_workers,
+        output_dir=args.output_dir,
+        output_formats=('csv', *(args.formats or ())),
+        archive_dir=args.archive,
+        log_level=args.log_level,
+    )
+    sources = args.source or list(SITES)
+    if args.command == 'reextract':
+        from .engine import reextract
+
+        reextract(sources, settings)
+        return
+
+    if args.command == 'merge':
+        from .distributed import merge
+        from .frontier import open_frontier
+
+        configure_logging(settings.log_level)
+        settings.shard_dir = args.shard_dir
+        with open_frontier(args.frontier) as frontier:
+            merge(sources, settings, frontier)
+        return
+
+    _apply_crawl_arguments(settings, args)
+    if args.command in ('discover', 'work'):
+        from .distributed import discover, work
+        from .frontier import open_frontier
+
+        configure_logging(settings.log_level)
+        settings.shard_dir = args.shard_dir
+        with open_frontier(args.frontier) as frontier:
+            if args.command == 'discover':
+                discover(sources, settings, frontier)
+            else:
+                work(sources, settings, frontier, args.worker)
+        return
+
+    settings.progress = not args.no_progress
+    settings.metrics_port = args.metrics_port
+    if args.workers:
+        from .distributed import run_distributed
+
+        settings.frontier_path = args.frontier
+        settings.shard_dir = args.shard_dir
+        run_distributed(sources, settings, args.workers)
+    elif args.use_async:
+        from .aio import run_async
+
+        run_async(sources, settings)
+    else:
+        from .engine import run
+
+        run(sources, settings)
+
+
+if __name__ == '__main__':
+    main()
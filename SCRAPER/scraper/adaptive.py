@@ -0,0 +1,153 @@
+"""Per-host fetch concurrency that follows what each site can serve.
+
+A fixed ``per_host`` either leaves a fast site underused or piles requests
+onto a slow one until it times out. ``AimdLimit`` sets how many article
+requests may be in flight to one host with AIMD (additive increase,
+multiplicative decrease), the way TCP finds a link's capacity:
+
+* it starts at ``INITIAL_LIMIT`` and looks at every ``WINDOW`` finished
+  requests;
+* while their median latency stays within ``LATENCY_TOLERANCE`` times the
+  best median the host has shown, and under ``ERROR_LIMIT`` of them fail
+  (network errors, 429 and 5xx), the limit grows by one, up to
+  ``per_host``;
+* otherwise it is cut by ``BACKOFF``, never below one.
+
+Until the first cut the limit grows by one with every request that
+succeeds (slow start), so a host reaches its limit after a handful of
+requests rather than a handful of windows.
+
+A server that is given more than it can handle queues requests, which
+raises the latency of all of them, so the median is the signal. The slow
+tail is left alone: a few stalled requests say little about load and would
+cut the limit at random. The best median is allowed to creep up by
+``BASELINE_DRIFT`` per window, so a site that has become slower for good is
+not held at one request forever.
+
+The tail is what hedging is for. A request still unanswered after the
+host's recent p95 latency (at least ``HEDGE_MIN_DELAY``) is usually stuck
+behind a slow connection or server thread, and a second copy often returns
+first. ``hedge_delay`` gives that delay, and ``take_hedge`` keeps hedges
+under ``HEDGE_BUDGET`` of the host's requests.
+
+Rate limits stay with ``politeness``: this only decides how many of the
+requests it allows may overlap.
+"""
+
+import threading
+from collections import deque
+
+INITIAL_LIMIT = 2
+WINDOW = 20
+LATENCY_TOLERANCE = 2.0
+ERROR_LIMIT = 0.1
+BACKOFF = 0.5
+BASELINE_DRIFT = 1.05
+# Latencies kept for the hedge delay, and how many are needed before hedging starts
+HISTORY = 200
+MIN_HEDGE_SAMPLES = 20
+HEDGE_QUANTILE = 0.95
+HEDGE_MIN_DELAY = 0.5
+HEDGE_BUDGET = 0.1
+
+
+def quantile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class AimdLimit:
+    """Requests to one host that may be in flight, adjusted from their latency and errors.
+
+    Used as a context manager around a request by threads; coroutines use
+    ``try_acquire`` and ``release``. With ``adjust=False`` the limit stays at
+    ``initial`` and only the latencies for hedging are kept.
+    """
+
+    def __init__(self, maximum, initial=INITIAL_LIMIT, adjust=True, window=WINDOW):
+        self.maximum = max(1, maximum)
+        self.limit = max(1, min(initial, self.maximum))
+        self.adjust = adjust
+        self.window = window
+        self.in_flight = 0
+        self.best_median = None
+        # Doubling until the host first shows strain
+        self.slow_start = adjust
+        self.requests = 0
+        self.hedges = 0
+        self._samples = []
+        self._failures = 0
+        self._recent = deque(maxlen=HISTORY)
+        self._condition = threading.Condition()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def try_acquire(self):
+        with self._condition:
+            if self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def acquire(self):
+        with self._condition:
+            self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def record(self, seconds, failed=False):
+        """Feed back one finished request: its latency and whether it failed."""
+        with self._condition:
+            self.requests += 1
+            self._recent.append(seconds)
+            self._samples.append(seconds)
+            self._failures += bool(failed)
+            if self.slow_start and not failed and self.limit < self.maximum:
+                self.limit += 1
+                self._condition.notify()
+            if len(self._samples) >= self.window:
+                self._update()
+
+    def _update(self):
+        median = quantile(self._samples, 0.5)
+        error_rate = self._failures / len(self._samples)
+        self._samples.clear()
+        self._failures = 0
+        self.best_median = median if self.best_median is None else min(median, self.best_median * BASELINE_DRIFT)
+        if not self.adjust:
+            return
+        if error_rate > ERROR_LIMIT or median > LATENCY_TOLERANCE * self.best_median:
+            self.limit = max(1, int(self.limit * BACKOFF))
+            self.slow_start = False
+        elif self.limit < self.maximum:
+            self.limit += 1
+            self._condition.notify()
+
+    def hedge_delay(self):
+        """Seconds after which a request is worth sending again, or None until enough requests are known."""
+        with self._condition:
+            if len(self._recent) < MIN_HEDGE_SAMPLES:
+                return None
+            return max(HEDGE_MIN_DELAY, quantile(self._recent, HEDGE_QUANTILE))
+
+    def take_hedge(self):
+        """True, counting a hedge, while hedges are within ``HEDGE_BUDGET`` of the requests."""
+        with self._condition:
+            if self.hedges >= HEDGE_BUDGET * max(self.requests, 1):
+                return False
+            self.hedges += 1
+            return True
+
+    def refund_hedge(self):
+        """Give back a hedge taken with ``take_hedge`` that was never sent."""
+        with self._condition:
+            self.hedges -= 1
@@ -0,0 +1,345 @@
+"""The crawl on one asyncio event loop.
+
+``run_async`` crawls the same sources with the same decisions as
+``engine.run`` (``engine.SourceCrawl``), but each source is a set of
+coroutines joined by bounded queues instead of a thread:
+
+    discover --(listing batches)--> fetch --(batches of fetch tasks)--> write
+
+``discover`` advances the source's listing (HTTP feed, sitemap shards or
+the browser fallback) a batch at a time on a worker thread and picks the
+links to fetch. ``fetch`` starts a task per link: fetch it on the
+``AsyncFetcher``, then hand the page to the ``ParsePool`` processes. ``write``
+awaits those tasks in listing order, writes or skips each article and
+checkpoints after every batch. The queues hold ``QUEUE_BATCHES`` batches, so
+discovery runs at most that far ahead of writing.
+
+``AsyncFetcher`` keeps every request in flight on the loop: with aiohttp
+installed (``pip install aiohttp``) a request costs no thread at all, and
+thousands can wait on the network at once; without it requests run on a
+pool of ``concurrency`` threads. Either way the per-host politeness rate
+limits, robots.txt rules and throttling feedback of ``politeness`` apply,
+waiting with ``asyncio.sleep``. aiohttp, the browser and Selenium are only
+imported when used.
+
+    python -m scraper crawl --async --source gma-politics,philstar-politics,tsek
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import partial
+from urllib.parse import urlsplit
+
+import requests
+
+from .archive import HtmlArchive
+from .engine import CrawlSettings, SourceCrawl, browser_pool, listing_batches, make_fetch_pool, report
+from .extractors import extract_article
+from .fetch import FetchResult, decode_body
+from .metrics import configure_logging, Metrics, MetricsServer, ProgressLine
+from .pipeline import ParsePool
+from .politeness import THROTTLE_STATUSES, DisallowedByRobots, parse_retry_after
+from .session import DEFAULT_BACKOFF, DEFAULT_RETRIES, RETRY_STATUSES, USER_AGENT, accept_encoding, retry_count
+from .sites import get_site
+from .state import CrawlState
+
+logger = logging.getLogger(__name__)
+
+# Listing batches a source's discovery may run ahead of its writer
+QUEUE_BATCHES = 2
+
+
+class _OnLoop:
+    """Runs the wrapped object's methods on the event loop's thread, for code running on a worker thread."""
+
+    def __init__(self, target, loop):
+        self._target = target
+        self._loop = loop
+
+    def __getattr__(self, name):
+        method = getattr(self._target, name)
+
+        def call(*args, **kwargs):
+            future = Future()
+
+            def run():
+                try:
+                    future.set_result(method(*args, **kwargs))
+                except BaseException as exc:
+                    future.set_exception(exc)
+
+            self._loop.call_soon_threadsafe(run)
+            return future.result()
+
+        return call
+
+
+class AsyncFetcher:
+    """Fetch URLs from coroutines, at most ``concurrency`` at once.
+
+    Rate limits and robots.txt come from ``fetch_pool.politeness``, so the
+    listing requests that discovery makes on ``fetch_pool`` and the article
+    requests made here share each host's allowance. So do the per-host
+    ``adaptive.AimdLimit`` concurrency limits, the hedging and the connect,
+    read and total deadlines of ``fetch_pool``.
+    """
+
+    def __init__(self, fetch_pool, concurrency, retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF):
+        self.fetch_pool = fetch_pool
+        self.politeness = fetch_pool.politeness
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self._slots = asyncio.Semaphore(concurrency)
+        # Wakes the requests waiting for room under a host's concurrency limit
+        self._host_waiters = {}
+        # Hosts whose robots.txt has been read
+        self._ready = set()
+        self._client = None
+        self._executor = None
+        self._errors = (requests.exceptions.RequestException,)
+
+    async def __aenter__(self):
+        try:
+            import aiohttp
+        except ImportError:
+            logger.info("aiohttp is not installed; fetching on %d threads instead (pip install aiohttp).",
+                        self.concurrency)
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='fetch')
+            return self
+        fetch_pool = self.fetch_pool
+        self._client = aiohttp.ClientSession(
+            # Room for a hedge next to each of a host's requests
+            connector=aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=2 * fetch_pool.per_host),
+            timeout=aiohttp.ClientTimeout(total=fetch_pool.total_timeout, connect=fetch_pool.connect_timeout,
+                                          sock_read=fetch_pool.timeout),
+            headers={'User-Agent': USER_AGENT, 'Accept-Encoding': accept_encoding()},
+        )
+        self._errors = (aiohttp.ClientError, asyncio.TimeoutError)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self._client is not None:
+            await self._client.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _wait_turn(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._ready:
+            # Reading robots.txt blocks, so the first request to a host does it on a thread
+            await asyncio.get_running_loop().run_in_executor(None, self.politeness.policy, url)
+            self._ready.add(host)
+        delay = self.politeness.reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _get_aiohttp(self, url, headers):
+        """``(status, headers, body, text, encoding, retries)``, retrying throttled and failed requests."""
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._client.get(url, headers=headers) as response:
+                    body = await response.read()
+                    if response.status in RETRY_STATUSES and attempt < self.retries:
+                        pause = parse_retry_after(response.headers.get('Retry-After'))
+                        await asyncio.sleep(pause if pause is not None else self.backoff_factor * 2 ** attempt)
+                        continue
+                    encoding = response.charset or 'utf-8'
+                    text = body.decode(encoding, errors='replace')
+                    return response.status, response.headers, body, text, encoding, attempt
+            except self._errors:
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+
+    async def _get_threaded(self, url, headers, abandoned):
+        send = partial(self.fetch_pool.send, url, headers, None, abandoned)
+        response = await asyncio.get_running_loop().run_in_executor(self._executor, send)
+        return (response.status_code, response.headers, response.content, *decode_body(response),
+                retry_count(response))
+
+    async def _get(self, url, headers, abandoned=None):
+        async with self._slots:
+            if self._client is not None:
+                return await self._get_aiohttp(url, headers)
+            return await self._get_threaded(url, headers, abandoned)
+
+    async def _hedged(self, url, headers, limit):
+        """``_get``, sent a second time if no answer comes within the host's hedge delay; the first answer wins."""
+        delay = limit.hedge_delay() if self.fetch_pool.hedge else None
+        if delay is None:
+            return await self._get(url, headers)
+        # Stops the losing request of the thread fallback, which cannot be cancelled
+        abandoned = threading.Event()
+        first = asyncio.ensure_future(self._get(url, headers, abandoned))
+        done, _ = await asyncio.wait([first], timeout=delay)
+        if done or not limit.take_hedge():
+            return await first
+        # A hedge takes a rate-limit token of its own, and is skipped when none is free
+        if not self.politeness.try_acquire(url):
+            limit.refund_hedge()
+            return await first
+        second = asyncio.ensure_future(self._get(url, headers, abandoned))
+        try:
+            done, pending = await asyncio.wait([first, second], return_when=asyncio.FIRST_COMPLETED)
+            winner = done.pop()
+            if winner.exception() is not None and pending:
+                return await pending.pop()
+            return winner.result()
+        finally:
+            abandoned.set()
+            first.cancel()
+            second.cancel()
+
+    async def fetch_one(self, url, headers=None):
+        """A ``FetchResult`` for ``url`` once its host's limits allow. Never raises for network errors."""
+        started = time.perf_counter()
+        try:
+            await self._wait_turn(url)
+        except DisallowedByRobots as exc:
+            return FetchResult(url, error=exc, elapsed=time.perf_counter() - started)
+        limit = self.fetch_pool.limit(url)
+        waiters = self._host_waiters.setdefault(urlsplit(url).netloc, asyncio.Condition())
+        async with waiters:
+            await waiters.wait_for(limit.try_acquire)
+        sent = time.perf_counter()
+        try:
+            status, response_headers, body, text, encoding, retries = await self._hedged(url, headers, limit)
+        except self._errors as exc:
+            limit.record(time.perf_counter() - sent, failed=True)
+            self.politeness.record(url, error=True)
+            return FetchResult(url, error=exc, elapsed=time.perf_counter() - started)
+        finally:
+            limit.release()
+            async with waiters:
+                waiters.notify(max(1, limit.limit - limit.in_flight))
+        limit.record(time.perf_counter() - sent, failed=status in THROTTLE_STATUSES or status >= 500)
+        self.politeness.record(url, status, response_headers.get('Retry-After'), retries)
+        return FetchResult(url, status, text, elapsed=time.perf_counter() - started, retries=retries,
+                           size=len(body), content=body, encoding=encoding, etag=response_headers.get('ETag'),
+                           last_modified=response_headers.get('Last-Modified'))
+
+
+async def crawl_site_async(spec, settings, fetcher, fetch_pool, parse_pool, archive=None, metrics=None,
+                           browsers=None):
+    """``engine.crawl_site`` as three coroutines joined by bounded queues; returns the articles written."""
+    loop = asyncio.get_running_loop()
+    metrics = metrics or Metrics()
+    source = spec.name
+    with settings.open_sink(spec, settings.resume) as sink, CrawlState(settings.state_path, spec.name) as crawl_state:
+        if not settings.resume:
+            crawl_state.reset()
+        crawl = SourceCrawl(spec, settings, sink, crawl_state, archive, metrics)
+        batches = asyncio.Queue(maxsize=QUEUE_BATCHES)
+        fetching = asyncio.Queue(maxsize=QUEUE_BATCHES)
+        stopped = asyncio.Event()
+
+        async def discover():
+            # The listing runs on worker threads but may read and save validators and shards
+            listing = listing_batches(spec, settings, fetch_pool, _OnLoop(crawl_state, loop), crawl.first_page(),
+                                      browsers)
+            try:
+                while not stopped.is_set():
+                    with metrics.timer('discover', source):
+                        batch = await loop.run_in_executor(None, next, listing, None)
+                    if batch is None:
+                        break
+                    page_number, listing_items, finished_shard = batch
+                    logger.debug("%s Listing %s. Articles scraped so far: %d", crawl.prefix,
+                                 f'page {page_number}' if page_number is not None
+                                 else f'shard batch of {len(listing_items)}', crawl.articles_scraped)
+                    links, stop = crawl.select(listing_items)
+                    await batches.put((page_number, finished_shard, links, stop))
+                    if stop:
+                        break
+                await batches.put(None)
+            finally:
+                try:
+                    await loop.run_in_executor(None, listing.close)
+                except ValueError:
+                    pass  # Cancelled while a thread was still reading the listing; it stops with the pools
+
+        async def fetch_and_parse(url, headers):
+            result = await fetcher.fetch_one(url, headers)
+            if result.not_modified and not crawl_state.has_verdict(url):
+                # Nothing stored to repeat for an unchanged page, so it is fetched in full
+                result = await fetcher.fetch_one(url)
+            return result, await parse_pool.parse_one(result, spec)
+
+        async def fetch():
+            while (batch := await batches.get()) is not None:
+                links = batch[2]
+                conditional = crawl_state.conditional_headers(links, any_status=settings.incremental)
+                tasks = [] if stopped.is_set() else [asyncio.ensure_future(fetch_and_parse(url, conditional.get(url)))
+                                                     for url in links]
+                await fetching.put((batch, tasks))
+            await fetching.put(None)
+
+        async def write():
+            while (item := await fetching.get()) is not None:
+                (page_number, finished_shard, _, listing_stop), tasks = item
+                if stopped.is_set():
+                    for task in tasks:
+                        task.cancel()
+                    continue
+                stop = False
+                for task in tasks:
+                    if stop:
+                        task.cancel()
+                        continue
+                    result, article = await task
+                    stop = crawl.handle(result, article)
+                stop = stop or listing_stop
+                crawl.checkpoint(page_number, finished_shard, stop)
+                if stop:
+                    stopped.set()
+
+        stages = [asyncio.ensure_future(stage()) for stage in (discover, fetch, write)]
+        try:
+            await asyncio.gather(*stages)
+        except BaseException:
+            stopped.set()
+            for stage in stages:
+                stage.cancel()
+            raise
+    return crawl.finish()
+
+
+async def _run(specs, settings, metrics):
+    archive = HtmlArchive(settings.archive_dir) if settings.archive_dir else None
+    with ExitStack() as stack:
+        # Discovery (listing pages, sitemaps) still goes through a FetchPool, on threads
+        fetch_pool = stack.enter_context(make_fetch_pool(specs, settings))
+        parse_pool = stack.enter_context(ParsePool(extract_article, workers=settings.parse_workers,
+                                                   backend=settings.parser_backend))
+        browsers = stack.enter_context(browser_pool(specs, settings))
+        if settings.metrics_port is not None:
+            stack.enter_context(MetricsServer(metrics, settings.metrics_port))
+        if settings.progress:
+            stack.enter_context(ProgressLine(metrics))
+        try:
+            async with AsyncFetcher(fetch_pool, settings.fetch_concurrency * len(specs)) as fetcher:
+                written = await asyncio.gather(*(
+                    crawl_site_async(spec, settings, fetcher, fetch_pool, parse_pool, archive, metrics, browsers)
+                    for spec in specs))
+        finally:
+            if archive is not None:
+                archive.close()
+        report(fetch_pool, metrics)
+        return {spec.name: count for spec, count in zip(specs, written)}
+
+
+def run_async(sites, settings=None, metrics=None):
+    """``engine.run`` on one event loop: crawl ``sites`` and return ``{source name: articles written}``.
+
+    Ctrl-C cancels the sources' coroutines; each saves what it has written
+    before the interrupt is re-raised.
+    """
+    settings = settings or CrawlSettings()
+    configure_logging(settings.log_level)
+    specs = [get_site(site) if isinstance(site, str) else site for site in sites]
+    return asyncio.run(_run(specs, settings, metrics or Metrics()))
@@ -0,0 +1,271 @@
+"""Compressed, content-addressed archive of the article pages that were fetched.
+
+Keeping the raw HTML means an extractor fix only needs a re-extract over the
+archive (``python -m scraper reextract``) instead of a new crawl.
+
+Layout of an archive directory::
+
+    index.sqlite           url -> payload digest, source, listing date, fetch time
+    shard-00000.warc.zst   WARC/1.1 response records, one compressed frame each
+    shard-00001.warc.zst   ...
+
+Records hold the body as it was downloaded, in its own charset, which the
+index keeps next to the payload. Every record is compressed on its own (a zstd frame, or a gzip member when
+``zstandard`` is not installed), which is the usual ``.warc.gz`` layout, so
+shards can be read by standard WARC tools and any record can be decompressed
+alone from the offset the index gives. Payloads are keyed by their SHA-1
+(``WARC-Payload-Digest``): a page fetched again unchanged, or served under
+several URLs, is stored once and the index points every URL at it.
+"""
+
+import base64
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from .fetch import FetchResult
+
+SHARD_SIZE = 256 * 1024 * 1024
+CODECS = ('zstd', 'gzip')
+SUFFIXES = {'zstd': '.warc.zst', 'gzip': '.warc.gz'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS payloads (
+    digest TEXT PRIMARY KEY,
+    shard TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    encoding TEXT
+);
+CREATE TABLE IF NOT EXISTS pages (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL UNIQUE,
+    source TEXT NOT NULL,
+    digest TEXT NOT NULL REFERENCES payloads (digest),
+    status INTEGER NOT NULL,
+    listing_date TEXT,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_source ON pages (source, seq);
+"""
+
+
+def default_codec():
+    """``'zstd'`` when the ``zstandard`` package is importable, else ``'gzip'``."""
+    try:
+        import zstandard  # noqa: F401
+        return 'zstd'
+    except ImportError:
+        return 'gzip'
+
+
+def _compress(codec, data):
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(codec, data):
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _codec_of(shard):
+    return next(codec for codec, suffix in SUFFIXES.items() if shard.endswith(suffix))
+
+
+def payload_digest(payload):
+    return 'sha1:' + base64.b32encode(hashlib.sha1(payload).digest()).decode('ascii')
+
+
+def warc_response(url, status_code, payload, digest, headers=None, encoding='utf-8'):
+    """One WARC/1.1 ``response`` record for a page whose body is ``payload`` (HTML in ``encoding``)."""
+    http_headers = [f'HTTP/1.1 {status_code} OK', f'Content-Type: text/html; charset={encoding}',
+                    f'Content-Length: {len(payload)}']
+    http_headers += [f'{name}: {value}' for name, value in (headers or {}).items() if value]
+    block = ('\r\n'.join(http_headers) + '\r\n\r\n').encode('utf-8') + payload
+    warc_headers = [
+        'WARC/1.1',
+        'WARC-Type: response',
+        f'WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>',
+        f"WARC-Date: {datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}",
+        f'WARC-Target-URI: {url}',
+        f'WARC-Payload-Digest: {digest}',
+        'Content-Type: application/http; msgtype=response',
+        f'Content-Length: {len(block)}',
+    ]
+    return ('\r\n'.join(warc_headers) + '\r\n\r\n').encode('utf-8') + block + b'\r\n\r\n'
+
+
+def _record_payload(record):
+    """The HTTP body inside a decompressed WARC response record."""
+    _, _, block = record.partition(b'\r\n\r\n')
+    _, _, body = block.partition(b'\r\n\r\n')
+    return body[:-4] if body.endswith(b'\r\n\r\n') else body
+
+
+class HtmlArchive:
+    """Append-only store of fetched article pages, safe to share between crawl threads."""
+
+    def __init__(self, directory, codec=None, shard_size=SHARD_SIZE):
+        self.directory = directory
+        self.codec = codec or default_codec()
+        if self.codec not in CODECS:
+            raise ValueError(f"Unknown archive codec {self.codec!r}; expected one of {', '.join(CODECS)}")
+        self.shard_size = shard_size
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, 'index.sqlite'), check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+        # Archives from before raw bodies were kept hold UTF-8 payloads, which a missing encoding stands for
+        if 'encoding' not in [row[1] for row in self._db.execute('PRAGMA table_info(payloads)')]:
+            self._db.execute('ALTER TABLE payloads ADD COLUMN encoding TEXT')
+        self._lock = threading.Lock()
+        self._shard = None
+        self._shard_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            if self._shard_file is not None:
+                self._shard_file.close()
+                self._shard_file = None
+            self._db.close()
+
+    def _open_shard(self):
+        """The shard to append to, starting a new one when the current one is full."""
+        suffix = SUFFIXES[self.codec]
+        if self._shard_file is not None:
+            if self._shard_file.tell() < self.shard_size:
+                return self._shard, self._shard_file
+            self._shard_file.close()
+            number = int(self._shard[6:11]) + 1
+        else:
+            # Carry on with the last shard of an earlier run if it has room and the same codec
+            existing = sorted(name for name in os.listdir(self.directory) if name.startswith('shard-'))
+            number = int(existing[-1][6:11]) if existing else 0
+            if existing and (not existing[-1].endswith(suffix)
+                             or os.path.getsize(os.path.join(self.directory, existing[-1])) >= self.shard_size):
+                number += 1
+        self._shard = f'shard-{number:05d}{suffix}'
+        self._shard_file = open(os.path.join(self.directory, self._shard), 'ab')
+        return self._shard, self._shard_file
+
+    def store(self, source, result, listing_date=None):
+        """Archive the body of a 200 ``FetchResult``; unchanged content is only indexed again.
+
+        The downloaded bytes in ``result.content`` are kept as they came;
+        results without them are stored as UTF-8 text.
+        """
+        if result.content is not None:
+            payload, encoding = result.content, result.encoding or 'utf-8'
+        else:
+            payload, encoding = result.text.encode('utf-8'), 'utf-8'
+        digest = payload_digest(payload)
+        with self._lock:
+            known = self._db.execute('SELECT 1 FROM payloads WHERE digest = ?', (digest,)).fetchone()
+        compressed = None
+        if known is None:
+            # Compress outside the lock so crawl threads do not queue behind each other
+            record = warc_response(result.url, result.status_code, payload, digest,
+                                   {'ETag': result.etag, 'Last-Modified': result.last_modified}, encoding)
+            compressed = _compress(self.codec, record)
+        with self._lock:
+            if compressed is not None and self._db.execute(
+                    'SELECT 1 FROM payloads WHERE digest = ?', (digest,)).fetchone() is None:
+                shard, shard_file = self._open_shard()
+                offset = shard_file.tell()
+                shard_file.write(compressed)
+                self._db.execute(
+                    'INSERT INTO payloads (digest, shard, offset, length, encoding) VALUES (?, ?, ?, ?, ?)',
+                    (digest, shard, offset, len(compressed), encoding))
+            # Replacing moves the URL to the end, so sources re-extract in the order of their latest crawl
+            self._db.execute(
+                'INSERT OR REPLACE INTO pages (url, source, digest, status, listing_date, fetched_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (result.url, source, digest, result.status_code, listing_date, time.time()),
+            )
+
+    def _flush(self):
+        if self._shard_file is not None:
+            self._shard_file.flush()
+        self._db.commit()
+
+    def flush(self):
+        """Make everything stored so far durable."""
+        with self._lock:
+            self._flush()
+
+    def __contains__(self, url):
+        with self._lock:
+            return self._db.execute('SELECT 1 FROM pages WHERE url = ?', (url,)).fetchone() is not None
+
+    def _read(self, shard, offset, length, encoding, handles):
+        handle = handles.get(shard)
+        if handle is None:
+            handle = handles[shard] = open(os.path.join(self.directory, shard), 'rb')
+        handle.seek(offset)
+        payload = _record_payload(_decompress(_codec_of(shard), handle.read(length)))
+        try:
+            return payload.decode(encoding or 'utf-8', errors='replace')
+        except LookupError:
+            # A charset Python does not know, which ``requests`` also falls back from
+            return payload.decode('utf-8', errors='replace')
+
+    def get(self, url):
+        """The archived HTML of ``url``, or None."""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT shard, offset, length, encoding FROM pages JOIN payloads USING (digest) WHERE url = ?',
+                (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        handles = {}
+        try:
+            return self._read(*row, handles)
+        finally:
+            for handle in handles.values():
+                handle.close()
+
+    def count(self, source=None):
+        with self._lock:
+            if source is None:
+                return self._db.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+            return self._db.execute('SELECT COUNT(*) FROM pages WHERE source = ?', (source,)).fetchone()[0]
+
+    def results(self, source):
+        """Yield ``(FetchResult, listing_date)`` for every archived page of ``source``, in crawl order.
+
+        The results look like fresh 200 responses, so they can be fed straight
+        to ``ParsePool.parse``. The index is read in one go up front; the
+        pages themselves are read lazily, one record at a time.
+        """
+        with self._lock:
+            self._flush()
+            rows = self._db.execute(
+                'SELECT url, listing_date, shard, offset, length, encoding FROM pages JOIN payloads USING (digest) '
+                'WHERE source = ? ORDER BY seq', (source,)
+            ).fetchall()
+        handles = {}
+        try:
+            for url, listing_date, shard, offset, length, encoding in rows:
+                yield FetchResult(url, 200, self._read(shard, offset, length, encoding, handles),
+                                  encoding=encoding), listing_date
+        finally:
+            for handle in handles.values():
+                handle.close()
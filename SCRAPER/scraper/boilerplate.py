@@ -0,0 +1,163 @@
+"""Paragraph-level boilerplate filtering of article bodies.
+
+A source's body selector takes every ``<p>`` of the story container. On GMA
+and Philstar that container also holds related-story teasers ("READ: ...",
+"RELATED: ..."), photo credits, ad slot labels, and promo or sign-off
+paragraphs printed under thousands of stories. They waste tokens downstream
+and make different articles look like near duplicates. A paragraph is
+dropped, for one of these reasons, when:
+
+``links``
+    more than ``LINK_DENSITY`` of its text is link text, as in lists of
+    teaser links;
+``teaser``
+    it matches ``TEASER_PATTERNS`` or the source's own
+    ``SiteSpec.boilerplate_patterns``;
+``repeated``
+    the same paragraph (a 64-bit hash of its text, ignoring case and
+    spacing) already appeared in ``REPEAT_ARTICLES`` earlier articles of the
+    source.
+
+``split_paragraphs`` decides the first two in the pass over the parsed
+``<p>`` nodes that collects the text, on the parse workers. The third needs
+the whole corpus. ``ParagraphCounts`` is a per-source frequency table of
+paragraph hashes, kept in the crawl state across runs, and
+``strip_repeated`` applies it as articles are written. A repeated paragraph
+is only recognised from its ``REPEAT_ARTICLES + 1``-th article on, so the
+first articles that carry it keep it.
+
+The bytes removed, per reason, go to the ``boilerplate_bytes`` counter of
+``Metrics`` and are logged at the end of each source.
+"""
+
+import re
+from functools import lru_cache
+from hashlib import blake2b
+
+from .seen import HashSet
+
+# Share of a paragraph's text inside links above which it is a list of links, not prose
+LINK_DENSITY = 0.5
+# Articles a paragraph may appear in before later copies are dropped as boilerplate
+REPEAT_ARTICLES = 3
+REASONS = ('links', 'teaser', 'repeated')
+
+# Matched case-insensitively against the start of each stripped paragraph
+TEASER_PATTERNS = (
+    # Related-story links: "READ: ...", "RELATED STORIES | ...", "WATCH - ..."
+    r'(?:READ(?: MORE| ALSO)?|ALSO READ|RELATED(?: STORY| STORIES| ARTICLES?)?|SEE ALSO|WATCH|LISTEN|'
+    r'MORE STORIES)\s*[:|\-–—]',
+    # Ad slot labels
+    r'(?:ADVERTISEMENT|SPONSORED(?: CONTENT)?|CONTINUE READING BELOW|SCROLL(?: DOWN)? TO CONTINUE'
+    r'(?: WITH CONTENT)?)\W*$',
+    # Photo and video credits standing as a paragraph of their own
+    r'[(\[]?(?:(?:FILE|CONTRIBUTED) )?(?:PHOTO|IMAGE|VIDEO|SCREENGRAB|SCREENSHOT)'
+    r'(?:\s+(?:BY|FROM|COURTESY(?:\s+OF)?)\b|\s*:).{0,120}$',
+)
+
+
+@lru_cache(maxsize=None)
+def teaser_re(patterns=()):
+    """``TEASER_PATTERNS`` and a source's own ``patterns`` as one case-insensitive regex."""
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in TEASER_PATTERNS + tuple(patterns)), re.IGNORECASE)
+
+
+def split_paragraphs(container, patterns=(), keep_empty=False):
+    """``(paragraphs, removed)``: the text of ``container``'s ``<p>`` elements, minus link lists and teasers.
+
+    ``removed`` maps ``'links'`` and ``'teaser'`` to the bytes of UTF-8 text
+    dropped for them. Empty paragraphs are only kept with ``keep_empty``.
+    """
+    teaser = teaser_re(tuple(patterns))
+    paragraphs = []
+    removed = {}
+    for paragraph in container.select('p'):
+        text = paragraph.text().strip()
+        if not text:
+            if keep_empty:
+                paragraphs.append(text)
+            continue
+        if teaser.match(text):
+            reason = 'teaser'
+        elif sum(len(link.text().strip()) for link in paragraph.select('a')) > LINK_DENSITY * len(text):
+            reason = 'links'
+        else:
+            paragraphs.append(text)
+            continue
+        removed[reason] = removed.get(reason, 0) + len(text.encode('utf-8'))
+    return paragraphs, removed
+
+
+def paragraph_hash(text):
+    """64-bit hash of a paragraph, ignoring case and runs of whitespace."""
+    normalized = ' '.join(text.split()).lower()
+    return int.from_bytes(blake2b(normalized.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class ParagraphCounts:
+    """How many of a source's articles each paragraph appeared in, by ``paragraph_hash``.
+
+    Most paragraphs appear only once. Those are kept in a ``seen.HashSet``
+    at 8 bytes each, and only the repeated ones get a dict entry.
+    """
+
+    def __init__(self, counts=()):
+        once = []
+        self._repeated = {}
+        for value, count in counts:
+            if count > 1:
+                self._repeated[value] = count
+            else:
+                once.append(value)
+        self._once = HashSet(once)
+        self._changed = set()
+
+    def count(self, value):
+        return self._repeated.get(value) or (1 if value in self._once else 0)
+
+    def add(self, value):
+        if value in self._repeated:
+            self._repeated[value] += 1
+        elif not self._once.add(value):
+            self._repeated[value] = 2
+        self._changed.add(value)
+
+    def changes(self):
+        """``(hash, count)`` of the paragraphs counted since the last call, for saving them."""
+        changed = [(value, self.count(value)) for value in self._changed]
+        self._changed.clear()
+        return changed
+
+
+def strip_repeated(article, counts, threshold=REPEAT_ARTICLES):
+    """Drop ``article``'s paragraphs already in ``threshold`` earlier articles, and count its own in ``counts``.
+
+    ``article`` is an ``extractors.Article`` with ``paragraphs``; its text is
+    rebuilt without the dropped ones, and given a note when nothing is left.
+    Returns ``{reason: bytes}`` of everything removed from the article,
+    including what the extractor dropped.
+    """
+    removed = dict(article.boilerplate or {})
+    kept = []
+    repeated = 0
+    counted = set()
+    for text in article.paragraphs:
+        if not text:
+            kept.append(text)
+            continue
+        value = paragraph_hash(text)
+        if counts.count(value) >= threshold:
+            repeated += len(text.encode('utf-8'))
+        else:
+            kept.append(text)
+        # A paragraph printed twice in one article still counts once
+        if value not in counted:
+            counted.add(value)
+            counts.add(value)
+    if repeated:
+        removed['repeated'] = repeated
+        article.paragraphs = kept
+        article.text = ' '.join(kept)
+        if not any(kept):
+            article.note = "Only boilerplate in paragraphs"
+    return removed
@@ -0,0 +1,199 @@
+"""A pool of headless Chrome instances for the listings that need JavaScript.
+
+Discovery only falls back to a browser when a listing feed cannot be read
+over HTTP, but then every source used to start its own full Chrome, with
+images, fonts, video, ads and trackers all loading. ``BrowserPool`` keeps up
+to ``size`` headless instances, started only when first needed and shared by
+the crawl threads, so several listings render side by side on a fixed
+budget of browsers. Each instance gets its own process because Selenium
+drivers are not safe to share between threads.
+
+With ``block_resources`` the browsers do not load:
+
+* images, media and fonts (by Chrome setting and by URL pattern, via the
+  DevTools ``Network.setBlockedURLs`` command);
+* known ad and tracker hosts;
+* anything from a host outside ``allowed_hosts`` and their subdomains, which
+  covers third-party scripts and widgets (Chrome's host resolver rules).
+
+Pages are opened with the ``eager`` load strategy, so ``get`` returns once the
+DOM is ready instead of after every subresource.
+"""
+
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BROWSERS = 2
+BLOCKED_URL_PATTERNS = (
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico',
+    '*.mp4', '*.webm', '*.m3u8', '*.mp3', '*.woff', '*.woff2', '*.ttf', '*.otf',
+    '*doubleclick.net*', '*googlesyndication.com*', '*googletagservices.com*', '*googletagmanager.com*',
+    '*google-analytics.com*', '*adservice.google.*', '*amazon-adsystem.com*', '*facebook.net*',
+    '*scorecardresearch.com*', '*chartbeat.*', '*taboola.com*', '*outbrain.com*', '*criteo.*',
+    '*pubmatic.com*', '*quantserve.com*', '*hotjar.com*',
+)
+# Second-level labels under which a country registers domains (gov.ph, com.au, ...)
+PUBLIC_SECOND_LEVELS = {'com', 'net', 'org', 'gov', 'edu', 'co', 'ac'}
+
+# Resolves with the number of cards once more than arguments[1] are on the page and no element
+# has been added for arguments[2] milliseconds, so a batch that arrives in pieces is read whole
+WAIT_FOR_CARDS_SCRIPT = """
+const [itemSelector, minCount, quietMs] = arguments;
+const done = arguments[arguments.length - 1];
+const count = () => document.querySelectorAll(itemSelector).length;
+let timer = null;
+const observer = new MutationObserver(() => check());
+const check = () => {
+    if (count() <= minCount) return;
+    clearTimeout(timer);
+    timer = setTimeout(() => { observer.disconnect(); done(count()); }, quietMs);
+};
+observer.observe(document.documentElement, {childList: true, subtree: true});
+check();
+"""
+
+
+def site_domain(url):
+    """The registered domain of ``url``'s host: ``www.gmanetwork.com`` -> ``gmanetwork.com``."""
+    labels = (urlsplit(url).hostname or '').split('.')
+    keep = 3 if len(labels) > 2 and labels[-2] in PUBLIC_SECOND_LEVELS else 2
+    return '.'.join(labels[-keep:])
+
+
+def wait_for_cards(driver, item_selector, more_than=0, wait_seconds=15, quiet_seconds=0.5):
+    """Wait until more than ``more_than`` cards match and the page has stopped adding elements.
+
+    Returns the card count. Raises Selenium's ``TimeoutException`` when no
+    new card shows up within ``wait_seconds``.
+    """
+    driver.set_script_timeout(wait_seconds + quiet_seconds)
+    return driver.execute_async_script(WAIT_FOR_CARDS_SCRIPT, item_selector, more_than, int(quiet_seconds * 1000))
+
+
+class BrowserPool:
+    """Up to ``size`` headless Chrome drivers, lent out one at a time with ``acquire``."""
+
+    def __init__(self, size=DEFAULT_BROWSERS, headless=True, block_resources=True, allowed_hosts=()):
+        self.size = max(1, size)
+        self.headless = headless
+        self.block_resources = block_resources
+        self.allowed_hosts = sorted({host.lower() for host in allowed_hosts})
+        self._idle = queue.LifoQueue()
+        self._started = 0
+        self._lock = threading.Lock()
+        self._drivers = []
+
+    def _options(self):
+        from selenium import webdriver
+
+        options = webdriver.ChromeOptions()
+        options.page_load_strategy = 'eager'
+        if self.headless:
+            options.add_argument('--headless=new')
+        for argument in ('--disable-extensions', '--disable-dev-shm-usage', '--mute-audio',
+                         '--autoplay-policy=user-gesture-required', '--window-size=1280,2000'):
+            options.add_argument(argument)
+        if self.block_resources:
+            options.add_argument('--blink-settings=imagesEnabled=false')
+            options.add_argument('--disable-remote-fonts')
+            options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+            if self.allowed_hosts:
+                excluded = ', '.join(f'EXCLUDE {pattern}' for host in self.allowed_hosts
+                                     for pattern in (host, f'*.{host}'))
+                options.add_argument(f'--host-resolver-rules=MAP * ~NOTFOUND, {excluded}')
+        return options
+
+    def _start(self):
+        from selenium import webdriver
+
+        driver = webdriver.Chrome(options=self._options())
+        if self.block_resources:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(BLOCKED_URL_PATTERNS)})
+        logger.info("Started a headless browser (at most %d).", self.size)
+        return driver
+
+    def _take(self):
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                start = self._started < self.size
+                if start:
+                    self._started += 1
+            if start:
+                break
+            # Check again now and then: a broken browser that was discarded frees a slot
+            try:
+                return self._idle.get(timeout=1)
+            except queue.Empty:
+                continue
+        try:
+            driver = self._start()
+        except BaseException:
+            with self._lock:
+                self._started -= 1
+            raise
+        with self._lock:
+            self._drivers.append(driver)
+        return driver
+
+    def _release(self, driver):
+        try:
+            # Stop the page's scripts while the driver waits for its next listing
+            driver.get('about:blank')
+        except Exception:
+            self._discard(driver)
+            return
+        self._idle.put(driver)
+
+    def _discard(self, driver):
+        with self._lock:
+            if driver not in self._drivers:
+                return  # Already quit by close()
+            self._drivers.remove(driver)
+            self._started -= 1
+        try:
+            driver.quit()
+        except Exception as exc:
+            logger.debug("Could not quit a broken browser: %s", exc)
+
+    @contextmanager
+    def acquire(self):
+        """Borrow a driver, starting a browser if none is idle and fewer than ``size`` are running.
+
+        A driver that raised an error is quit rather than handed to the next
+        caller; one given back because its listing was closed early is kept.
+        """
+        driver = self._take()
+        try:
+            yield driver
+        except Exception:
+            self._discard(driver)
+            raise
+        except BaseException:
+            self._release(driver)
+            raise
+        self._release(driver)
+
+    def close(self):
+        with self._lock:
+            drivers, self._drivers = self._drivers, []
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception as exc:
+                logger.debug("Could not quit a browser: %s", exc)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,198 @@
+"""Tsek claim extraction as a batch text stage, separate from parsing.
+
+A Tsek fact-check is reduced in two steps:
+
+1. ``read_tsek_page`` parses the page once and keeps only what the rules
+   look at: the first figure's image alt text, the claim blockquote and the
+   paragraph texts of ``div.main-content``, as a ``TsekPage``. This is the
+   part that needs a parser and runs on the ``ParsePool`` processes.
+2. ``claim_texts`` applies the text rules to a batch of ``TsekPage``: pages
+   whose first figure is captioned "accurate" are rejected; the blockquote
+   wins when there is one; otherwise the ``CLAIM`` label opening the first
+   paragraph (when a text-only ``<strong>`` there says CLAIM) and the empty
+   ``rating{}`` placeholder are stripped, and the paragraphs quoting five or
+   more words are kept. The regexes are compiled once, and paragraphs
+   without a quote character skip the quote scan altogether. Only a leading
+   label is removed, so "claim" in the text itself is left alone; the
+   original ``tsek.py`` removed every word CLAIM from the first paragraph,
+   and rows extracted that way carry Tsek's ``rules_version`` 1.
+
+``extractors.extract_tsek`` is the two steps for one page. ``claims_from_archive``
+runs them over the Tsek pages of the HTML archive and ``clean_csv`` applies
+the text normalisation to an existing ``label,article`` CSV, both in
+batches, reporting documents per second:
+
+    python -m scraper claims --archive html_archive --output fake.csv
+    python -m scraper claims --csv fake.csv --output fake_clean.csv
+"""
+
+import logging
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+from .dataset import read_rows
+from .output import open_csv_output
+from .parsing import DEFAULT_BACKEND, parse_html
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 512
+TSEK_TARGETS = [('div', 'main-content')]
+CLAIM_RE = re.compile(r'CLAIM', re.IGNORECASE)
+# The "CLAIM" label that opens a claim paragraph, and the empty rating placeholder printed with it
+CLAIM_LABEL_RE = re.compile(r'^\s*CLAIM\b:?\s*', re.IGNORECASE)
+RATING_PLACEHOLDER_RE = re.compile(r'rating\{\}', re.IGNORECASE)
+QUOTE_RE = re.compile(r'["“]([^"”]+)["”]')
+QUOTE_CHARS = ('"', '“')
+MIN_QUOTED_WORDS = 5
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+@dataclass
+class TsekPage:
+    """The parts of a Tsek page the claim rules read; ``found`` is False without ``div.main-content``."""
+
+    found: bool = True
+    figure_alt: str = None
+    # None when the page has no blockquote
+    blockquote: str = None
+    paragraphs: list = field(default_factory=list)
+    # The first paragraph has a <strong> mentioning CLAIM
+    claim_label: bool = False
+
+
+def read_tsek_page(html, backend=DEFAULT_BACKEND, restricted=True):
+    """Parse a Tsek page into a ``TsekPage``."""
+    doc = parse_html(html, backend, TSEK_TARGETS if restricted else None)
+    main_content = doc.select_one('div.main-content')
+    if main_content is None:
+        return TsekPage(found=False)
+    page = TsekPage()
+
+    first_figure = main_content.select_one('figure')
+    if first_figure is not None:
+        image = next((child for child in first_figure.children()
+                      if child.tag == 'img' and child.attr('alt') is not None), None)
+        if image is not None:
+            page.figure_alt = image.attr('alt')
+
+    blockquote = main_content.select_one('blockquote')
+    if blockquote is not None:
+        page.blockquote = blockquote.text(strip=True)
+        return page
+
+    paragraphs = main_content.select('p')
+    page.paragraphs = [p.text(strip=True) for p in paragraphs]
+    # Only a <strong> holding nothing but text counts, like find('strong', string=...)
+    page.claim_label = bool(paragraphs) and any(CLAIM_RE.search(strong.string() or '')
+                                                for strong in paragraphs[0].select('strong'))
+    return page
+
+
+def strip_claim_label(text):
+    """``text`` without a leading "CLAIM" label and without rating placeholders; other "claim" words stay."""
+    return CLAIM_LABEL_RE.sub('', RATING_PLACEHOLDER_RE.sub('', text), count=1).strip()
+
+
+def quotes_enough_words(text):
+    """True when ``text`` quotes at least ``MIN_QUOTED_WORDS`` words in one quotation."""
+    if QUOTE_CHARS[0] not in text and QUOTE_CHARS[1] not in text:
+        return False
+    return any(len(quote.split()) >= MIN_QUOTED_WORDS for quote in QUOTE_RE.findall(text))
+
+
+def claim_text(page):
+    """``(text, note)`` for one ``TsekPage``; ``text`` is empty and ``note`` says why when nothing is kept."""
+    if not page.found:
+        return '', "Could not find 'main-content'"
+    if page.figure_alt is not None and 'accurate' in page.figure_alt.strip().lower():
+        return '', "First figure > img alt text contains 'accurate'"
+    if page.blockquote is not None:
+        return page.blockquote, None if page.blockquote else "Empty blockquote"
+
+    paragraphs = page.paragraphs
+    if page.claim_label:
+        paragraphs = [strip_claim_label(paragraphs[0]), *paragraphs[1:]]
+    qualifying = [text for text in paragraphs if quotes_enough_words(text)]
+    if qualifying:
+        return ' '.join(qualifying), None
+    return '', "No blockquote or qualifying quoted text found"
+
+
+def claim_texts(pages):
+    """``claim_text`` over a batch of pages."""
+    return [claim_text(page) for page in pages]
+
+
+def clean_text(text):
+    """An extracted article with a leftover leading claim label and placeholders removed and whitespace collapsed."""
+    return WHITESPACE_RE.sub(' ', strip_claim_label(text)).strip()
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _parsed_pages(parse_pool, archived, stats):
+    """The pages of ``archived`` results that parsed, counting the others as skipped."""
+    for result, page in parse_pool.parse(result for result, _ in archived):
+        if page is None:
+            logger.warning("An error occurred while parsing archived page %s: %s", result.url, result.error)
+            stats['documents'] += 1
+            stats['skipped']['Could not parse page'] += 1
+            continue
+        yield page
+
+
+def claims_from_archive(archive_dir, output, label='0', source='tsek', workers=None, backend=DEFAULT_BACKEND,
+                        batch_size=DEFAULT_BATCH_SIZE):
+    """Write the claims of ``source``'s archived pages to a ``label,article`` CSV.
+
+    Pages are parsed on a ``ParsePool`` and the rules applied per batch.
+    Returns counts: ``documents``, ``written``, the notes of the pages left
+    out, and ``documents_per_second``.
+    """
+    from .archive import HtmlArchive
+    from .pipeline import ParsePool
+
+    stats = {'documents': 0, 'written': 0, 'skipped': Counter()}
+    started = time.perf_counter()
+    csv_file, csv_writer = open_csv_output(output)
+    with csv_file, HtmlArchive(archive_dir) as archive, \
+            ParsePool(read_tsek_page, workers=workers, backend=backend) as parse_pool:
+        for pages in _batched(_parsed_pages(parse_pool, archive.results(source), stats), batch_size):
+            for text, note in claim_texts(pages):
+                stats['documents'] += 1
+                if text:
+                    csv_writer.writerow([label, text])
+                    stats['written'] += 1
+                else:
+                    stats['skipped'][note] += 1
+    stats['documents_per_second'] = stats['documents'] / max(time.perf_counter() - started, 1e-9)
+    return stats
+
+
+def clean_csv(inputs, output, batch_size=DEFAULT_BATCH_SIZE):
+    """Normalise the articles of ``label,article`` CSVs with ``clean_text`` into one CSV, dropping empty ones."""
+    stats = {'documents': 0, 'written': 0}
+    started = time.perf_counter()
+    csv_file, csv_writer = open_csv_output(output)
+    with csv_file:
+        for path in inputs:
+            for rows in _batched(read_rows(path), batch_size):
+                cleaned = [(label, clean_text(text)) for label, text in rows]
+                kept = [row for row in cleaned if row[1]]
+                csv_writer.writerows(kept)
+                stats['documents'] += len(rows)
+                stats['written'] += len(kept)
+    stats['documents_per_second'] = stats['documents'] / max(time.perf_counter() - started, 1e-9)
+    return stats
@@ -0,0 +1,196 @@
+"""Random access to the ``label,article`` CSVs without loading them.
+
+Articles span several lines inside quoted fields and the files start with a
+UTF-8 BOM, so neither line numbers nor a seek to the middle of the file find
+a row. ``CorpusReader`` scans the file once for the byte offset where each row
+starts and keeps those offsets in a sidecar index (``<csv>.idx``):
+
+* a newline ends a row only outside quotes, so the scan jumps from quote to
+  quote and newline to newline with ``find`` over the memory-mapped file,
+  which runs in C, and never decodes the text;
+* row ``i`` is then one slice of the mapping, parsed with ``csv``, so
+  ``reader[i]``, ``sample`` and ``batches`` cost the same at any size and
+  only touch the pages they read;
+* the index remembers how much of the file it covers, with a digest of its
+  beginning and end. When a scraper has appended rows since, only the new
+  bytes are scanned (``refresh``); a file that was rewritten is indexed
+  again from scratch.
+
+    reader = CorpusReader('DATASETS/philstar_politics_news.csv')
+    label, article = reader[1234]
+    for batch in reader.batches(64, shuffle=True, seed=0):
+        ...
+"""
+
+import csv
+import hashlib
+import mmap
+import os
+import random
+import struct
+from array import array
+
+BOM = b'\xef\xbb\xbf'
+INDEX_SUFFIX = '.idx'
+INDEX_MAGIC = b'CSVIDX01'
+# magic, bytes of the CSV covered, start of the first row, digest of the covered bytes' ends
+INDEX_HEADER = struct.Struct('<8sQQ16s')
+# Bytes at each end of the covered part that go into its digest
+DIGEST_SPAN = 4096
+
+
+def _rows_from(data, start, end, limit=None):
+    """Start offsets of the rows in ``data[start:end]`` (at most ``limit``) and where the complete ones end.
+
+    A row not terminated by a newline is included, but the returned end
+    stays at its start, so a later scan reads it again once it is complete.
+    """
+    offsets = []
+    position = start
+    while position < end and (limit is None or len(offsets) < limit):
+        offsets.append(position)
+        scan = position
+        newline = data.find(b'\n', scan, end)
+        while True:
+            # Skip each quoted section whole; an escaped "" closes and reopens one
+            quote = data.find(b'"', scan, end if newline < 0 else newline)
+            if quote < 0:
+                break
+            closing = data.find(b'"', quote + 1, end)
+            if closing < 0:
+                newline = -1
+                break
+            scan = closing + 1
+            if newline < scan:
+                newline = data.find(b'\n', scan, end)
+        if newline < 0:
+            return offsets, position
+        position = newline + 1
+    return offsets, position
+
+
+class CorpusReader:
+    """Indexed, memory-mapped reader of a CSV whose fields may hold newlines."""
+
+    def __init__(self, path, index_path=None):
+        self.path = path
+        self.index_path = index_path or path + INDEX_SUFFIX
+        self._file = open(path, 'rb')
+        self._map = None
+        self._offsets = array('Q')
+        self._indexed = 0
+        self._data_start = 0
+        self.header = []
+        self.refresh()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def _remap(self):
+        if self._map is not None:
+            self._map.close()
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def _digest(self, end):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self._map[:min(DIGEST_SPAN, end)])
+        digest.update(self._map[max(0, end - DIGEST_SPAN):end])
+        return digest.digest()
+
+    def _load_index(self):
+        """The stored index if it still describes the start of the file, else None."""
+        try:
+            with open(self.index_path, 'rb') as index_file:
+                magic, indexed, data_start, digest = INDEX_HEADER.unpack(index_file.read(INDEX_HEADER.size))
+                offsets = array('Q')
+                offsets.frombytes(index_file.read())
+        except (OSError, struct.error, ValueError):
+            return None
+        if magic != INDEX_MAGIC or indexed > len(self._map) or digest != self._digest(indexed):
+            return None
+        return offsets, indexed, data_start
+
+    def _save_index(self):
+        temporary = self.index_path + '.tmp'
+        with open(temporary, 'wb') as index_file:
+            index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, self._indexed, self._data_start,
+                                               self._digest(self._indexed)))
+            index_file.write(self._offsets.tobytes())
+        os.replace(temporary, self.index_path)
+
+    def refresh(self):
+        """Pick up rows appended since the index was built; returns how many rows were added."""
+        self._remap()
+        size = len(self._map)
+        before = len(self._offsets)
+        header_start = len(BOM) if self._map[:len(BOM)] == BOM else 0
+        stored = self._load_index()
+        if stored is None:
+            _, header_end = _rows_from(self._map, header_start, size, limit=1)
+            if header_end == header_start:
+                # Not even a complete header line yet
+                self.header = self._parse(header_start, size) if size > header_start else []
+                self._offsets, self._indexed, self._data_start = array('Q'), header_start, header_start
+                return -before
+            self._offsets, self._indexed, self._data_start = array('Q'), header_end, header_end
+        else:
+            offsets, indexed, self._data_start = stored
+            # Drop a last row that was still being written when it was indexed
+            while offsets and offsets[-1] >= indexed:
+                offsets.pop()
+            self._offsets, self._indexed = offsets, indexed
+        self.header = self._parse(header_start, self._data_start)
+        offsets, indexed = _rows_from(self._map, self._indexed, size)
+        self._offsets.extend(offsets)
+        if stored is None or indexed != self._indexed:
+            self._indexed = indexed
+            self._save_index()
+        return len(self._offsets) - before
+
+    def _end(self, index):
+        return self._offsets[index + 1] if index + 1 < len(self._offsets) else len(self._map)
+
+    def _parse(self, start, end):
+        text = self._map[start:end].decode('utf-8')
+        return next(csv.reader([text]), [])
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, index):
+        """The fields of row ``index`` (data rows only, from 0; negative counts from the end)."""
+        if index < 0:
+            index += len(self._offsets)
+        if not 0 <= index < len(self._offsets):
+            raise IndexError(index)
+        return self._parse(self._offsets[index], self._end(index))
+
+    def __iter__(self):
+        for index in range(len(self._offsets)):
+            yield self._parse(self._offsets[index], self._end(index))
+
+    def column(self, name):
+        """Position of the ``name`` column, for picking fields out of rows."""
+        return self.header.index(name)
+
+    def sample(self, count, seed=None):
+        """``count`` distinct rows picked at random, without reading the others."""
+        indexes = random.Random(seed).sample(range(len(self._offsets)), min(count, len(self._offsets)))
+        return [self[index] for index in indexes]
+
+    def batches(self, batch_size, shuffle=False, seed=None):
+        """Yield lists of up to ``batch_size`` rows covering the whole file once, in file or random order."""
+        order = list(range(len(self._offsets)))
+        if shuffle:
+            random.Random(seed).shuffle(order)
+        for start in range(0, len(order), batch_size):
+            yield [self[index] for index in order[start:start + batch_size]]
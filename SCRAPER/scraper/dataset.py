@@ -0,0 +1,216 @@
+"""Compile the scraped CSVs into one deduplicated, balanced train/validation/test set.
+
+``compile_dataset`` streams every input ``label,article`` CSV once:
+
+* Exact duplicates are dropped by a hash of the normalised text (lower case,
+  words only), so re-scraped or re-encoded copies of an article collapse.
+* Near duplicates (syndicated and lightly edited republications) are found
+  with MinHash + LSH. Signatures use one-permutation hashing with rotation
+  densification: one hash per word 5-gram, spread over ``SIGNATURE_SIZE``
+  bins, which costs O(words) per article instead of O(words x permutations).
+  The signature is cut into ``BANDS`` bands; articles sharing a band are
+  candidates, and a candidate whose estimated Jaccard similarity is at
+  least ``threshold`` makes the later article a duplicate. The first
+  occurrence wins, so list the preferred sources first.
+
+Kept articles, hashes, LSH buckets and signatures live in a scratch SQLite
+database, not in memory, so memory stays flat as the corpus grows.
+Balancing down-samples every label to the smallest one, and the split and
+the final shuffle are done with ``ORDER BY`` on a seeded random key, which
+SQLite sorts on disk. The outputs are ``train.csv``, ``validation.csv`` and
+``test.csv`` in the same ``label,article`` format as the inputs.
+"""
+
+import bisect
+import csv
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import zlib
+from array import array
+
+from .output import open_csv_output
+
+SHINGLE_WORDS = 5
+SIGNATURE_SIZE = 128
+BANDS = 16
+ROWS_PER_BAND = SIGNATURE_SIZE // BANDS
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_SPLITS = (0.8, 0.1, 0.1)
+SPLIT_NAMES = ('train', 'validation', 'test')
+WORD_RE = re.compile(r'\w+')
+# Large enough that a densified bin never equals a real one
+EMPTY_BIN_OFFSET = 1 << 32
+
+SCHEMA = """
+CREATE TABLE docs (id INTEGER PRIMARY KEY, label TEXT NOT NULL, text TEXT NOT NULL,
+                   sort_key INTEGER NOT NULL, split TEXT);
+CREATE TABLE exact (digest BLOB PRIMARY KEY) WITHOUT ROWID;
+CREATE TABLE signatures (id INTEGER PRIMARY KEY, signature BLOB NOT NULL);
+CREATE TABLE buckets (band INTEGER NOT NULL, bucket INTEGER NOT NULL, id INTEGER NOT NULL);
+CREATE INDEX buckets_lookup ON buckets (band, bucket);
+"""
+
+
+def normalized_words(text):
+    return WORD_RE.findall(text.lower())
+
+
+def minhash(words, size=SIGNATURE_SIZE):
+    """One-permutation MinHash signature of the word ``SHINGLE_WORDS``-grams in ``words``."""
+    if len(words) < SHINGLE_WORDS:
+        shingles = [' '.join(words)]
+    else:
+        shingles = [' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+    bins = [None] * size
+    for shingle in shingles:
+        value = zlib.crc32(shingle.encode('utf-8'))
+        index, rank = value % size, value // size
+        if bins[index] is None or rank < bins[index]:
+            bins[index] = rank
+    # Rotation densification: an empty bin borrows from the next filled one, marked by the distance
+    if None in bins:
+        filled = [i for i, rank in enumerate(bins) if rank is not None]
+        sparse = list(bins)
+        for i, rank in enumerate(sparse):
+            if rank is None:
+                position = bisect.bisect_left(filled, i)
+                source = filled[position] if position < len(filled) else filled[0]
+                bins[i] = sparse[source] + ((source - i) % size) * EMPTY_BIN_OFFSET
+    return array('Q', bins)
+
+
+def similarity(signature, other):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(a == b for a, b in zip(signature, other)) / len(signature)
+
+
+def band_buckets(signature):
+    """One 63-bit bucket key per LSH band."""
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes()
+        keys.append(int.from_bytes(hashlib.blake2b(rows, digest_size=8).digest(), 'big') >> 1)
+    return keys
+
+
+def read_rows(path):
+    """Yield ``(label, article)`` from a ``label,article`` CSV, with or without a BOM."""
+    with open(path, encoding='utf-8-sig', newline='') as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader, None)
+        if header is None:
+            return
+        label_column, text_column = header.index('label'), header.index('article')
+        for row in reader:
+            if len(row) > max(label_column, text_column):
+                yield row[label_column], row[text_column]
+
+
+class _Deduplicator:
+    """Exact and near-duplicate filter over the scratch database."""
+
+    def __init__(self, db, threshold):
+        self.db = db
+        self.threshold = threshold
+
+    def is_exact_duplicate(self, words):
+        digest = hashlib.blake2b(' '.join(words).encode('utf-8'), digest_size=16).digest()
+        return self.db.execute('INSERT OR IGNORE INTO exact (digest) VALUES (?)', (digest,)).rowcount == 0
+
+    def near_duplicate_of(self, signature, buckets):
+        """The id of a kept article at least ``threshold`` similar to ``signature``, or None."""
+        candidates = set()
+        for band, bucket in enumerate(buckets):
+            candidates.update(row[0] for row in self.db.execute(
+                'SELECT id FROM buckets WHERE band = ? AND bucket = ?', (band, bucket)))
+        for candidate in sorted(candidates):
+            stored = array('Q')
+            stored.frombytes(self.db.execute(
+                'SELECT signature FROM signatures WHERE id = ?', (candidate,)).fetchone()[0])
+            if similarity(signature, stored) >= self.threshold:
+                return candidate
+        return None
+
+    def add(self, doc_id, signature, buckets):
+        self.db.execute('INSERT INTO signatures (id, signature) VALUES (?, ?)', (doc_id, signature.tobytes()))
+        self.db.executemany('INSERT INTO buckets (band, bucket, id) VALUES (?, ?, ?)',
+                            [(band, bucket, doc_id) for band, bucket in enumerate(buckets)])
+
+
+def compile_dataset(inputs, output_dir, splits=DEFAULT_SPLITS, balance=True, threshold=DEFAULT_THRESHOLD,
+                    seed=0, min_words=1, work_dir=None):
+    """Deduplicate ``inputs`` (CSV paths, preferred first) and write the split CSVs to ``output_dir``.
+
+    Returns a dict of counts: rows read, exact and near duplicates dropped,
+    kept articles per label, and rows per split.
+    """
+    if len(splits) != len(SPLIT_NAMES) or abs(sum(splits) - 1) > 1e-6:
+        raise ValueError(f"splits must be {len(SPLIT_NAMES)} fractions adding up to 1, got {splits}")
+    # Articles can be longer than the csv module's default 128 KiB field limit
+    csv.field_size_limit(2 ** 31 - 1)
+    os.makedirs(output_dir, exist_ok=True)
+    rng = random.Random(seed)
+    stats = {'read': 0, 'too_short': 0, 'exact_duplicates': 0, 'near_duplicates': 0}
+
+    with tempfile.TemporaryDirectory(dir=work_dir or output_dir, prefix='.compile-') as scratch:
+        db = sqlite3.connect(os.path.join(scratch, 'compile.sqlite'))
+        db.execute('PRAGMA journal_mode=OFF')
+        db.execute('PRAGMA synchronous=OFF')
+        db.executescript(SCHEMA)
+        dedup = _Deduplicator(db, threshold)
+        try:
+            for path in inputs:
+                for label, text in read_rows(path):
+                    stats['read'] += 1
+                    words = normalized_words(text)
+                    if len(words) < min_words:
+                        stats['too_short'] += 1
+                        continue
+                    if dedup.is_exact_duplicate(words):
+                        stats['exact_duplicates'] += 1
+                        continue
+                    signature = minhash(words)
+                    buckets = band_buckets(signature)
+                    if dedup.near_duplicate_of(signature, buckets) is not None:
+                        stats['near_duplicates'] += 1
+                        continue
+                    doc_id = db.execute('INSERT INTO docs (label, text, sort_key) VALUES (?, ?, ?)',
+                                        (label, text, rng.getrandbits(62))).lastrowid
+                    dedup.add(doc_id, signature, buckets)
+                db.commit()
+
+            per_label = dict(db.execute('SELECT label, COUNT(*) FROM docs GROUP BY label ORDER BY label'))
+            stats['kept'] = per_label
+            keep = min(per_label.values()) if balance and per_label else None
+
+            # Stratified split: every label is cut at the same fractions of its shuffled order
+            for label, count in per_label.items():
+                count = keep if keep is not None else count
+                train_end, validation_end = round(count * splits[0]), round(count * (splits[0] + splits[1]))
+                db.execute(
+                    'WITH ranked AS (SELECT id, ROW_NUMBER() OVER (ORDER BY sort_key) - 1 AS position '
+                    '                FROM docs WHERE label = ?) '
+                    'UPDATE docs SET split = CASE WHEN ranked.position < ? THEN ? '
+                    '                             WHEN ranked.position < ? THEN ? ELSE ? END '
+                    'FROM ranked WHERE docs.id = ranked.id AND ranked.position < ?',
+                    (label, train_end, SPLIT_NAMES[0], validation_end, SPLIT_NAMES[1], SPLIT_NAMES[2], count),
+                )
+            db.commit()
+
+            stats['splits'] = {}
+            for split in SPLIT_NAMES:
+                csv_file, csv_writer = open_csv_output(os.path.join(output_dir, f'{split}.csv'))
+                with csv_file:
+                    rows = db.execute('SELECT label, text FROM docs WHERE split = ? ORDER BY sort_key', (split,))
+                    written = 0
+                    for row in rows:
+                        csv_writer.writerow(row)
+                        written += 1
+                stats['splits'][split] = written
+        finally:
+            db.close()
+    return stats
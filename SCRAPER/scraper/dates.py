@@ -0,0 +1,67 @@
+"""Publication dates from the text the sites show and from article URLs.
+
+``parse_date`` turns the date strings found on listing cards, in listing
+feeds and on article pages into a ``datetime.date``. It understands:
+
+* ISO 8601 dates and datetimes (``2024-05-12``, ``2024-05-12T08:00:00+08:00``),
+  as in ``<time datetime>`` attributes, feeds and sitemap ``lastmod``;
+* ``2024/05/12``;
+* month-name dates, anywhere in the text: ``May 12, 2024 8:00am``,
+  ``Published July 16, 2025 | 12:00am``, ``12 May 2024``, ``Sept. 3, 2023``;
+* Unix timestamps in seconds or milliseconds, as some JSON feeds give them.
+
+The calendar date is the one written in the text; a time zone offset is not
+applied. ``url_date`` reads a ``/YYYY/MM/DD/`` segment from an article URL,
+which Philstar's links carry.
+"""
+
+import re
+from datetime import date, datetime, timezone
+
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12,
+}
+_YEAR = r'((?:19|20)\d{2})'
+_MONTH_NAME = r'(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?'
+NUMERIC_DATE_RE = re.compile(_YEAR + r'[-/](\d{1,2})[-/](\d{1,2})(?!\d)')
+MONTH_DAY_YEAR_RE = re.compile(r'\b' + _MONTH_NAME + r'\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+' + _YEAR + r'\b',
+                               re.IGNORECASE)
+DAY_MONTH_YEAR_RE = re.compile(r'\b(\d{1,2})\s+' + _MONTH_NAME + r',?\s+' + _YEAR + r'\b', re.IGNORECASE)
+TIMESTAMP_RE = re.compile(r'^\d{10}(\d{3})?$')
+URL_DATE_RE = re.compile(r'/' + _YEAR + r'/(\d{1,2})/(\d{1,2})(?:/|$)')
+
+
+def _date(year, month, day):
+    try:
+        return date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
+def parse_date(text):
+    """The calendar date in ``text``, or None when there is no recognisable date."""
+    if text is None:
+        return None
+    text = str(text).strip()
+    if TIMESTAMP_RE.match(text):
+        seconds = int(text) / (1000 if len(text) == 13 else 1)
+        return datetime.fromtimestamp(seconds, timezone.utc).date()
+    match = NUMERIC_DATE_RE.search(text)
+    if match:
+        return _date(*match.groups())
+    match = MONTH_DAY_YEAR_RE.search(text)
+    if match:
+        month, day, year = match.groups()
+        return _date(year, MONTHS[month[:3].lower()], day)
+    match = DAY_MONTH_YEAR_RE.search(text)
+    if match:
+        day, month, year = match.groups()
+        return _date(year, MONTHS[month[:3].lower()], day)
+    return None
+
+
+def url_date(url):
+    """The date in a ``/YYYY/MM/DD/`` segment of ``url``, or None."""
+    match = URL_DATE_RE.search(url or '')
+    return _date(*match.groups()) if match else None
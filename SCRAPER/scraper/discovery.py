@@ -0,0 +1,230 @@
+"""Listing discovery: find article links without driving a browser.
+
+The GMA and Philstar grids load more stories from a paged feed as you scroll,
+and Tsek's fact-check category is a plain WordPress paginated listing, so all
+of them can be read directly over HTTP with the shared session. Selenium is
+kept only as a fallback for when a feed stops answering or changes shape.
+
+Every discovery function yields one list of ``ListingItem`` per listing page
+(or per scroll, for the Selenium fallback, which renders on a shared
+``browser.BrowserPool``).
+"""
+
+import json
+import logging
+from dataclasses import dataclass
+from urllib.parse import urljoin
+
+import requests
+
+from .browser import wait_for_cards
+from .politeness import DisallowedByRobots
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 10
+
+# Keys the GMA/Philstar feeds use for a story's link and publication date
+LINK_KEYS = ('article_url', 'url', 'link', 'permalink', 'href')
+DATE_KEYS = ('date', 'publish_date', 'date_published', 'datetime', 'pubdate', 'published')
+
+
+# Reads the cards from index arguments[1] onwards inside the browser, so every
+# scroll only transfers the newly appended cards instead of the whole page
+NEW_CARDS_SCRIPT = """
+const [itemSelector, start, linkSelector, dateSelector] = arguments;
+return Array.from(document.querySelectorAll(itemSelector)).slice(start).map(card => {
+    const anchor = card.querySelector(linkSelector);
+    const date = dateSelector ? card.querySelector(dateSelector) : null;
+    return [anchor ? anchor.href : null,
+            date ? (date.textContent.trim() || date.getAttribute('datetime')) : null];
+});
+"""
+
+
+@dataclass
+class ListingItem:
+    """An article link found on a listing page, with the card's date text when shown.
+
+    ``modified`` is a last-modified date (a sitemap ``lastmod``): the article
+    was published on or before it.
+    """
+
+    url: str
+    date_text: str = None
+    modified: str = None
+
+
+def json_feed_items(payload, base_url):
+    """Collect every story in a JSON feed, whatever the nesting of its lists."""
+    items = []
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+        elif isinstance(node, dict):
+            link = next((node[key] for key in LINK_KEYS if isinstance(node.get(key), str)), None)
+            if link:
+                date_text = next((str(node[key]) for key in DATE_KEYS if node.get(key)), None)
+                items.append(ListingItem(urljoin(base_url, link), date_text))
+            else:
+                stack.extend(reversed(list(node.values())))
+    return items
+
+
+def html_listing_items(html, base_url, item_selector, link_selector='a[href]', date_selector=None):
+    """Collect the article cards matching ``item_selector`` from a listing page."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    items = []
+    for card in soup.select(item_selector):
+        anchor_tag = card.select_one(link_selector)
+        if not anchor_tag or not anchor_tag.get('href'):
+            continue
+        date_text = None
+        if date_selector:
+            date_tag = card.select_one(date_selector)
+            if date_tag:
+                date_text = date_tag.get_text(strip=True) or date_tag.get('datetime')
+        items.append(ListingItem(urljoin(base_url, anchor_tag['href']), date_text))
+    return items
+
+
+def parse_listing(response, item_selector=None, link_selector='a[href]', date_selector=None):
+    """Read a feed page as JSON when it is JSON, otherwise as listing HTML."""
+    if 'json' in response.headers.get('Content-Type', '') or response.text.lstrip()[:1] in ('{', '['):
+        try:
+            return json_feed_items(json.loads(response.text), response.url)
+        except ValueError:
+            pass
+    if not item_selector:
+        return []
+    return html_listing_items(response.text, response.url, item_selector, link_selector, date_selector)
+
+
+def http_listing(session, page_url, item_selector=None, link_selector='a[href]', date_selector=None,
+                 first_page=1, max_pages=None, timeout=DEFAULT_TIMEOUT, validators=None):
+    """Yield the items of ``page_url.format(page=n)`` for n = first_page, first_page + 1, ...
+
+    ``session`` is a ``requests.Session`` or anything with the same ``get``,
+    such as a ``FetchPool``, whose ``get`` is rate limited per host.
+
+    Stops at the first page that is missing (404), has no items, or repeats
+    the previous page (some feeds ignore an out-of-range page number).
+
+    With ``validators`` (a ``CrawlState``) pages are requested conditionally
+    and listing stops at the first page the server reports as unchanged
+    (304), since nothing new has been published there since the last run.
+    """
+    page = first_page
+    previous_urls = None
+    while max_pages is None or page < first_page + max_pages:
+        url = page_url.format(page=page)
+        headers = validators.conditional_headers([url], any_status=True).get(url) if validators else None
+        response = session.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 404:
+            return
+        if response.status_code == 304:
+            # An empty batch rather than nothing, so discover() does not fall back to Selenium
+            logger.info("Listing page %s unchanged since the last run.", url)
+            yield []
+            return
+        response.raise_for_status()
+        if validators:
+            validators.save_validators(url, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        items = parse_listing(response, item_selector, link_selector, date_selector)
+        page_urls = [item.url for item in items]
+        if not items or page_urls == previous_urls:
+            return
+        previous_urls = page_urls
+        yield items
+        page += 1
+
+
+def browser_listing_items(driver, item_selector, link_selector='a[href]', date_selector=None, start=0):
+    """Read the cards from index ``start`` onwards straight from the browser's DOM."""
+    rows = driver.execute_script(NEW_CARDS_SCRIPT, item_selector, start, link_selector, date_selector)
+    return [ListingItem(link, date_text) for link, date_text in rows if link]
+
+
+def selenium_scroll_listing(browsers, url, item_selector, link_selector='a[href]', date_selector=None,
+                            wait_seconds=15, quiet_seconds=0.5):
+    """Fallback: open ``url`` in a pooled browser and yield the new cards after every scroll to the bottom.
+
+    Keeps a high-water mark of cards already read, waits in the page for the
+    card count to grow and then settle rather than sleeping or re-parsing
+    ``page_source``, and pulls only the cards appended since the last
+    scroll, so each scroll costs the same however long the page has grown.
+    ``browsers`` is a ``browser.BrowserPool``.
+    """
+    from selenium.common.exceptions import TimeoutException
+
+    with browsers.acquire() as driver:
+        driver.get(url)
+        seen_count = 0
+        while True:
+            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+            try:
+                total_count = wait_for_cards(driver, item_selector, seen_count, wait_seconds, quiet_seconds)
+            except TimeoutException:
+                logger.info("Timeout occurred while waiting for new content to load. No more content or slow loading.")
+                return
+            items = browser_listing_items(driver, item_selector, link_selector, date_selector, start=seen_count)
+            seen_count = total_count
+            if items:
+                yield items
+
+
+def selenium_paged_listing(browsers, url, item_selector, next_selector, link_selector='a[href]', date_selector=None,
+                           wait_seconds=15, quiet_seconds=0.5):
+    """Fallback: open each listing page in a pooled browser, following ``next_selector`` links."""
+    from selenium.webdriver.common.by import By
+    from selenium.common.exceptions import NoSuchElementException, TimeoutException
+
+    with browsers.acquire() as driver:
+        while url:
+            driver.get(url)
+            try:
+                wait_for_cards(driver, item_selector, 0, wait_seconds, quiet_seconds)
+            except TimeoutException:
+                logger.info("Timeout waiting for listing items on page %s. Assuming no more content.", url)
+                return
+            items = browser_listing_items(driver, item_selector, link_selector, date_selector)
+            if not items:
+                return
+            yield items
+            try:
+                url = driver.find_element(By.CSS_SELECTOR, next_selector).get_attribute('href')
+            except NoSuchElementException:
+                return
+
+
+def discover(http_factory, selenium_factory, mode='http'):
+    """Yield listing batches from the HTTP feed, falling back to Selenium.
+
+    ``mode`` is ``'http'`` (feed first, browser only if the feed gives nothing
+    on its first page) or ``'selenium'`` (browser only). The factories are
+    called lazily so no browser is started unless it is needed.
+    """
+    if mode == 'http':
+        yielded = False
+        try:
+            for items in http_factory():
+                yielded = True
+                yield items
+        except DisallowedByRobots as exc:
+            # Not something the browser should work around
+            logger.warning("%s. Stopping discovery.", exc)
+            return
+        except (requests.exceptions.RequestException, ValueError) as exc:
+            if yielded:
+                logger.warning("Listing feed failed part-way through: %s. Stopping discovery.", exc)
+                return
+            logger.warning("Listing feed unavailable (%s). Falling back to Selenium.", exc)
+        else:
+            if yielded:
+                return
+            logger.warning("Listing feed returned no articles. Falling back to Selenium.")
+    yield from selenium_factory()
@@ -0,0 +1,433 @@
+"""The crawl spread over several worker processes, on one host or many, sharing a frontier.
+
+One crawl process is held to one IP's allowance and one machine's parsers.
+A distributed crawl splits ``engine.crawl_site`` in three steps around a
+shared ``frontier``:
+
+``discover``
+    walks the sources' listings the way ``crawl_site`` does
+    (``SourceCrawl.select``, on this host's crawl state) and adds the
+    article links to the frontier. It stays at most ``DISCOVERY_AHEAD`` URLs
+    ahead of the workers per source, so that a newest-first listing ends
+    soon after a worker finds the first article before the window.
+``work``
+    leases batches of URLs, fetches and parses them on its own pools, and
+    writes every article to its own CSV shard with all the columns
+    (``output.SHARD_COLUMNS``). Each article gets ``SourceCrawl.handle``'s
+    decision, with a ``FrontierState`` in place of the crawl state; its
+    checkpoint flushes the shard before it reports the batch's outcomes, as
+    ``CrawlState.checkpoint`` does. An article before a newest-first
+    source's window drops the older URLs still waiting and ends the source.
+    A source's ``max_articles`` is kept by the frontier, which only leases
+    its URLs while the articles written and in flight stay within it.
+``merge``
+    appends the shards' rows to each source's ``label,article`` CSV (and
+    columnar copies), keeping a row only if the frontier recorded its URL as
+    written to that shard. A worker that lost its lease may have written a
+    row that another worker wrote again; only the accepted one is kept, so
+    every article appears exactly once. The frontier remembers the rows a
+    merge added, so a merge can be repeated, and rows written by earlier
+    runs, single-process ones included, stay in the output.
+
+``run_distributed`` does all three on one host: discovery in this process,
+``workers`` worker processes on a SQLite frontier, and the merge once the
+frontier is empty. The per-host rate is split between the workers, and
+they parse inline, since the processes are the parallelism. Across
+machines the steps run separately, with the same ``SCRAPER_FRONTIER_KEY``:
+
+    python -m scraper serve-frontier crawl_frontier.sqlite --listen tcp://0.0.0.0:5151
+    python -m scraper discover --frontier tcp://coordinator:5151
+    python -m scraper work --frontier tcp://coordinator:5151       (on every worker host)
+    python -m scraper merge --frontier tcp://coordinator:5151 --shard-dir shards
+
+Every worker host crawls at its own ``--rate``. Shards are named after their
+worker, so they can be copied into one directory for the merge. Repeated
+paragraphs (``boilerplate``) are counted by each worker over the articles
+it handles, and its fetched pages go to its own archive under
+``archive_dir``.
+"""
+
+import csv
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import ExitStack
+from dataclasses import replace
+
+from .archive import HtmlArchive
+from .boilerplate import ParagraphCounts
+from .engine import CrawlSettings, SourceCrawl, browser_pool, listing_batches, make_fetch_pool, report
+from .extractors import extract_article
+from .frontier import DISCOVERING, LEASE_SECONDS, SqliteFrontier, open_frontier
+from .metrics import configure_logging, Metrics
+from .output import SHARD_COLUMNS, BatchedSink, CsvSink, OutputRow
+from .pipeline import ParsePool
+from .seen import HashSet, url_hash
+from .sites import get_site
+from .state import CrawlState, OUT_OF_RANGE, WRITTEN
+
+logger = logging.getLogger(__name__)
+
+# URLs of one source waiting in the frontier before discovery pauses for the workers
+DISCOVERY_AHEAD = 200
+# URLs a worker leases at a time
+LEASE_URLS = 32
+# Seconds between looks at the frontier while waiting on it
+POLL_SECONDS = 2.0
+
+
+def _specs(sites):
+    return [get_site(site) if isinstance(site, str) else site for site in sites]
+
+
+def default_worker_name():
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+class FrontierState:
+    """What ``SourceCrawl.handle`` and ``checkpoint`` need of a ``CrawlState``, for URLs leased from a frontier.
+
+    Outcomes are held until ``checkpoint``, which flushes the shard and only
+    then reports them under the leases they came with. Leased URLs the
+    worker never got to are handed back.
+    """
+
+    def __init__(self, frontier, source, shard):
+        self.frontier = frontier
+        self.source = source
+        self.shard = shard
+        # Outcomes the frontier refused because the lease had been handed on
+        self.refused = 0
+        self._leases = {}
+        self._handled = set()
+        self._pending_urls = {}
+        self._paragraphs = ParagraphCounts()
+
+    def take(self, leases):
+        self._leases.update((lease.url, lease) for lease in leases)
+
+    def handled(self, url):
+        self._handled.add(url)
+
+    def count(self, status=WRITTEN):
+        """URLs of the source with ``status``, by every worker."""
+        return self.frontier.count(self.source, status)
+
+    def status(self, url):
+        # Leased URLs have no outcome anywhere else yet
+        return self._pending_urls.get(url, (None,))[0]
+
+    def mark(self, url, status, http_status=None):
+        self._pending_urls[url] = (status, http_status)
+
+    def save_validators(self, url, etag, last_modified):
+        # Every leased URL is new to the crawl, so there is nothing to request conditionally
+        pass
+
+    def paragraph_counts(self):
+        return self._paragraphs
+
+    def checkpoint(self, output_file=None):
+        """Report the outcomes of the leased URLs, after flushing the rows they describe."""
+        if output_file is not None:
+            output_file.flush()
+        outcomes = []
+        unhandled = []
+        for url, lease in self._leases.items():
+            if url in self._handled:
+                status, http_status = self._pending_urls.get(url, (None, None))
+                outcomes.append((lease.token, status, http_status, self.shard if status == WRITTEN else None))
+            else:
+                unhandled.append(lease.token)
+        if outcomes:
+            self.refused += len(outcomes) - self.frontier.complete(outcomes)
+        if unhandled:
+            self.frontier.release(unhandled)
+        self._leases.clear()
+        self._handled.clear()
+        self._pending_urls.clear()
+
+
+def _discover_site(spec, settings, frontier, fetch_pool, cancel, metrics, browsers):
+    """Add ``spec``'s listing links to ``frontier`` until the listing ends or the source is stopped."""
+    prefix = f"[{spec.name}]"
+    added = 0
+    if frontier.source_state(spec.name) != DISCOVERING:
+        logger.info("%s Already discovered.", prefix)
+        return added
+    with CrawlState(settings.state_path, spec.name) as crawl_state:
+        if not settings.resume:
+            crawl_state.reset()
+        if settings.incremental:
+            # The outcomes are the workers', so an incremental listing can end at an article saved before
+            for url, outcome in frontier.done(spec.name):
+                if not crawl_state.is_done(url):
+                    crawl_state.mark(url, outcome)
+        crawl = SourceCrawl(spec, settings, None, crawl_state, metrics=metrics)
+        listing = listing_batches(spec, settings, fetch_pool, crawl_state, crawl.first_page(), browsers)
+        ended = True
+        for page_number, listing_items, finished_shard in listing:
+            links, stop = crawl.select(listing_items)
+            added += frontier.add(spec.name, [(url, crawl.listing_dates.pop(url, None)) for url in links])
+            # Wait for the workers, who may find that the source has ended
+            while (not cancel.is_set() and frontier.source_state(spec.name) == DISCOVERING
+                   and frontier.pending(spec.name) > DISCOVERY_AHEAD):
+                cancel.wait(POLL_SECONDS)
+            ended = not cancel.is_set()
+            stop = stop or not ended or frontier.source_state(spec.name) != DISCOVERING
+            crawl.checkpoint(page_number, finished_shard, stop)
+            if stop:
+                break
+        listing.close()
+    if ended:
+        frontier.finish_source(spec.name)
+    logger.info("%s Added %d article links to the frontier.", prefix, added)
+    return added
+
+
+def discover(sites, settings, frontier, cancel=None, metrics=None):
+    """Add the article links of ``sites``' listings to ``frontier``, each source on its own thread.
+
+    Returns ``{source name: links added}``. A source the frontier already
+    has as finished or stopped is not listed again, unless the crawl is
+    incremental: then it is listed from the first page for new articles.
+    """
+    specs = _specs(sites)
+    _open_sources(specs, settings, frontier)
+    return _discover(specs, settings, frontier, cancel, metrics)
+
+
+def _open_sources(specs, settings, frontier):
+    for spec in specs:
+        frontier.open_source(spec.name, reopen=settings.incremental)
+
+
+def _discover(specs, settings, frontier, cancel=None, metrics=None):
+    cancel = cancel or threading.Event()
+    metrics = metrics or Metrics()
+    with ExitStack() as stack:
+        fetch_pool = stack.enter_context(make_fetch_pool(specs, settings))
+        browsers = stack.enter_context(browser_pool(specs, settings))
+        listers = ThreadPoolExecutor(max_workers=len(specs), thread_name_prefix='discover')
+        futures = {spec.name: listers.submit(_discover_site, spec, settings, frontier, fetch_pool, cancel, metrics,
+                                             browsers)
+                   for spec in specs}
+        try:
+            wait(futures.values())
+        except KeyboardInterrupt:
+            logger.warning("Interrupted. Saving the listing positions before stopping...")
+            cancel.set()
+            raise
+        finally:
+            listers.shutdown(wait=True)
+        return {name: future.result() for name, future in futures.items()}
+
+
+def _crawl_batch(crawl, leases, fetch_pool, parse_pool, cancel):
+    """Fetch, parse and write or skip ``leases`` of ``crawl``'s source; returns the articles written."""
+    state = crawl.crawl_state
+    state.take(leases)
+    # Rows written by the other workers count towards max_articles too
+    crawl.articles_scraped = state.count(WRITTEN)
+    written_before = crawl.articles_scraped
+    crawl.listing_dates.update((lease.url, lease.listing_date) for lease in leases)
+    stop = False
+    ended_at = None
+    fetched = fetch_pool.fetch([lease.url for lease in leases])
+    for result, article in parse_pool.parse(fetched, crawl.spec):
+        if cancel.is_set():
+            break
+        stop = crawl.handle(result, article)
+        state.handled(result.url)
+        if stop:
+            # Past the window: only the older links are dropped. Over max_articles: all of them
+            ended_at = result.url if state.status(result.url) == OUT_OF_RANGE else None
+            break
+    refused = state.refused
+    crawl.checkpoint(None, None, stop or cancel.is_set())
+    if state.refused > refused:
+        logger.warning("%s %d outcomes came after their lease was handed to another worker; their rows are "
+                       "left out of the merge.", crawl.prefix, state.refused - refused)
+    if stop:
+        state.frontier.stop_source(crawl.spec.name, after=ended_at)
+        logger.info("%s Ended the source at %s.", crawl.prefix, ended_at or f'{crawl.spec.max_articles} articles')
+    return crawl.articles_scraped - written_before
+
+
+def work(sites, settings, frontier, worker=None, cancel=None, lease_urls=LEASE_URLS, lease_seconds=LEASE_SECONDS):
+    """Crawl URLs of ``sites`` leased from ``frontier`` until it is finished or ``cancel`` is set.
+
+    Articles go to a new shard ``<worker>-<time>.csv`` in ``settings.shard_dir``.
+    Returns ``{source name: articles written by this worker}``.
+    """
+    worker = worker or default_worker_name()
+    specs = {spec.name: spec for spec in _specs(sites)}
+    cancel = cancel or threading.Event()
+    metrics = Metrics()
+    os.makedirs(settings.shard_dir, exist_ok=True)
+    shard = f'{worker}-{time.strftime("%Y%m%d-%H%M%S")}.csv'
+    written = Counter()
+    crawls = {}
+    # max_articles is held by the frontier, which leases no more URLs than the articles still allowed
+    quotas = {name: spec.max_articles for name, spec in specs.items() if spec.max_articles is not None}
+    with ExitStack() as stack:
+        fetch_pool = stack.enter_context(make_fetch_pool(list(specs.values()), settings))
+        parse_pool = stack.enter_context(ParsePool(extract_article, workers=settings.parse_workers,
+                                                   backend=settings.parser_backend))
+        sink = stack.enter_context(BatchedSink([CsvSink(os.path.join(settings.shard_dir, shard),
+                                                        columns=SHARD_COLUMNS)],
+                                               settings.batch_rows, settings.flush_seconds))
+        archive = None
+        if settings.archive_dir:
+            archive = stack.enter_context(HtmlArchive(os.path.join(settings.archive_dir, worker)))
+        logger.info("[%s] Writing to %s.", worker, os.path.join(settings.shard_dir, shard))
+        while not cancel.is_set():
+            leases = frontier.lease(worker, lease_urls, lease_seconds, sorted(specs), quotas)
+            if not leases:
+                if frontier.finished():
+                    break
+                cancel.wait(POLL_SECONDS)
+                continue
+            batches = {}
+            for lease in leases:
+                batches.setdefault(lease.source, []).append(lease)
+            for source, batch in batches.items():
+                if source not in crawls:
+                    crawls[source] = SourceCrawl(specs[source], settings, sink,
+                                                 FrontierState(frontier, source, shard), archive, metrics)
+                written[source] += _crawl_batch(crawls[source], batch, fetch_pool, parse_pool, cancel)
+        report(fetch_pool, metrics)
+    logger.info("[%s] Wrote %d articles (%s).", worker, sum(written.values()),
+                ', '.join(f'{source} {count}' for source, count in sorted(written.items())) or 'none')
+    return dict(written)
+
+
+def _work_process(sites, settings, location, worker):
+    """Entry point of a worker process: ``work`` until done, finishing the batch in hand on SIGINT or SIGTERM."""
+    configure_logging(settings.log_level)
+    cancel = threading.Event()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda *args: cancel.set())
+    with open_frontier(location) as frontier:
+        work(sites, settings, frontier, worker, cancel)
+
+
+def _shard_rows(path):
+    """Yield the rows of a shard as dicts, up to a row left unfinished by a worker that died while writing it."""
+    with open(path, encoding='utf-8-sig', newline='') as shard_file:
+        try:
+            yield from csv.DictReader(shard_file)
+        except csv.Error as e:
+            logger.warning("Shard %s ends in a broken row (%s); the rest of it is skipped.", path, e)
+
+
+def merge(sites, settings, frontier):
+    """Append to each source's output the rows of the workers' shards that the frontier accepted.
+
+    Rows an earlier merge added are not added again. Returns ``{source
+    name: rows added}``.
+    """
+    # Articles can be longer than the csv module's default 128 KiB field limit
+    csv.field_size_limit(2 ** 31 - 1)
+    specs = {spec.name: spec for spec in _specs(sites)}
+    written = Counter()
+    emitted = {name: HashSet() for name in specs}
+    dropped = 0
+    shards = sorted(frontier.shards())
+    with ExitStack() as stack:
+        sinks = {}
+        for shard in shards:
+            path = os.path.join(settings.shard_dir, shard)
+            if not os.path.exists(path):
+                logger.warning("Shard %s is missing; copy it into %s and merge again.", shard, settings.shard_dir)
+                continue
+            accepted = {}
+            for source, url in frontier.accepted(shard):
+                accepted.setdefault(source, HashSet()).add(url_hash(url))
+            if not accepted:
+                continue
+            merged = []
+            for row in _shard_rows(path):
+                source = row.get('source')
+                hashed = url_hash(row.get('url') or '')
+                if source not in specs or hashed not in accepted.get(source, ()) or not emitted[source].add(hashed):
+                    dropped += 1
+                    continue
+                if source not in sinks:
+                    sinks[source] = stack.enter_context(settings.open_sink(specs[source], resume=True))
+                sinks[source].write(OutputRow(row['label'], row['article'], row['url'], source, row['published'],
+                                              row['extraction_version']))
+                merged.append((source, row['url']))
+                written[source] += 1
+            # The rows are on disk before the frontier counts them as merged
+            for sink in sinks.values():
+                sink.flush()
+            frontier.mark_merged(merged)
+    for source, count in sorted(written.items()):
+        logger.info("[%s] Added %d articles to %s", source, count, settings.output_path(specs[source]))
+    logger.info("Merged %d shards; left out %d rows not accepted by the frontier, merged before or of other "
+                "sources.", len(shards), dropped)
+    return dict(written)
+
+
+def run_distributed(sites, settings=None, workers=2):
+    """Crawl ``sites`` with ``workers`` worker processes on this host, then merge their shards.
+
+    The frontier is the SQLite file ``settings.frontier_path``. Without
+    ``settings.resume`` it, the crawl state, the shards and the sources'
+    outputs start over. Returns ``{source name: articles added to the output}``.
+    """
+    settings = settings or CrawlSettings()
+    configure_logging(settings.log_level)
+    specs = _specs(sites)
+    cancel = threading.Event()
+    # Every worker gets its share of each host's rate, and parses inline
+    worker_settings = replace(settings, requests_per_second=settings.requests_per_second / workers,
+                              parse_workers=0 if settings.parse_workers is None else settings.parse_workers,
+                              progress=False, metrics_port=None)
+    with SqliteFrontier(settings.frontier_path) as frontier:
+        if not settings.resume:
+            frontier.reset()
+            if os.path.isdir(settings.shard_dir):
+                for name in os.listdir(settings.shard_dir):
+                    if name.endswith('.csv'):
+                        os.remove(os.path.join(settings.shard_dir, name))
+            for spec in specs:
+                with settings.open_sink(spec, resume=False):
+                    pass
+        # Registered (or reopened) before the workers start, so they do not find an empty frontier finished
+        _open_sources(specs, settings, frontier)
+        # Spawned, not forked, like the parse workers: this process runs threads
+        context = multiprocessing.get_context('spawn')
+        processes = [context.Process(target=_work_process, name=f'worker-{number}',
+                                     args=(specs, worker_settings, settings.frontier_path,
+                                           f'{default_worker_name()}-{number}'))
+                     for number in range(workers)]
+        for process in processes:
+            process.start()
+        try:
+            # Not reopened again: a worker may have stopped a source since
+            _discover(specs, settings, frontier, cancel)
+            for process in processes:
+                process.join()
+        except BaseException:
+            logger.warning("Stopping the workers after the batches in hand...")
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            for process in processes:
+                process.join()
+            raise
+        failed = [process.name for process in processes if process.exitcode]
+        if failed:
+            logger.warning("Workers %s failed; their leases are handed out again by the next run.",
+                           ', '.join(failed))
+        for source, counts in frontier.counts().items():
+            logger.info("[%s] Frontier: %s", source, ', '.join(f'{key} {count}' for key, count in counts.items()))
+        return merge(specs, settings, frontier)
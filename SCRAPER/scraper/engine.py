@@ -0,0 +1,539 @@
+"""The crawl loop shared by every source.
+
+``crawl_site`` walks one source's listing, claims the article URLs it has not
+handled yet, fetches them on a ``FetchPool``, parses them on a ``ParsePool``
+and writes a row for every article inside the source's year window,
+checkpointing ``CrawlState`` after each listing page. ``run`` crawls several
+sources at the same time in one process, each on its own thread, sharing the
+connection pool, the per-domain rate limits of ``FetchPool`` and the parser
+worker processes. Each domain gets its own fetch workers and token bucket, so
+the sources interleave and the total rate is the sum of their allowances.
+
+Listings are newest first, so the first article published before a
+source's date window ends that source's crawl; newer ones are skipped.
+Whenever the listing already dates an article (a card or feed date, a date
+in the URL, a sitemap ``lastmod``), that check happens before the article
+is fetched at all. Before a row is written, paragraphs the source has
+printed under several earlier articles are dropped as boilerplate
+(``boilerplate``).
+
+Every article page fetched is also kept in the ``archive.HtmlArchive``, and
+``reextract`` rebuilds the CSVs from there with the current extractors,
+without touching the network.
+
+Stage timings and counters per source are collected in a ``metrics.Metrics``,
+shown as a progress line while the crawl runs and, with ``metrics_port``,
+served for Prometheus. Per-article messages are DEBUG logs.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import ExitStack
+
+from .archive import HtmlArchive
+from .boilerplate import REASONS, ParagraphCounts, strip_repeated
+from .browser import BrowserPool, site_domain
+from .discovery import discover, http_listing, selenium_paged_listing, selenium_scroll_listing
+from .dates import parse_date, url_date
+from .extractors import extract_article
+from .fetch import FetchPool
+from .metrics import configure_logging, Metrics, MetricsServer, ProgressLine
+from .output import OutputRow
+from .pipeline import ParsePool
+from .settings import CrawlSettings
+from .sitemaps import sitemap_listing
+from .sites import get_site
+from .state import CrawlState, FAILED, OUT_OF_RANGE, REJECTED, VERDICT_STATUSES, WRITTEN
+
+logger = logging.getLogger(__name__)
+
+
+def make_fetch_pool(specs, settings):
+    """The ``FetchPool`` shared by ``specs``, with ``fetch_concurrency`` per source and the settings' deadlines."""
+    return FetchPool(concurrency=settings.fetch_concurrency * len(specs), per_host=settings.per_host_limit,
+                     timeout=settings.read_timeout, rate=settings.requests_per_second,
+                     respect_robots=settings.respect_robots, connect_timeout=settings.connect_timeout,
+                     total_timeout=settings.total_timeout, adaptive=settings.adaptive_concurrency,
+                     hedge=settings.hedge_requests)
+
+
+def report(fetch_pool, metrics):
+    """Log how each host's rate and concurrency ended up, and the stage timings, at the end of a run."""
+    limits = fetch_pool.limit_stats()
+    for host, (rate, requests, throttled) in sorted(fetch_pool.politeness.stats().items()):
+        line = f"{host}: {requests} requests, throttled {throttled} times, ending at {rate:.2f} requests/s"
+        if host in limits:
+            limit, maximum, hedged = limits[host]
+            line += f", {limit} of {maximum} at once, {hedged} hedged"
+        logger.info(line)
+    for line in metrics.stage_report():
+        logger.info(line)
+
+
+def browser_pool(specs, settings):
+    """A ``BrowserPool`` for ``specs`` that only lets the browsers load from the sources' own sites."""
+    hosts = set()
+    for spec in specs:
+        hosts.update((site_domain(spec.base_url), site_domain(spec.listing_url), *spec.browser_hosts))
+    return BrowserPool(settings.browser_instances, block_resources=settings.block_browser_resources,
+                       allowed_hosts=hosts)
+
+
+def _listing_pages(spec, settings, fetch_pool, crawl_state, first_page, browsers=None):
+    """Listing batches for ``spec``: over HTTP, or in a browser from ``browsers`` if that fails."""
+    def browser_listing():
+        pool = browsers or browser_pool([spec], settings)
+        try:
+            if spec.next_selector:
+                yield from selenium_paged_listing(pool, spec.base_url, spec.listing_item_selector, spec.next_selector,
+                                                  spec.listing_link_selector, spec.listing_date_selector,
+                                                  wait_seconds=spec.browser_wait_seconds,
+                                                  quiet_seconds=spec.browser_quiet_seconds)
+            else:
+                yield from selenium_scroll_listing(pool, spec.base_url, spec.listing_item_selector,
+                                                   spec.listing_link_selector, spec.listing_date_selector,
+                                                   wait_seconds=spec.browser_wait_seconds,
+                                                   quiet_seconds=spec.browser_quiet_seconds)
+        finally:
+            if browsers is None:
+                pool.close()
+
+    return discover(
+        lambda: http_listing(fetch_pool, spec.listing_url, spec.listing_item_selector,
+                             spec.listing_link_selector, spec.listing_date_selector, first_page=first_page,
+                             validators=crawl_state if settings.incremental else None),
+        browser_listing,
+        mode=settings.discovery_mode,
+    )
+
+
+def listing_batches(spec, settings, fetch_pool, crawl_state, first_page, browsers=None):
+    """Yield ``(page, items, finished_shard)`` from the discovery mode in ``settings``.
+
+    Listing pages come with their page number. Sitemap batches come without
+    one, and the last batch of a date shard carries the shard's key.
+    """
+    if settings.discovery_mode == 'sitemap':
+        for shard, items, complete in sitemap_listing(fetch_pool, spec, settings.shard_months,
+                                                      crawl_state.finished_shards()):
+            yield None, items, shard if complete else None
+        return
+    pages = _listing_pages(spec, settings, fetch_pool, crawl_state, first_page, browsers)
+    try:
+        for page, items in enumerate(pages, start=first_page):
+            yield page, items, None
+    finally:
+        # Hands the browser back if the Selenium fallback was used
+        pages.close()
+
+
+def _listing_position(spec, item):
+    """Where a listing item falls against ``spec``'s window before it is fetched; None when unknown.
+
+    Uses the card's or feed's date, else a date in the URL. A last-modified
+    date before the window means the article was published before it too.
+    """
+    position = spec.window_position(parse_date(item.date_text) or url_date(item.url))
+    if position is None and spec.window_position(parse_date(item.modified)) == -1:
+        return -1
+    return position
+
+
+def _published(article, listing_date, url):
+    """The publication date of a fetched article: from its page, else its listing card, else its URL."""
+    return (article.date if article is not None else None) or parse_date(listing_date) or url_date(url)
+
+
+def _timed(iterable, metrics, stage, source):
+    """Yield from ``iterable``, observing how long each item took to arrive."""
+    iterator = iter(iterable)
+    while True:
+        with metrics.timer(stage, source):
+            item = next(iterator, None)
+        if item is None:
+            return
+        yield item
+
+
+def _refetch_unjudged(results, fetch_pool, crawl_state):
+    """Yield ``results``, fetching a 304 again without conditional headers when it has no verdict to repeat."""
+    for result in results:
+        if result.not_modified and not crawl_state.has_verdict(result.url):
+            result = fetch_pool.fetch_one(result.url)
+        yield result
+
+
+def _verdict(spec, result, article, published, crawl_state):
+    """What to do with a fetched article: ``WRITTEN``, or the reason it is not written."""
+    if result.error:
+        # A 200 with an error is a page the extractor failed on
+        return 'parse_error' if result.status_code == 200 else 'request_error'
+    if result.not_modified:
+        # Unchanged since it was last fetched, so last run's verdict still holds
+        return OUT_OF_RANGE if crawl_state.status(result.url) == OUT_OF_RANGE else 'not_modified'
+    if result.status_code != 200:
+        return 'http_error'
+    position = spec.window_position(published)
+    if position is None:
+        return 'undated' if spec.skip_undated else OUT_OF_RANGE
+    if position > 0:
+        return 'too_new'
+    if position < 0:
+        return OUT_OF_RANGE
+    if article.note is not None:
+        return REJECTED
+    return WRITTEN
+
+
+class SourceCrawl:
+    """What one source's crawl decides about its listing items and fetched articles.
+
+    Shared by ``crawl_site`` and the asyncio crawler in ``aio``, which only
+    differ in how the pages are fetched and parsed. ``select`` picks the
+    listing items to fetch, ``handle`` writes or skips one fetched article,
+    and ``checkpoint`` saves progress after a listing batch. The latter two
+    return or take whether the crawl should stop.
+    """
+
+    def __init__(self, spec, settings, sink, crawl_state, archive=None, metrics=None):
+        self.spec = spec
+        self.settings = settings
+        self.sink = sink
+        self.crawl_state = crawl_state
+        self.archive = archive
+        self.metrics = metrics or Metrics()
+        self.prefix = f"[{spec.name}]"
+        # Listings are newest first, so the first article before the window ends them; sitemap
+        # entries come in no particular order and out-of-window ones are only skipped
+        self.ordered = settings.discovery_mode != 'sitemap'
+        # The crawl state remembers scraped article URLs across runs to avoid duplicates
+        self.articles_scraped = crawl_state.count(WRITTEN)
+        # Listing dates of the links selected and not handled yet
+        self.listing_dates = {}
+
+    def first_page(self):
+        """The listing page to start from: the last one fully processed, or the first when incremental."""
+        return 1 if self.settings.incremental else int(self.crawl_state.cursor(1))
+
+    def select(self, listing_items):
+        """``(links, stop)``: the article links of a listing batch that need fetching, and whether to stop after it."""
+        spec, crawl_state, metrics, prefix = self.spec, self.crawl_state, self.metrics, self.prefix
+        source = spec.name
+        links = []
+        for item in listing_items:
+            if self.ordered and self.settings.incremental and crawl_state.is_done(item.url):
+                logger.info("%s Reached an article saved by an earlier run: %s. Everything older is "
+                            "already saved.", prefix, item.url)
+                return links, True
+            if not crawl_state.claim(item.url):
+                continue
+            # Articles the listing already dates outside the window are never fetched
+            position = _listing_position(spec, item)
+            if position is not None and position < 0:
+                metrics.count('articles', source, outcome='listing_out_of_range')
+                if not self.ordered:
+                    continue
+                logger.info("%s Article %s is from %s, before %s. Stopping.", prefix, item.url,
+                            item.date_text or item.modified or 'its URL date', spec.window[0])
+                return links, True
+            if position is not None and position > 0:
+                metrics.count('articles', source, outcome='listing_too_new')
+                logger.debug("%s Skipping article %s from %s, after %s.", prefix, item.url,
+                             item.date_text or 'its URL date', spec.window[1])
+                continue
+            self.listing_dates[item.url] = item.date_text
+            links.append(item.url)
+        return links, False
+
+    def handle(self, result, article):
+        """Write or skip one fetched and parsed article; True when the crawl should stop."""
+        spec, crawl_state, metrics, prefix = self.spec, self.crawl_state, self.metrics, self.prefix
+        source = spec.name
+        article_link = result.url
+        listing_date = self.listing_dates.pop(article_link, None)
+        metrics.fetched(source, result)
+        try:
+            with metrics.timer('filter', source):
+                published = _published(article, listing_date, article_link)
+                verdict = _verdict(spec, result, article, published, crawl_state)
+                if verdict == WRITTEN and article.paragraphs is not None:
+                    self._strip_boilerplate(article)
+                    if article.note is not None:
+                        verdict = REJECTED
+            metrics.count('articles', source, outcome=verdict)
+            if result.ok and self.archive is not None:
+                self.archive.store(spec.name, result, listing_date)
+
+            if verdict == 'request_error':
+                logger.debug("%s Request error for %s: %s", prefix, article_link, result.error)
+                self._mark(result, FAILED)
+                return False
+            if verdict == 'parse_error':
+                logger.warning("%s An error occurred while parsing article link %s: %s", prefix, article_link,
+                               result.error)
+                self._mark(result, FAILED)
+                return False
+            if verdict == 'not_modified':
+                logger.debug("%s Article unchanged since the last run: %s", prefix, article_link)
+                return False
+            if verdict == OUT_OF_RANGE and result.not_modified:
+                if not self.ordered:
+                    return False
+                logger.info("%s Article %s is unchanged and still outside the year range. Stopping.",
+                            prefix, article_link)
+                return True
+            if verdict == 'http_error':
+                logger.debug("%s Failed to retrieve article. Status code: %s after %d retries for %s",
+                             prefix, result.status_code, result.retries, article_link)
+                self._mark(result, FAILED)
+                return False
+            if verdict == 'undated':
+                logger.debug("%s Skipped article, no date found: %s", prefix, article_link)
+                self._mark(result, REJECTED)
+                return False
+            if verdict == 'too_new':
+                # Not marked: a later window may want it
+                logger.debug("%s Skipping article %s from %s, after %s.", prefix, article_link,
+                             published, spec.window[1])
+                return False
+            if verdict == OUT_OF_RANGE:
+                # Not a final status, so a resumed run stops at the same place
+                self._mark(result, OUT_OF_RANGE)
+                if not self.ordered:
+                    logger.debug("%s Skipping article %s: published %s, not within %s to %s.", prefix,
+                                 article_link, published or 'N/A', *spec.window)
+                    return False
+                logger.info("%s Skipping article %s: published %s, not within %s to %s (date text: "
+                            "%r). Stopping further scraping assuming newest-first order.", prefix,
+                            article_link, published or 'N/A', *spec.window, article.date_text)
+                return True
+            if verdict == REJECTED:
+                logger.debug("%s %s for: %s. Skipping.", prefix, article.note, article_link)
+                self._mark(result, REJECTED)
+                return False
+
+            with metrics.timer('write', source):
+                self.sink.write(OutputRow(spec.label, article.text, article_link, spec.name,
+                                          published.isoformat(), spec.extraction_version))
+            self._mark(result, WRITTEN)
+            self.articles_scraped += 1
+            logger.debug("%s Scraped article %d from %s: %s", prefix, self.articles_scraped, published,
+                         article_link)
+            return spec.max_articles is not None and self.articles_scraped >= spec.max_articles
+
+        except Exception as e:
+            metrics.count('articles', source, outcome='error')
+            logger.warning("%s An error occurred while processing article link %s: %s",
+                           prefix, article_link, e)
+            return False
+
+    def _mark(self, result, status):
+        """Record ``status`` for a fetched article, with its validators when an unchanged page keeps the verdict."""
+        self.crawl_state.mark(result.url, status, result.status_code)
+        if status in VERDICT_STATUSES:
+            self.crawl_state.save_validators(result.url, result.etag, result.last_modified)
+
+    def _strip_boilerplate(self, article):
+        """Drop the paragraphs repeated across the source's articles and count what was removed."""
+        for reason, size in strip_repeated(article, self.crawl_state.paragraph_counts()).items():
+            self.metrics.count('boilerplate_bytes', self.spec.name, size, outcome=reason)
+
+    def checkpoint(self, page_number, finished_shard, stopped):
+        """Save progress after a listing batch: pages and rows first, then the state that says they were written."""
+        with self.metrics.timer('write', self.spec.name):
+            if page_number is not None and not self.settings.incremental:
+                self.crawl_state.set_cursor(page_number)
+            if finished_shard is not None and not stopped:
+                self.crawl_state.finish_shard(finished_shard)
+            if self.archive is not None:
+                self.archive.flush()
+            self.crawl_state.checkpoint(self.sink)
+        # Selected links that were never handled, because the crawl stopped, are forgotten. Otherwise the
+        # dates may already belong to the next batch, which the asyncio crawler selects ahead
+        if stopped:
+            self.listing_dates.clear()
+
+    def finish(self):
+        logger.info("%s Scraped %d articles. Data saved to %s", self.prefix, self.articles_scraped,
+                    self.settings.output_path(self.spec))
+        removed = {reason: self.metrics.total('boilerplate_bytes', self.spec.name, reason) for reason in REASONS}
+        if any(removed.values()):
+            logger.info("%s Removed %d bytes of boilerplate from the articles written (%s).", self.prefix,
+                        sum(removed.values()), ', '.join(f'{reason} {size}' for reason, size in removed.items()))
+        return self.articles_scraped
+
+
+def crawl_site(spec, settings, fetch_pool, parse_pool, cancel=None, archive=None, metrics=None, browsers=None):
+    """Crawl one source until its listing ends, it leaves the year window or ``spec.max_articles`` rows are written.
+
+    Setting the ``cancel`` event stops the crawl after saving what has been
+    written so far. Fetched pages are stored in ``archive`` when one is
+    given, and timings and counts go to ``metrics``. A browser listing
+    borrows from ``browsers`` (a ``BrowserPool``), or starts its own. Returns the number of
+    articles written for the source, counting earlier resumed runs.
+    """
+    metrics = metrics or Metrics()
+    with settings.open_sink(spec, settings.resume) as sink, CrawlState(settings.state_path, spec.name) as crawl_state:
+        if not settings.resume:
+            crawl_state.reset()
+        crawl = SourceCrawl(spec, settings, sink, crawl_state, archive, metrics)
+
+        listing = listing_batches(spec, settings, fetch_pool, crawl_state, crawl.first_page(), browsers)
+        for page_number, listing_items, finished_shard in _timed(listing, metrics, 'discover', spec.name):
+            logger.debug("%s Listing %s. Articles scraped so far: %d", crawl.prefix,
+                         f'page {page_number}' if page_number is not None else f'shard batch of {len(listing_items)}',
+                         crawl.articles_scraped)
+            new_article_links, stop = crawl.select(listing_items)
+
+            # Fetch the new articles concurrently and parse them on the worker processes;
+            # results come back in listing order
+            conditional = crawl_state.conditional_headers(new_article_links, any_status=settings.incremental)
+            fetched = _refetch_unjudged(fetch_pool.fetch(new_article_links, conditional=conditional), fetch_pool,
+                                       crawl_state)
+            for result, article in parse_pool.parse(fetched, spec):
+                if cancel is not None and cancel.is_set():
+                    stop = True
+                    break
+                if crawl.handle(result, article):
+                    stop = True
+                    break
+
+            crawl.checkpoint(page_number, finished_shard, stop or (cancel is not None and cancel.is_set()))
+            if stop or (cancel is not None and cancel.is_set()):
+                break
+
+        listing.close()
+
+    return crawl.finish()
+
+
+def run(sites, settings=None, metrics=None):
+    """Crawl ``sites`` (``SiteSpec`` objects or registry names) concurrently on shared pools.
+
+    Returns ``{source name: articles written}``. Timings and counts are
+    collected in ``metrics`` when one is given. Ctrl-C lets every source
+    save its progress before the interrupt is re-raised.
+    """
+    settings = settings or CrawlSettings()
+    configure_logging(settings.log_level)
+    specs = [get_site(site) if isinstance(site, str) else site for site in sites]
+    cancel = threading.Event()
+    metrics = metrics or Metrics()
+    archive = HtmlArchive(settings.archive_dir) if settings.archive_dir else None
+    with ExitStack() as stack:
+        fetch_pool = stack.enter_context(make_fetch_pool(specs, settings))
+        parse_pool = stack.enter_context(ParsePool(extract_article, workers=settings.parse_workers,
+                                                   backend=settings.parser_backend))
+        browsers = stack.enter_context(browser_pool(specs, settings))
+        if settings.metrics_port is not None:
+            stack.enter_context(MetricsServer(metrics, settings.metrics_port))
+        if settings.progress:
+            stack.enter_context(ProgressLine(metrics))
+        crawlers = ThreadPoolExecutor(max_workers=len(specs), thread_name_prefix='crawl')
+        futures = {spec.name: crawlers.submit(crawl_site, spec, settings, fetch_pool, parse_pool, cancel, archive,
+                                              metrics, browsers)
+                   for spec in specs}
+        try:
+            wait(futures.values())
+        except KeyboardInterrupt:
+            logger.warning("Interrupted. Saving progress before stopping...")
+            cancel.set()
+            raise
+        finally:
+            crawlers.shutdown(wait=True)
+            if archive is not None:
+                archive.close()
+        report(fetch_pool, metrics)
+        return {name: future.result() for name, future in futures.items()}
+
+
+def reextract_site(spec, settings, archive, parse_pool):
+    """Rewrite ``spec``'s CSV from its archived pages with the current extractor; returns the rows written.
+
+    Articles outside the year window are skipped rather than ending the run,
+    since the archive is not in listing order across crawls.
+    """
+    prefix = f"[{spec.name}]"
+    csv_path = settings.output_path(spec)
+    written = rejected = out_of_range = 0
+    listing_dates = {}
+    # The archive is re-extracted from scratch, so paragraph frequencies are counted afresh too
+    paragraph_counts = ParagraphCounts()
+    removed = dict.fromkeys(REASONS, 0)
+
+    def archived_pages():
+        for result, listing_date in archive.results(spec.name):
+            listing_dates[result.url] = listing_date
+            yield result
+
+    with settings.open_sink(spec, resume=False) as sink:
+        for result, article in parse_pool.parse(archived_pages(), spec):
+            listing_date = listing_dates.pop(result.url)
+            if article is None:
+                logger.warning("%s An error occurred while parsing archived article %s: %s", prefix, result.url,
+                               result.error)
+                rejected += 1
+                continue
+            published = _published(article, listing_date, result.url)
+            if not spec.in_window(published):
+                out_of_range += 1
+            elif article.note is not None:
+                rejected += 1
+            else:
+                if article.paragraphs is not None:
+                    for reason, size in strip_repeated(article, paragraph_counts).items():
+                        removed[reason] += size
+                    if article.note is not None:
+                        rejected += 1
+                        continue
+                sink.write(OutputRow(spec.label, article.text, result.url, spec.name, published.isoformat(),
+                                     spec.extraction_version))
+                written += 1
+                if spec.max_articles is not None and written >= spec.max_articles:
+                    break
+    logger.info("%s Re-extracted %d articles to %s (%d without usable text, %d outside %d-%d).", prefix, written,
+                csv_path, rejected, out_of_range, spec.first_year, spec.last_year)
+    if any(removed.values()):
+        logger.info("%s Removed %d bytes of boilerplate (%s).", prefix, sum(removed.values()),
+                    ', '.join(f'{reason} {size}' for reason, size in removed.items()))
+    return written
+
+
+def _unarchived(spec, settings, archive):
+    """How many of the articles in ``spec``'s CSV have no archived page, or None when that cannot be told."""
+    csv_path = settings.output_path(spec)
+    if not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0:
+        return 0
+    if not os.path.exists(settings.state_path):
+        return None
+    with CrawlState(settings.state_path, spec.name) as crawl_state:
+        return sum(url not in archive for url in crawl_state.urls(WRITTEN))
+
+
+def reextract(sites, settings=None):
+    """Rebuild the CSVs of ``sites`` from the HTML archive, without any network access.
+
+    Returns ``{source name: articles written}``. The crawl state is left as
+    it is, so a later crawl still skips the articles it has already fetched.
+    Raises ``ValueError`` before rewriting anything when a source's CSV has
+    articles the archive lacks (crawled before archiving started, or with
+    ``--no-archive``), since rebuilding the CSV would drop them.
+    """
+    settings = settings or CrawlSettings()
+    configure_logging(settings.log_level)
+    if not settings.archive_dir or not os.path.exists(settings.archive_dir):
+        raise ValueError(f"No HTML archive at {settings.archive_dir!r}")
+    specs = [get_site(site) if isinstance(site, str) else site for site in sites]
+    with HtmlArchive(settings.archive_dir) as archive, \
+            ParsePool(extract_article, workers=settings.parse_workers, backend=settings.parser_backend) as parse_pool:
+        for spec in specs:
+            missing = _unarchived(spec, settings, archive)
+            if missing is None:
+                raise ValueError(f"[{spec.name}] No crawl state at {settings.state_path!r} to check that the archive "
+                                 f"holds every article of {settings.output_path(spec)}")
+            if missing:
+                raise ValueError(f"[{spec.name}] {missing} articles of {settings.output_path(spec)} are not in the "
+                                 f"archive; re-extracting would drop them")
+        return {spec.name: reextract_site(spec, settings, archive, parse_pool) for spec in specs}
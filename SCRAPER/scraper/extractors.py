@@ -0,0 +1,102 @@
+"""Article extractors.
+
+An extractor takes the raw HTML of one article page and returns an
+``Article`` with the publication date it found and the body text to
+write (empty, with a ``note`` saying why, when there is none). Most sources
+are described by the selectors in their ``sites.SiteSpec`` and go through
+``extract_article``; pages that need more than selectors, like Tsek's, get a
+function of their own. They are written against ``parsing.Node`` so any
+parser backend can be used, and they pass ``targets`` so the BeautifulSoup
+backends only build the date and body elements. Body paragraphs that are
+teasers or link lists are dropped as they are read (``boilerplate``).
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import date
+
+from .boilerplate import split_paragraphs
+from .claims import claim_text, read_tsek_page
+from .dates import parse_date
+from .parsing import DEFAULT_BACKEND, parse_html
+
+# Recorded with every output row; bump when a change here alters what is extracted
+EXTRACTION_VERSION = 3
+
+
+@dataclass
+class Article:
+    """What an extractor found on an article page."""
+
+    year: str = None
+    date_text: str = None
+    text: str = ''
+    note: str = None
+    # date_text parsed by dates.parse_date
+    date: date = None
+    # The body paragraphs text joins, and the bytes of boilerplate dropped from them per reason,
+    # for the corpus-wide filter of boilerplate.strip_repeated; None for pages without paragraphs
+    paragraphs: list = None
+    boilerplate: dict = None
+
+
+SELECTOR_TARGET_RE = re.compile(r'^([a-z0-9]+)(?:\.([\w-]+))?', re.IGNORECASE)
+
+
+def selector_targets(selectors):
+    """``parse_html`` targets for simple ``tag``/``tag.class``/``tag[attr]`` selectors."""
+    targets = []
+    for selector in selectors:
+        match = SELECTOR_TARGET_RE.match(selector)
+        if match is None:
+            return None  # Anything fancier: build the whole tree
+        targets.append((match.group(1).lower(), match.group(2)))
+    return targets
+
+
+def extract_article(html, spec, backend=DEFAULT_BACKEND, restricted=True):
+    """Extract the date and body of an article page as described by ``spec`` (a ``sites.SiteSpec``).
+
+    The date rules are tried in order until one yields a date; the body is
+    the paragraphs of the first of the body selectors found on the page,
+    without the teasers and link lists ``boilerplate.split_paragraphs`` drops.
+    """
+    if spec.extractor is not None:
+        return spec.extractor(html, backend=backend, restricted=restricted)
+
+    selectors = [rule.selector for rule in spec.date_rules] + list(spec.body_selectors)
+    doc = parse_html(html, backend, selector_targets(selectors) if restricted else None)
+    article = Article()
+
+    for rule in spec.date_rules:
+        element = doc.select_one(rule.selector)
+        if element is None:
+            continue
+        article.date_text = element.attr(rule.attr) if rule.attr else element.text(strip=rule.strip)
+        article.date = parse_date(article.date_text)
+        if article.date is not None:
+            article.year = str(article.date.year)
+            break
+
+    content_div = next(filter(None, (doc.select_one(selector) for selector in spec.body_selectors)), None)
+    if content_div is None:
+        article.note = f"Could not find {' or '.join(map(repr, spec.body_selectors))}"
+    else:
+        article.paragraphs, article.boilerplate = split_paragraphs(
+            content_div, spec.boilerplate_patterns, keep_empty=spec.keep_empty_paragraphs)
+        article.text = ' '.join(article.paragraphs)
+        if not article.text and not spec.keep_empty_paragraphs:
+            article.note = ("Only boilerplate in paragraphs" if article.boilerplate
+                            else "No text content found in paragraphs")
+    return article
+
+
+def extract_tsek(html, backend=DEFAULT_BACKEND, restricted=True):
+    """Tsek fact-checks: the claim blockquote, else the paragraphs quoting 5+ words.
+
+    Articles whose first figure image is captioned as "accurate" are not fake
+    news and come back with no text. The rules live in ``claims``, which
+    also applies them to whole batches of pages.
+    """
+    text, note = claim_text(read_tsek_page(html, backend, restricted))
+    return Article(text=text, note=note)
@@ -0,0 +1,299 @@
+"""Bounded concurrent article fetching.
+
+The scrapers used to call ``requests.get`` for one article at a time, so a run
+was bounded by network round-trip latency. ``FetchPool`` takes the article
+URLs discovered on a listing page and fetches them on worker threads, with a
+global concurrency limit and a per-host limit so a single site never sees more
+than ``per_host`` requests in flight from us. All workers share one pooled
+session from ``session.make_session`` so connections are reused.
+
+Each host gets its own ``per_host`` workers, and every request first waits on
+the host's ``politeness.Politeness`` rate limit. A host that is being held
+back therefore only ever blocks its own workers, and several sources crawled
+at once interleave instead of queueing behind the slowest one.
+
+How many of a host's article requests overlap is set by an
+``adaptive.AimdLimit`` from their latency and errors, up to ``per_host``. A
+request that takes longer than the host's recent p95 is hedged: it is sent
+again, and the first answer wins. Every request has a connect, a read and a
+total deadline, so a server that accepts a connection and then trickles or
+stops sending can hold a worker for ``total_timeout`` seconds at most.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+import requests
+
+from .adaptive import AimdLimit
+from .politeness import DEFAULT_RATE, THROTTLE_STATUSES, DisallowedByRobots, Politeness
+from .session import make_session, retry_count
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_PER_HOST = 8
+# Seconds to open a connection, between two reads of the response, and for the whole request
+CONNECT_TIMEOUT = 5
+DEFAULT_TIMEOUT = 10
+TOTAL_TIMEOUT = 30
+CHUNK_SIZE = 64 * 1024
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """The response did not arrive in full before the request's total deadline."""
+
+
+class _Abandoned(requests.exceptions.RequestException):
+    """A hedged request whose twin answered first."""
+
+
+def read_body(response, deadline, abandoned=None):
+    """Read a streamed ``response`` in full by ``deadline`` (``time.monotonic``), so ``.content`` works.
+
+    The deadline is checked between reads, each bounded by the read
+    timeout. Raises ``DeadlineExceeded``, or ``_Abandoned`` once the
+    ``abandoned`` event is set.
+    """
+    body = bytearray()
+    # read1 returns whatever has arrived, so a server trickling bytes cannot keep one read going past the deadline
+    read = getattr(response.raw, 'read1', None)
+    chunks = (iter(lambda: read(CHUNK_SIZE, decode_content=True), b'') if read is not None
+              else response.iter_content(CHUNK_SIZE))
+    try:
+        for chunk in chunks:
+            body += chunk
+            if abandoned is not None and abandoned.is_set():
+                raise _Abandoned(response.url)
+            if time.monotonic() > deadline:
+                raise DeadlineExceeded(f"No complete response from {response.url} by the total deadline")
+    except BaseException:
+        response.close()
+        raise
+    response._content = bytes(body)
+    response._content_consumed = True
+    response.close()
+    return response
+
+
+def decode_body(response):
+    """``(text, encoding)`` of a read ``response``: its ``text`` and the charset ``requests`` decoded it with."""
+    if response.encoding is None:
+        # Settle the guess ``text`` would make, so the raw body can be decoded the same way later
+        response.encoding = response.apparent_encoding
+    return response.text, response.encoding
+
+
+@dataclass
+class FetchResult:
+    """Outcome of fetching one URL. ``error`` is set instead of a status on network failure."""
+
+    url: str
+    status_code: int = None
+    text: str = None
+    error: Exception = None
+    elapsed: float = 0.0
+    retries: int = 0
+    etag: str = None
+    last_modified: str = None
+    # Bytes downloaded (after decompression)
+    size: int = 0
+    # Seconds the extractor spent on the page, filled in by ``ParsePool.parse``
+    parse_seconds: float = None
+    # The undecoded body; ``fetch(raw=True)`` keeps only this, without ``text``
+    content: bytes = None
+    # The charset ``text`` was decoded from ``content`` with
+    encoding: str = None
+
+    @property
+    def ok(self):
+        return self.error is None and self.status_code == 200
+
+    @property
+    def not_modified(self):
+        """The server answered a conditional request with 304: nothing changed since last time."""
+        return self.error is None and self.status_code == 304
+
+
+class FetchPool:
+    """Fetch URLs on per-host worker threads with a global concurrency cap and per-host rate limits."""
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, per_host=DEFAULT_PER_HOST,
+                 timeout=DEFAULT_TIMEOUT, session=None, rate=DEFAULT_RATE, respect_robots=True,
+                 connect_timeout=CONNECT_TIMEOUT, total_timeout=TOTAL_TIMEOUT, adaptive=True, hedge=True):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        # The read timeout; connect_timeout and total_timeout bound the rest of a request
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.total_timeout = total_timeout
+        self.adaptive = adaptive
+        self.hedge = hedge
+        # Size the connection pool to the fetch concurrency so no worker waits for a socket
+        self.session = session or make_session(pool_size=concurrency)
+        self.politeness = Politeness(self.session, rate=rate, burst=per_host, respect_robots=respect_robots)
+        self._executors = {}
+        self._limits = {}
+        # Hedged requests and the originals they race, so the host's worker can wait on both
+        self._hedges = None
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            executors = list(self._executors.values())
+        if self._hedges is not None:
+            executors.append(self._hedges)
+        for executor in executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+    def _executor(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            executor = self._executors.get(host)
+            if executor is None:
+                executor = self._executors[host] = ThreadPoolExecutor(
+                    max_workers=self.per_host, thread_name_prefix=f'fetch-{host}')
+            return executor
+
+    def limit(self, url):
+        """The ``AimdLimit`` on article requests to ``url``'s host."""
+        host = urlsplit(url).netloc
+        with self._lock:
+            limit = self._limits.get(host)
+            if limit is None:
+                limit = self._limits[host] = (AimdLimit(self.per_host) if self.adaptive
+                                              else AimdLimit(self.per_host, self.per_host, adjust=False))
+            return limit
+
+    def limit_stats(self):
+        """``{host: (concurrency limit, most allowed, hedged requests)}``."""
+        with self._lock:
+            limits = dict(self._limits)
+        return {host: (limit.limit, limit.maximum, limit.hedges) for host, limit in limits.items()}
+
+    def send(self, url, headers=None, timeout=None, abandoned=None):
+        """``session.get`` within the connect, read and total deadlines, not rate limited; the body is read in full."""
+        deadline = time.monotonic() + self.total_timeout
+        with self._slots:
+            response = self.session.get(url, headers=headers, timeout=(self.connect_timeout, timeout or self.timeout),
+                                        stream=True)
+            return read_body(response, deadline, abandoned)
+
+    def get(self, url, headers=None, timeout=None):
+        """A rate-limited ``send``, for requests made outside the pool (listing pages).
+
+        Raises like ``requests`` does, and ``DisallowedByRobots`` for URLs robots.txt rules out.
+        """
+        self.politeness.acquire(url)
+        try:
+            response = self.send(url, headers, timeout)
+        except requests.exceptions.RequestException:
+            self.politeness.record(url, error=True)
+            raise
+        self.politeness.record(url, response.status_code, response.headers.get('Retry-After'),
+                               retry_count(response))
+        return response
+
+    def _hedged(self, url, headers, limit):
+        """``send``, sent a second time if no answer comes within the host's hedge delay; the first answer wins."""
+        delay = limit.hedge_delay() if self.hedge else None
+        if delay is None:
+            return self.send(url, headers)
+        with self._lock:
+            if self._hedges is None:
+                self._hedges = ThreadPoolExecutor(max_workers=2 * self.concurrency, thread_name_prefix='hedge')
+        abandoned = threading.Event()
+        first = self._hedges.submit(self.send, url, headers, None, abandoned)
+        done, _ = wait([first], timeout=delay)
+        if done or not limit.take_hedge():
+            return first.result()
+        # A hedge takes a rate-limit token of its own, and is skipped when none is free
+        if not self.politeness.try_acquire(url):
+            limit.refund_hedge()
+            return first.result()
+        second = self._hedges.submit(self.send, url, headers, None, abandoned)
+        done, pending = wait([first, second], return_when=FIRST_COMPLETED)
+        winner = done.pop()
+        if winner.exception() is not None and pending:
+            return pending.pop().result()
+        abandoned.set()
+        return winner.result()
+
+    def fetch_one(self, url, headers=None, raw=False):
+        """Fetch a single URL once its host's rate limit and concurrency allow. Never raises for network errors."""
+        started = time.perf_counter()
+        limit = self.limit(url)
+        try:
+            self.politeness.acquire(url)
+        except DisallowedByRobots as exc:
+            return FetchResult(url, error=exc, elapsed=time.perf_counter() - started)
+        with limit:
+            sent = time.perf_counter()
+            try:
+                response = self._hedged(url, headers, limit)
+            except requests.exceptions.RequestException as exc:
+                limit.record(time.perf_counter() - sent, failed=True)
+                self.politeness.record(url, error=True)
+                return FetchResult(url, error=exc, elapsed=time.perf_counter() - started)
+        limit.record(time.perf_counter() - sent,
+                     failed=response.status_code in THROTTLE_STATUSES or response.status_code >= 500)
+        self.politeness.record(url, response.status_code, response.headers.get('Retry-After'),
+                               retry_count(response))
+        text, encoding = (None, None) if raw else decode_body(response)
+        return FetchResult(url, response.status_code, text, content=response.content, encoding=encoding,
+                           elapsed=time.perf_counter() - started,
+                           retries=retry_count(response),
+                           size=len(response.content),
+                           etag=response.headers.get('ETag'),
+                           last_modified=response.headers.get('Last-Modified'))
+
+    def fetch(self, urls, ordered=True, conditional=None, raw=False):
+        """Yield a ``FetchResult`` for every URL in ``urls``.
+
+        ``conditional`` maps URLs to extra request headers, normally the
+        ``If-None-Match``/``If-Modified-Since`` pair from
+        ``CrawlState.conditional_headers``. With ``raw`` the results carry
+        the body only as bytes in ``content``, without decoding ``text``.
+
+        At most ``2 * concurrency`` fetches are queued at once, so a long URL
+        stream never piles up in memory. With ``ordered=True`` results come
+        back in the order the URLs were given, which keeps the CSV rows in
+        listing order and lets callers stop at the first out-of-range article.
+        Breaking out of the loop cancels whatever has not started yet.
+        """
+        urls = iter(urls)
+        conditional = conditional or {}
+        window = 2 * self.concurrency
+        pending = deque()
+
+        def refill():
+            while len(pending) < window:
+                url = next(urls, None)
+                if url is None:
+                    return
+                pending.append(self._executor(url).submit(self.fetch_one, url, conditional.get(url), raw))
+
+        try:
+            refill()
+            while pending:
+                if ordered:
+                    yield pending.popleft().result()
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending.remove(future)
+                        yield future.result()
+                refill()
+        finally:
+            for future in pending:
+                future.cancel()
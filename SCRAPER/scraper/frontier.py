@@ -0,0 +1,419 @@
+"""Shared frontier of article URLs for a crawl spread over several worker processes.
+
+A distributed crawl (``distributed``) splits the work of ``engine.crawl_site``:
+discovery adds the article links of the sources' listings to the frontier,
+and any number of workers, on this host or others, lease batches of them,
+crawl them and report each URL's outcome back.
+
+``open_frontier`` picks a backend from a location:
+
+a file path
+    ``SqliteFrontier``: one SQLite file (WAL mode) shared by the processes of
+    one host. Leases are taken in ``BEGIN IMMEDIATE`` transactions, so
+    SQLite's file lock hands every URL to one worker at a time.
+``tcp://HOST:PORT``
+    A ``SqliteFrontier`` that ``serve_frontier`` shares with other machines
+    over ``multiprocessing.managers``. Connections are authenticated with a
+    shared key (``SCRAPER_FRONTIER_KEY``).
+
+Every backend has the methods of ``SqliteFrontier`` named in ``EXPOSED``
+(``add``, ``lease``, ``complete``, ``release``, the source states, the
+counts, ``shards``/``accepted``/``mark_merged`` for the merge and ``reset``) and ``close``,
+and works as a context manager. Other queue services plug in with
+``register_backend(scheme, factory)``: ``factory(location, authkey)``
+returns such an object, and the SQLite file is the one to check it against.
+
+Every lease carries its own token and runs out after ``lease_seconds``. A
+worker that dies or stalls loses its URLs to the next worker that asks, and
+its late report is refused because its token no longer matches, so a URL's
+outcome is recorded exactly once, with the output shard its row went to.
+A URL whose lease ran out ``MAX_ATTEMPTS`` times is given up as failed.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from multiprocessing.managers import BaseManager
+from urllib.parse import urlsplit
+
+from .state import BUSY_TIMEOUT, DONE_STATUSES, FAILED, WRITTEN
+
+LEASE_SECONDS = 600
+MAX_ATTEMPTS = 3
+AUTHKEY_VARIABLE = 'SCRAPER_FRONTIER_KEY'
+
+# URL states
+QUEUED = 'queued'
+LEASED = 'leased'
+DONE = 'done'
+# Behind an article that ended a newest-first source, or over its max_articles
+DROPPED = 'dropped'
+
+# Source states: links are still being added; the listing ended; the crawl of the source was ended
+DISCOVERING = 'discovering'
+FINISHED = 'finished'
+STOPPED = 'stopped'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT NOT NULL,
+    url TEXT NOT NULL,
+    listing_date TEXT,
+    state TEXT NOT NULL,
+    worker TEXT,
+    lease TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    outcome TEXT,
+    http_status INTEGER,
+    shard TEXT,
+    merged INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    UNIQUE (source, url)
+);
+CREATE INDEX IF NOT EXISTS frontier_queue ON frontier (state, seq);
+CREATE INDEX IF NOT EXISTS frontier_lease ON frontier (lease);
+CREATE INDEX IF NOT EXISTS frontier_shard ON frontier (shard);
+CREATE TABLE IF NOT EXISTS frontier_sources (
+    source TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+@dataclass
+class LeasedUrl:
+    """A URL handed to one worker, until its lease runs out."""
+
+    source: str
+    url: str
+    listing_date: str
+    token: str
+
+
+class SqliteFrontier:
+    """The frontier in one SQLite file, safe to share between the processes and threads of a host."""
+
+    def __init__(self, path):
+        self.path = path
+        # Transactions are begun explicitly, so leases can take the write lock up front
+        self._db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+        if 'merged' not in [row[1] for row in self._db.execute('PRAGMA table_info(frontier)')]:
+            self._db.execute('ALTER TABLE frontier ADD COLUMN merged INTEGER NOT NULL DEFAULT 0')
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _write(self):
+        """A write transaction holding SQLite's lock on the file from the start."""
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            return self._db.execute(sql, parameters).fetchall()
+
+    def add(self, source, links):
+        """Queue ``(url, listing date)`` pairs of ``source``; returns how many were queued.
+
+        A URL already in the frontier is only queued again when it was dropped
+        or done without a final outcome, as a crawl fetches such a URL again
+        when the listing shows it. It goes to the back, in listing order.
+        """
+        now = time.time()
+        with self._write() as db:
+            db.executemany(
+                f'DELETE FROM frontier WHERE source = ? AND url = ? AND (state = ? OR (state = ? AND '
+                f'(outcome IS NULL OR outcome NOT IN ({", ".join("?" * len(DONE_STATUSES))}))))',
+                [(source, url, DROPPED, DONE, *DONE_STATUSES) for url, _ in links],
+            )
+            before = db.total_changes
+            db.executemany(
+                'INSERT OR IGNORE INTO frontier (source, url, listing_date, state, updated_at) VALUES (?, ?, ?, ?, ?)',
+                [(source, url, listing_date, QUEUED, now) for url, listing_date in links],
+            )
+            return db.total_changes - before
+
+    def lease(self, worker, limit, lease_seconds=LEASE_SECONDS, sources=None, quotas=None):
+        """Up to ``limit`` queued URLs (of ``sources`` only, when given), in discovery order, as ``LeasedUrl``.
+
+        URLs whose lease has run out are handed out again. ``quotas`` maps
+        sources to the most articles they may have written (``max_articles``):
+        such a source's URLs are only leased while its written and leased URLs
+        stay within it, so workers running at once cannot overshoot it, and
+        the source is stopped once it is reached.
+        """
+        now = time.time()
+        source_filter = f' AND source IN ({", ".join("?" * len(sources))})' if sources else ''
+        with self._write() as db:
+            db.execute(
+                'UPDATE frontier SET state = ?, outcome = ?, lease = NULL, updated_at = ? '
+                'WHERE state = ? AND lease_until < ? AND attempts >= ?',
+                (DONE, FAILED, now, LEASED, now, MAX_ATTEMPTS),
+            )
+            allowances = {}
+            for source, quota in (quotas or {}).items():
+                if quota is None:
+                    continue
+                written, held = db.execute('SELECT COALESCE(SUM(state = ? AND outcome = ?), 0), '
+                                           'COALESCE(SUM(state = ?), 0) FROM frontier WHERE source = ?',
+                                           (DONE, WRITTEN, LEASED, source)).fetchone()
+                if written >= quota:
+                    self._stop(db, source, None, now)
+                # A lease that ran out still counts: handing it out again only moves it to another worker
+                allowances[source] = max(quota - written - held, 0)
+            full = [source for source, allowance in allowances.items() if not allowance]
+            full_filter = f' AND NOT (state = ? AND source IN ({", ".join("?" * len(full))}))' if full else ''
+            rows = db.execute(
+                f'SELECT seq, source, url, listing_date, state FROM frontier '
+                f'WHERE (state = ? OR (state = ? AND lease_until < ?)){source_filter}{full_filter} '
+                f'ORDER BY seq LIMIT ?',
+                (QUEUED, LEASED, now, *(sources or ()), *((QUEUED, *full) if full else ()), limit),
+            ).fetchall()
+            leased = []
+            for seq, source, url, listing_date, state in rows:
+                if state == QUEUED and source in allowances:
+                    if not allowances[source]:
+                        continue
+                    allowances[source] -= 1
+                token = uuid.uuid4().hex
+                db.execute(
+                    'UPDATE frontier SET state = ?, worker = ?, lease = ?, lease_until = ?, attempts = attempts + 1, '
+                    'updated_at = ? WHERE seq = ?',
+                    (LEASED, worker, token, now + lease_seconds, now, seq),
+                )
+                leased.append(LeasedUrl(source, url, listing_date, token))
+            return leased
+
+    def complete(self, outcomes):
+        """Record ``(token, status, http_status, shard)`` outcomes; returns how many leases still held.
+
+        ``status`` is a ``state`` status, or None for a URL that was handled
+        without one (too new, say). ``FAILED`` URLs go back in the queue
+        until they have had ``MAX_ATTEMPTS``. An outcome whose lease has been
+        handed to another worker is ignored.
+        """
+        now = time.time()
+        accepted = 0
+        with self._write() as db:
+            for token, status, http_status, shard in outcomes:
+                accepted += db.execute(
+                    'UPDATE frontier SET state = CASE WHEN ? = ? AND attempts < ? THEN ? ELSE ? END, '
+                    'outcome = ?, http_status = ?, shard = ?, lease = NULL, lease_until = NULL, updated_at = ? '
+                    'WHERE lease = ? AND state = ?',
+                    (status, FAILED, MAX_ATTEMPTS, QUEUED, DONE, status, http_status, shard, now, token, LEASED),
+                ).rowcount
+        return accepted
+
+    def release(self, tokens):
+        """Put leased URLs that were never handled back in the queue."""
+        now = time.time()
+        with self._write() as db:
+            db.executemany(
+                'UPDATE frontier SET state = ?, lease = NULL, lease_until = NULL, attempts = attempts - 1, '
+                'updated_at = ? WHERE lease = ? AND state = ?',
+                [(QUEUED, now, token, LEASED) for token in tokens],
+            )
+
+    def open_source(self, source, reopen=False):
+        """Register ``source`` for discovery unless it is known already; returns its state.
+
+        With ``reopen`` a source whose discovery finished or was stopped is
+        discovered again, for an incremental crawl.
+        """
+        with self._write() as db:
+            db.execute('INSERT OR IGNORE INTO frontier_sources (source, state, updated_at) VALUES (?, ?, ?)',
+                       (source, DISCOVERING, time.time()))
+            if reopen:
+                db.execute('UPDATE frontier_sources SET state = ?, updated_at = ? WHERE source = ? AND state != ?',
+                           (DISCOVERING, time.time(), source, DISCOVERING))
+            return db.execute('SELECT state FROM frontier_sources WHERE source = ?', (source,)).fetchone()[0]
+
+    def source_state(self, source):
+        rows = self._query('SELECT state FROM frontier_sources WHERE source = ?', (source,))
+        return rows[0][0] if rows else None
+
+    def finish_source(self, source):
+        """The source's listing has ended: no more links are coming."""
+        with self._write() as db:
+            db.execute('UPDATE frontier_sources SET state = ?, updated_at = ? WHERE source = ? AND state = ?',
+                       (FINISHED, time.time(), source, DISCOVERING))
+
+    def stop_source(self, source, after=None):
+        """End ``source``'s crawl: drop its URLs discovered after ``after``, or all of them still waiting.
+
+        Leases on dropped URLs are void, so their outcomes are ignored.
+        """
+        with self._write() as db:
+            self._stop(db, source, after, time.time())
+
+    def _stop(self, db, source, after, now):
+        db.execute('UPDATE frontier_sources SET state = ?, updated_at = ? WHERE source = ?', (STOPPED, now, source))
+        row = db.execute('SELECT seq FROM frontier WHERE source = ? AND url = ?',
+                         (source, after)).fetchone() if after is not None else None
+        db.execute(
+            'UPDATE frontier SET state = ?, lease = NULL, lease_until = NULL, updated_at = ? '
+            'WHERE source = ? AND state IN (?, ?) AND seq > ?',
+            (DROPPED, now, source, QUEUED, LEASED, row[0] if row else 0),
+        )
+
+    def pending(self, source=None):
+        """URLs queued or leased, of ``source`` or of every source."""
+        if source is None:
+            return self._query('SELECT COUNT(*) FROM frontier WHERE state IN (?, ?)', (QUEUED, LEASED))[0][0]
+        return self._query('SELECT COUNT(*) FROM frontier WHERE source = ? AND state IN (?, ?)',
+                           (source, QUEUED, LEASED))[0][0]
+
+    def count(self, source, outcome=WRITTEN):
+        return self._query('SELECT COUNT(*) FROM frontier WHERE source = ? AND state = ? AND outcome = ?',
+                           (source, DONE, outcome))[0][0]
+
+    def done(self, source):
+        """``(url, outcome)`` of ``source``'s URLs done with a final outcome."""
+        return self._query(
+            f'SELECT url, outcome FROM frontier WHERE source = ? AND state = ? '
+            f'AND outcome IN ({", ".join("?" * len(DONE_STATUSES))})', (source, DONE, *DONE_STATUSES))
+
+    def counts(self):
+        """``{source: {outcome or state: URLs}}``; URLs done without an outcome count as ``'skipped'``."""
+        counts = {}
+        rows = self._query(
+            'SELECT source, CASE WHEN state = ? THEN COALESCE(outcome, ?) ELSE state END AS key, COUNT(*) '
+            'FROM frontier GROUP BY source, key ORDER BY source, key', (DONE, 'skipped'))
+        for source, key, count in rows:
+            counts.setdefault(source, {})[key] = count
+        return counts
+
+    def finished(self):
+        """True once sources are registered, none is still being discovered and no URL is waiting."""
+        states = [row[0] for row in self._query('SELECT state FROM frontier_sources')]
+        return bool(states) and DISCOVERING not in states and self.pending() == 0
+
+    def shards(self):
+        """The shards the accepted rows were written to."""
+        return [row[0] for row in self._query('SELECT DISTINCT shard FROM frontier WHERE shard IS NOT NULL')]
+
+    def accepted(self, shard):
+        """``(source, url)`` of the rows written to ``shard`` that the frontier accepted and no merge added yet."""
+        return self._query('SELECT source, url FROM frontier WHERE shard = ? AND outcome = ? AND merged = 0',
+                           (shard, WRITTEN))
+
+    def mark_merged(self, rows):
+        """Record that the ``(source, url)`` rows are in the sources' outputs."""
+        with self._write() as db:
+            db.executemany('UPDATE frontier SET merged = 1 WHERE source = ? AND url = ?', rows)
+
+    def reset(self):
+        """Forget every URL and source, for a fresh crawl."""
+        with self._write() as db:
+            db.execute('DELETE FROM frontier')
+            db.execute('DELETE FROM frontier_sources')
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+EXPOSED = ('add', 'lease', 'complete', 'release', 'open_source', 'source_state', 'finish_source', 'stop_source',
+           'pending', 'count', 'done', 'counts', 'finished', 'shards', 'accepted', 'mark_merged',
+           'reset')
+
+
+class _FrontierServer(BaseManager):
+    pass
+
+
+class _FrontierClient(BaseManager):
+    pass
+
+
+_FrontierClient.register('frontier', exposed=EXPOSED)
+
+
+def _address(location):
+    parts = urlsplit(location)
+    if not parts.hostname or not parts.port:
+        raise ValueError(f"Expected a frontier address like tcp://HOST:PORT, got {location!r}")
+    return parts.hostname, parts.port
+
+
+def _authkey(authkey):
+    authkey = authkey or os.environ.get(AUTHKEY_VARIABLE)
+    if not authkey:
+        raise ValueError(f"A shared frontier needs a key: set {AUTHKEY_VARIABLE} on every host")
+    return authkey.encode('utf-8') if isinstance(authkey, str) else authkey
+
+
+def serve_frontier(path, address, authkey=None):
+    """Serve the ``SqliteFrontier`` at ``path`` on ``address`` (``tcp://HOST:PORT``) until interrupted."""
+    frontier = SqliteFrontier(path)
+    _FrontierServer.register('frontier', callable=lambda: frontier, exposed=EXPOSED)
+    server = _FrontierServer(address=_address(address), authkey=_authkey(authkey)).get_server()
+    try:
+        server.serve_forever()
+    finally:
+        frontier.close()
+
+
+class RemoteFrontier:
+    """A frontier served by ``serve_frontier`` on another host; has the ``SqliteFrontier`` methods in ``EXPOSED``."""
+
+    def __init__(self, location, authkey=None):
+        self.location = location
+        self._manager = _FrontierClient(address=_address(location), authkey=_authkey(authkey))
+        self._manager.connect()
+        self._frontier = self._manager.frontier()
+
+    def __getattr__(self, name):
+        if name not in EXPOSED:
+            raise AttributeError(name)
+        return getattr(self._frontier, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        # The frontier stays open on the server for the other workers
+        self._frontier = None
+
+
+BACKENDS = {'tcp': RemoteFrontier}
+
+
+def register_backend(scheme, factory):
+    """Open ``scheme://...`` frontier locations with ``factory(location, authkey)``."""
+    BACKENDS[scheme] = factory
+
+
+def open_frontier(location, authkey=None):
+    """The frontier at ``location``: a ``scheme://`` address of a registered backend, or a SQLite file."""
+    scheme = urlsplit(location).scheme if '://' in location else None
+    if scheme is None:
+        return SqliteFrontier(location)
+    if scheme not in BACKENDS:
+        raise ValueError(f"Unknown frontier backend {scheme!r}; expected a file path or one of "
+                         f"{', '.join(f'{name}://' for name in sorted(BACKENDS))}")
+    return BACKENDS[scheme](location, authkey)
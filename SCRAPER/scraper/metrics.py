@@ -0,0 +1,293 @@
+"""Crawl instrumentation: stage timings, counters, a progress line and a metrics endpoint.
+
+``Metrics`` collects, per source:
+
+* latency histograms for the stages of the crawl loop: ``discover`` (waiting
+  for the next listing page), ``fetch``, ``parse`` (time spent in the
+  extractor, measured in the worker), ``filter`` (the window and quality
+  checks) and ``write``;
+* counters for article requests, bytes downloaded, retries spent by the
+  session, articles by outcome (``written``, ``rejected``,
+  ``out_of_range``, ``http_error``, ...) and bytes of boilerplate removed
+  from the written articles, by reason (``boilerplate_bytes``).
+
+``ProgressLine`` prints a one-line summary of them every second (rewritten in
+place on a terminal), and ``MetricsServer`` serves them on a local port as
+Prometheus text (``/metrics``) or JSON (``/metrics.json``).
+
+The per-article messages that used to be ``print`` calls go to the
+``scraper`` logger at DEBUG level, so they cost nothing unless asked for;
+``configure_logging`` sets up the handler the command line and the scripts
+use.
+"""
+
+import bisect
+import json
+import logging
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 'article' is fetch + parse of one article page, the latency the crawl loop waits on per article
+STAGES = ('discover', 'fetch', 'parse', 'filter', 'write', 'article')
+# Upper bounds (seconds) of the histogram buckets, as in Prometheus' default latency buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PROGRESS_INTERVAL = 1.0
+# Without a terminal the progress line is logged as a normal line, this often
+LOG_PROGRESS_INTERVAL = 30.0
+LOG_FORMAT = '%(asctime)s %(levelname)s %(message)s'
+
+logger = logging.getLogger(__name__)
+
+
+def configure_logging(level='INFO'):
+    """Send the ``scraper`` logger to stderr at ``level``, unless the application set up logging itself."""
+    package_logger = logging.getLogger(__package__)
+    if not package_logger.handlers and not logging.getLogger().handlers:
+        handler = logging.StreamHandler()
+        # On a terminal, clear the progress line before writing over it
+        prefix = '\r\x1b[K' if handler.stream.isatty() else ''
+        handler.setFormatter(logging.Formatter(prefix + LOG_FORMAT, datefmt='%H:%M:%S'))
+        package_logger.addHandler(handler)
+    package_logger.setLevel(level.upper() if isinstance(level, str) else level)
+
+
+class Histogram:
+    """Counts of observations per ``BUCKETS`` bound, plus their sum. Not locked; ``Metrics`` serialises it."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate of the ``q`` quantile, interpolated inside its bucket as Prometheus' histogram_quantile does.
+
+        Past the last bucket bound the estimate is that bound.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, bucket_count in zip(BUCKETS, self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                return lower + (bound - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+            lower = bound
+        return BUCKETS[-1]
+
+
+class _Timer:
+    __slots__ = ('metrics', 'stage', 'source', 'started')
+
+    def __init__(self, metrics, stage, source):
+        self.metrics = metrics
+        self.stage = stage
+        self.source = source
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.stage, self.source, time.perf_counter() - self.started)
+
+
+class Metrics:
+    """Stage histograms and counters for every source of a run, shared by the crawl threads."""
+
+    def __init__(self):
+        self.started = time.time()
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, source, seconds):
+        with self._lock:
+            histogram = self._histograms.get((stage, source))
+            if histogram is None:
+                histogram = self._histograms[(stage, source)] = Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, stage, source):
+        """Context manager that observes the time spent inside it."""
+        return _Timer(self, stage, source)
+
+    def count(self, name, source, amount=1, outcome=None):
+        key = (name, source, outcome)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def fetched(self, source, result):
+        """Count an article request from its ``FetchResult``."""
+        self.count('requests', source)
+        self.count('bytes', source, result.size)
+        if result.retries:
+            self.count('retries', source, result.retries)
+        self.observe('fetch', source, result.elapsed)
+        if result.parse_seconds is not None:
+            self.observe('parse', source, result.parse_seconds)
+        self.observe('article', source, result.elapsed + (result.parse_seconds or 0.0))
+
+    def histogram(self, stage, source=None):
+        """A copy of ``stage``'s histogram, for one source or merged over all of them."""
+        merged = Histogram()
+        with self._lock:
+            for (histogram_stage, histogram_source), histogram in self._histograms.items():
+                if histogram_stage == stage and source in (None, histogram_source):
+                    merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+                    merged.total += histogram.total
+                    merged.count += histogram.count
+        return merged
+
+    def total(self, name, source=None, outcome=None):
+        """Sum of counter ``name``, optionally for one source and/or outcome."""
+        with self._lock:
+            return sum(value for (counter, counter_source, counter_outcome), value in self._counters.items()
+                       if counter == name and source in (None, counter_source)
+                       and outcome in (None, counter_outcome))
+
+    def sources(self):
+        with self._lock:
+            return sorted({source for _, source, _ in self._counters} | {source for _, source in self._histograms})
+
+    def snapshot(self):
+        """Everything collected so far, as a JSON-serialisable dict."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(histogram.counts), histogram.total, histogram.count)
+                          for key, histogram in self._histograms.items()}
+        snapshot = {'uptime_seconds': time.time() - self.started, 'sources': {}}
+        for (name, source, outcome), value in sorted(counters.items(), key=lambda item: str(item[0])):
+            entry = snapshot['sources'].setdefault(source, {'counters': {}, 'stages': {}})
+            if outcome is None:
+                entry['counters'][name] = value
+            else:
+                entry['counters'].setdefault(name, {})[outcome] = value
+        for (stage, source), (bucket_counts, total, count) in sorted(histograms.items()):
+            entry = snapshot['sources'].setdefault(source, {'counters': {}, 'stages': {}})
+            entry['stages'][stage] = {
+                'count': count,
+                'sum_seconds': total,
+                'buckets': {str(bound): bucket_count for bound, bucket_count in zip(BUCKETS + ('+Inf',), bucket_counts)},
+            }
+        return snapshot
+
+    def prometheus(self):
+        """Everything collected so far in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items(), key=lambda item: str(item[0]))
+            histograms = sorted((key, list(histogram.counts), histogram.total, histogram.count)
+                                for key, histogram in self._histograms.items())
+        lines = []
+        for name in ('requests', 'bytes', 'retries', 'articles', 'boilerplate_bytes'):
+            lines.append(f'# TYPE scraper_{name}_total counter')
+            for (counter, source, outcome), value in counters:
+                if counter == name:
+                    labels = f'source="{source}"' + (f',outcome="{outcome}"' if outcome else '')
+                    lines.append(f'scraper_{name}_total{{{labels}}} {value}')
+        lines.append('# TYPE scraper_stage_seconds histogram')
+        for (stage, source), bucket_counts, total, count in histograms:
+            labels = f'stage="{stage}",source="{source}"'
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS + ('+Inf',), bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'scraper_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'scraper_stage_seconds_sum{{{labels}}} {total}')
+            lines.append(f'scraper_stage_seconds_count{{{labels}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """One line: articles written and requests per source, overall request rate and volume."""
+        elapsed = max(time.time() - self.started, 1e-9)
+        parts = [f'{source} {self.total("articles", source, "written")}/{self.total("requests", source)}'
+                 for source in self.sources()]
+        requests = self.total('requests')
+        return (f'{elapsed:.0f}s | written/requested: {", ".join(parts) or "-"} | '
+                f'{requests / elapsed:.1f} req/s, {self.total("bytes") / 1e6:.1f} MB, '
+                f'{self.total("retries")} retries')
+
+    def stage_report(self):
+        """Lines of per-stage p50/p99 latency and totals, for the end of a run."""
+        with self._lock:
+            histograms = sorted(self._histograms.items(), key=lambda item: (item[0][1], STAGES.index(item[0][0])))
+            rows = [(stage, source, histogram.count, histogram.total, histogram.quantile(0.5), histogram.quantile(0.99))
+                    for (stage, source), histogram in histograms]
+        return [f'{source} {stage}: {count} in {total:.1f}s, p50 {p50 * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms'
+                for stage, source, count, total, p50, p99 in rows]
+
+
+class ProgressLine:
+    """Prints ``metrics.summary()`` every ``interval`` seconds on a background thread while running."""
+
+    def __init__(self, metrics, interval=PROGRESS_INTERVAL, stream=None):
+        self.metrics = metrics
+        self.stream = stream or sys.stderr
+        self.interactive = self.stream.isatty()
+        self.interval = interval if self.interactive else LOG_PROGRESS_INTERVAL
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='progress', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        if self.interactive:
+            self.stream.write('\r\x1b[K')
+            self.stream.flush()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            if self.interactive:
+                self.stream.write('\r\x1b[K' + self.metrics.summary())
+                self.stream.flush()
+            else:
+                logger.info(self.metrics.summary())
+
+
+class MetricsServer:
+    """Serves ``metrics`` on ``http://host:port/metrics`` (Prometheus text) and ``/metrics.json``."""
+
+    def __init__(self, metrics, port, host='127.0.0.1'):
+        collected = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/metrics.json'):
+                    body, content_type = json.dumps(collected.snapshot()).encode('utf-8'), 'application/json'
+                elif self.path.startswith('/metrics'):
+                    body, content_type = collected.prometheus().encode('utf-8'), 'text/plain; version=0.0.4'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug('metrics endpoint: ' + format, *args)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self.address = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        logger.info("Serving metrics on http://%s:%d/metrics", *self.address)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,204 @@
+"""Output sinks: the ``label,article`` CSV files, plus optional columnar copies.
+
+The engine hands every accepted article to a sink as an ``OutputRow``.
+``BatchedSink`` keeps rows in memory and passes them on in batches, when
+``batch_rows`` have collected or ``flush_seconds`` have passed since the last
+write, and always on ``flush``, which the engine calls before checkpointing
+the crawl state. Behind it:
+
+``CsvSink``
+    The original ``label,article`` CSV (UTF-8 with BOM), so existing
+    consumers are unaffected. The shards of a distributed crawl
+    (``distributed``) are CSVs with every column (``SHARD_COLUMNS``).
+``ArrowSink``
+    A Parquet (``format='parquet'``) or Arrow IPC (``format='arrow'``)
+    dataset directory with the extra columns ``url``, ``source``,
+    ``published`` and ``extraction_version``. Every run adds its own part
+    file, and every batch becomes a row group / record batch, so downstream
+    jobs can memory-map the files and read only the columns they need.
+    Needs ``pyarrow``.
+"""
+
+import csv
+import glob
+import os
+import time
+from dataclasses import dataclass
+
+HEADER = ['label', 'article']
+SHARD_COLUMNS = ['label', 'article', 'url', 'source', 'published', 'extraction_version']
+DEFAULT_BATCH_ROWS = 500
+DEFAULT_FLUSH_SECONDS = 5.0
+FORMATS = ('csv', 'parquet', 'arrow')
+
+
+def open_csv_output(path, resume=False, header=HEADER):
+    """Open ``path`` for writing rows and return ``(file, csv_writer)``.
+
+    With ``resume`` an existing file is appended to instead of truncated, and
+    the header (and the UTF-8 BOM) is only written when the file is new.
+    """
+    appending = resume and os.path.exists(path) and os.path.getsize(path) > 0
+    if appending:
+        csv_file = open(path, 'a', encoding='utf-8', newline='')
+    else:
+        csv_file = open(path, 'w', encoding='utf-8-sig', newline='')
+    csv_writer = csv.writer(csv_file)
+    if not appending:
+        csv_writer.writerow(header)
+    return csv_file, csv_writer
+
+
+@dataclass
+class OutputRow:
+    """One accepted article."""
+
+    label: str
+    text: str
+    url: str = None
+    source: str = None
+    published: str = None
+    extraction_version: str = None
+
+
+class CsvSink:
+    """Writes ``label,article`` rows; only the first two fields of each row are kept.
+
+    With ``columns=SHARD_COLUMNS`` every field is written.
+    """
+
+    def __init__(self, path, resume=False, columns=HEADER):
+        self.path = path
+        self.columns = list(columns)
+        self._file, self._writer = open_csv_output(path, resume, self.columns)
+
+    def write_batch(self, rows):
+        if self.columns == HEADER:
+            self._writer.writerows([row.label, row.text] for row in rows)
+        else:
+            self._writer.writerows([getattr(row, 'text' if column == 'article' else column) for column in self.columns]
+                                   for row in rows)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ArrowSink:
+    """Writes rows with all their columns to a part file in a Parquet or Arrow IPC dataset directory.
+
+    The part file only becomes readable when the sink is closed; the CSV
+    next to it is the copy that survives a crash.
+    """
+
+    def __init__(self, directory, format='parquet', resume=False):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError(f"Writing {format} output needs pyarrow (pip install pyarrow)") from None
+
+        if format not in ('parquet', 'arrow'):
+            raise ValueError(f"Unknown columnar format {format!r}; expected 'parquet' or 'arrow'")
+        self.path = directory
+        self.format = format
+        os.makedirs(directory, exist_ok=True)
+        if not resume:
+            # A fresh run replaces the dataset; only our own part files are removed
+            for old_part in glob.glob(os.path.join(directory, f'part-*.{format}')):
+                os.remove(old_part)
+        self._schema = pa.schema([
+            ('label', pa.string()),
+            ('article', pa.string()),
+            ('url', pa.string()),
+            ('source', pa.string()),
+            ('published', pa.string()),
+            ('extraction_version', pa.string()),
+        ])
+        part = os.path.join(directory, f'part-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}.{format}')
+        if format == 'parquet':
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(part, self._schema, compression='zstd')
+        else:
+            self._writer = pa.ipc.new_file(part, self._schema)
+        self._pa = pa
+
+    def write_batch(self, rows):
+        columns = [[row.label for row in rows], [row.text for row in rows], [row.url for row in rows],
+                   [row.source for row in rows], [row.published for row in rows],
+                   [row.extraction_version for row in rows]]
+        self._writer.write_batch(self._pa.record_batch(columns, schema=self._schema))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self._writer.close()
+
+
+class BatchedSink:
+    """Buffers rows and writes them to every sink in ``sinks`` in batches."""
+
+    def __init__(self, sinks, batch_rows=DEFAULT_BATCH_ROWS, flush_seconds=DEFAULT_FLUSH_SECONDS):
+        self.sinks = sinks
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_seconds
+        self._rows = []
+        self._last_flush = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_rows or time.monotonic() - self._last_flush >= self.flush_seconds:
+            self._write_rows()
+
+    def _write_rows(self):
+        if self._rows:
+            for sink in self.sinks:
+                sink.write_batch(self._rows)
+            self._rows = []
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        """Write out the buffered rows and push them to the operating system."""
+        self._write_rows()
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            for sink in self.sinks:
+                sink.close()
+
+
+def open_sink(csv_path, formats=('csv',), resume=False, batch_rows=DEFAULT_BATCH_ROWS,
+              flush_seconds=DEFAULT_FLUSH_SECONDS):
+    """A ``BatchedSink`` writing ``csv_path`` and, per extra format, a dataset directory next to it.
+
+    ``gma_nation.csv`` with ``formats=('csv', 'parquet')`` also writes
+    ``gma_nation.parquet/part-*.parquet``.
+    """
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown output format(s) {', '.join(sorted(unknown))}; expected {', '.join(FORMATS)}")
+    base = os.path.splitext(csv_path)[0]
+    sinks = []
+    try:
+        for output_format in formats:
+            if output_format == 'csv':
+                sinks.append(CsvSink(csv_path, resume))
+            else:
+                sinks.append(ArrowSink(f'{base}.{output_format}', output_format, resume))
+    except BaseException:
+        for sink in sinks:
+            sink.close()
+        raise
+    return BatchedSink(sinks, batch_rows, flush_seconds)
@@ -0,0 +1,163 @@
+"""Pluggable HTML parsing for article pages.
+
+``parse_html`` returns a small ``Node`` wrapper with CSS ``select``/
+``select_one``, ``text`` and ``attr``, so the site extractors are written once
+and can run on any of these backends:
+
+``html.parser``
+    BeautifulSoup with the pure-Python tree builder (the original behaviour).
+``lxml``
+    BeautifulSoup on the C ``lxml`` tree builder.
+``selectolax``
+    The lexbor-based ``selectolax`` parser, with its own CSS engine.
+
+For the BeautifulSoup backends ``targets`` restricts the tree that is built
+to the few elements an extractor reads (SoupStrainer-style), which saves most
+of the parse time and memory on large pages. ``selectolax`` always builds the
+full tree; it is fast enough that restricting it does not pay off.
+BeautifulSoup itself is only imported once one of its backends is used.
+"""
+
+from functools import lru_cache
+
+DEFAULT_BACKEND = 'html.parser'
+BACKENDS = ('html.parser', 'lxml', 'selectolax')
+
+
+def available_backends():
+    """The backends whose libraries are importable here."""
+    available = ['html.parser']
+    try:
+        import lxml  # noqa: F401
+        available.append('lxml')
+    except ImportError:
+        pass
+    try:
+        import selectolax  # noqa: F401
+        available.append('selectolax')
+    except ImportError:
+        pass
+    return available
+
+
+def _wanted(targets, name, attrs):
+    classes = (attrs or {}).get('class') or ''
+    if isinstance(classes, str):
+        classes = classes.split()
+    return any(name == tag and (css_class is None or css_class in classes) for tag, css_class in targets)
+
+
+@lru_cache(maxsize=None)
+def _target_strainer():
+    """The callable that builds the ``parse_only`` strainer for a list of targets."""
+    from bs4 import SoupStrainer
+
+    if not hasattr(SoupStrainer, 'allow_tag_creation'):
+        return lambda targets: SoupStrainer(lambda name, attrs=None: _wanted(targets, name, attrs))
+
+    # BeautifulSoup >= 4.13 asks the strainer about every top-level tag and string
+    class TargetStrainer(SoupStrainer):
+        """Keep only elements matching one of ``targets`` ((tag, class or None) pairs) and their contents."""
+
+        def __init__(self, targets):
+            super().__init__()
+            self.targets = targets
+
+        def allow_tag_creation(self, nsprefix, name, attrs):
+            return _wanted(self.targets, name, attrs)
+
+        def allow_string_creation(self, string):
+            return False
+
+    return TargetStrainer
+
+
+class SoupNode:
+    """``Node`` interface over a BeautifulSoup tag."""
+
+    __slots__ = ('_tag',)
+
+    def __init__(self, tag):
+        self._tag = tag
+
+    @property
+    def tag(self):
+        return self._tag.name
+
+    def select(self, css):
+        return [SoupNode(tag) for tag in self._tag.select(css)]
+
+    def select_one(self, css):
+        tag = self._tag.select_one(css)
+        return SoupNode(tag) if tag is not None else None
+
+    def children(self):
+        return [SoupNode(tag) for tag in self._tag.find_all(True, recursive=False)]
+
+    def text(self, strip=False):
+        """All descendant text; with ``strip`` each text node is stripped and they are joined as-is."""
+        return self._tag.get_text(strip=strip)
+
+    def string(self):
+        """BeautifulSoup's ``.string``: the one text node the element (or its only child) holds, else None."""
+        string = self._tag.string
+        return None if string is None else str(string)
+
+    def attr(self, name):
+        return self._tag.get(name)
+
+
+class LexborNode:
+    """``Node`` interface over a selectolax node."""
+
+    __slots__ = ('_node',)
+
+    def __init__(self, node):
+        self._node = node
+
+    @property
+    def tag(self):
+        return self._node.tag
+
+    def select(self, css):
+        return [LexborNode(node) for node in self._node.css(css)]
+
+    def select_one(self, css):
+        node = self._node.css_first(css)
+        return LexborNode(node) if node is not None else None
+
+    def children(self):
+        return [LexborNode(node) for node in self._node.iter() if node.tag != '-text']
+
+    def text(self, strip=False):
+        return self._node.text(deep=True, separator='', strip=strip)
+
+    def string(self):
+        node = self._node
+        while True:
+            child = node.child
+            if child is None or child.next is not None:
+                return None
+            if child.tag == '-text':
+                return child.text_content
+            node = child
+
+    def attr(self, name):
+        return self._node.attributes.get(name)
+
+
+def parse_html(html, backend=DEFAULT_BACKEND, targets=None):
+    """Parse ``html`` with ``backend`` and return the root ``Node``.
+
+    ``targets`` is a list of ``(tag, css_class)`` pairs (``css_class`` may be
+    None) naming the only elements the caller will look at.
+    """
+    if backend == 'selectolax':
+        from selectolax.lexbor import LexborHTMLParser
+        return LexborNode(LexborHTMLParser(html).root)
+    if backend not in ('html.parser', 'lxml'):
+        raise ValueError(f"Unknown parser backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    from bs4 import BeautifulSoup
+
+    parse_only = _target_strainer()(targets) if targets else None
+    return SoupNode(BeautifulSoup(html, backend, parse_only=parse_only))
@@ -0,0 +1,140 @@
+"""Parsing stage that runs on worker processes, decoupled from fetching.
+
+Fetching is I/O bound and runs on ``FetchPool`` threads; parsing and the
+regex work in the extractors are CPU bound and, on threads, would serialise on
+the GIL. ``ParsePool`` takes the stream of ``FetchResult`` from the fetchers,
+hands the HTML of every successful page to a ``ProcessPoolExecutor`` running
+the site extractor, and yields ``(result, article)`` pairs in the original
+order to the single writer loop.
+
+Backpressure: ``ParsePool.parse`` pulls a new fetch result only when fewer
+than ``max_pending`` pages are waiting to be parsed, and ``FetchPool.fetch``
+only starts a new download when its own window has room, so memory stays
+bounded however long the URL stream is.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .parsing import DEFAULT_BACKEND
+
+
+def _timed(extractor, html, args, backend):
+    """Run the extractor and also return how long it took, measured where it ran."""
+    started = time.perf_counter()
+    article = extractor(html, *args, backend=backend)
+    return article, time.perf_counter() - started
+
+
+class _Done:
+    """Stands in for a future when no parsing is needed or it ran inline."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def result(self):
+        return self.value
+
+    def cancel(self):
+        return False
+
+
+def _settle(result, future):
+    """The article from a parse, or None with the exception in ``result.error`` when the parse failed."""
+    try:
+        article, result.parse_seconds = future.result()
+    except Exception as exc:
+        # An extractor error or a broken worker process loses this article, not the crawl
+        result.error = exc
+        return None
+    return article
+
+
+class ParsePool:
+    """Run ``extractor(html, *args, backend=...)`` over fetched pages on worker processes.
+
+    ``workers=0`` parses inline in the calling process, which is the cheaper
+    choice for short runs where starting processes is not worth it.
+    """
+
+    def __init__(self, extractor, workers=None, backend=DEFAULT_BACKEND, max_pending=None):
+        self.extractor = extractor
+        self.backend = backend
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending or 4 * max(self.workers, 1)
+        self._executor = None
+        if self.workers:
+            # Spawned, not forked: the pool is shared by crawl threads, and forking a threaded
+            # process can copy a lock some other thread holds into the worker
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _submit(self, result, args):
+        if not result.ok:
+            return _Done((None, None))
+        try:
+            if self._executor is None:
+                return _Done(_timed(self.extractor, result.text, args, self.backend))
+            return self._executor.submit(_timed, self.extractor, result.text, args, self.backend)
+        except Exception as exc:
+            result.error = exc
+            return _Done((None, None))
+
+    async def parse_one(self, result, *args):
+        """Parse one fetch result from a coroutine; returns the article and sets ``result.parse_seconds``.
+
+        As in ``parse``, a failed parse returns None with the exception in ``result.error``.
+        """
+        future = self._submit(result, args)
+        if isinstance(future, _Done):
+            return _settle(result, future)
+        try:
+            article, result.parse_seconds = await asyncio.wrap_future(future)
+        except Exception as exc:
+            result.error = exc
+            return None
+        return article
+
+    def parse(self, results, *args):
+        """Yield ``(result, article)`` for every fetch result, in order.
+
+        ``args`` are passed to the extractor after the HTML (the site spec, for
+        ``extract_article``), so one pool can serve several sources.
+        ``article`` is None for results that are not a 200 response, and for
+        pages whose parse raised, with the exception stored in
+        ``result.error``. The extractor's run time is stored in
+        ``result.parse_seconds``. Breaking out of the loop cancels the parses
+        that have not started.
+        """
+        results = iter(results)
+        pending = deque()
+        try:
+            while True:
+                while len(pending) < self.max_pending:
+                    result = next(results, None)
+                    if result is None:
+                        break
+                    pending.append((result, self._submit(result, args)))
+                if not pending:
+                    return
+                result, future = pending.popleft()
+                yield result, _settle(result, future)
+        finally:
+            for _, future in pending:
+                future.cancel()
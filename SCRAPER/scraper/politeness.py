@@ -0,0 +1,228 @@
+"""Per-domain politeness: rate limits, robots.txt and backing off when throttled.
+
+Every request ``FetchPool`` makes first calls ``Politeness.acquire``, which
+blocks until the host may be contacted again:
+
+* Each host has a token bucket refilled at ``rate`` requests per second (at
+  most ``burst`` saved up). Waiters reserve their token before sleeping, so
+  concurrent workers are spaced out instead of waking up together.
+* The host's ``robots.txt`` is read once. A ``Crawl-delay`` (or
+  ``Request-rate``) lowers the rate to what it asks for, and disallowed
+  paths are refused without a request.
+* ``record`` feeds back every outcome. A final 429/503 or a ``Retry-After``
+  header halves the host's rate and pauses it for as long as the server
+  asked. Retries spent inside the session and network errors feed a moving
+  error rate; while that is above ``ERROR_THRESHOLD`` the rate keeps easing
+  off. Successes raise the rate back towards ``rate`` step by step.
+
+Hosts are independent, so a slow or throttled site never holds up the others.
+"""
+
+import email.utils
+import logging
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+
+import requests
+
+from .session import USER_AGENT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE = 4.0
+MIN_RATE = 0.2
+# Share of the configured rate won back per successful request after a slowdown
+RECOVERY_STEP = 0.05
+# Moving error rate (weight of the latest request: ERROR_WEIGHT) above which a host is slowed down
+ERROR_WEIGHT = 0.1
+ERROR_THRESHOLD = 0.2
+ERROR_SLOWDOWN = 0.8
+THROTTLE_STATUSES = (429, 503)
+ROBOTS_TIMEOUT = 10
+
+
+class DisallowedByRobots(Exception):
+    """The host's robots.txt does not allow fetching the URL."""
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a ``Retry-After`` header (delta seconds or an HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class TokenBucket:
+    """``rate`` tokens per second, holding at most ``burst``. Not locked; ``HostPolicy`` serialises it."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def reserve(self, now):
+        """Take a token and return how long to wait before using it.
+
+        The balance may go negative: later callers then wait for the tokens
+        reserved ahead of them too.
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def take(self, now):
+        """Take a token only if one is there now; True when it was."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class HostPolicy:
+    """Rate, pause and robots rules for one host."""
+
+    def __init__(self, host, rate, burst):
+        self.host = host
+        self.base_rate = rate
+        self.bucket = TokenBucket(rate, burst)
+        self.paused_until = 0.0
+        self.robots = None
+        self.lock = threading.Lock()
+        self.robots_lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.error_rate = 0.0
+
+    def set_base_rate(self, rate):
+        with self.lock:
+            self.base_rate = min(self.base_rate, rate)
+            self.bucket.rate = min(self.bucket.rate, self.base_rate)
+            self.bucket.burst = min(self.bucket.burst, max(1, self.base_rate))
+            self.bucket.tokens = min(self.bucket.tokens, self.bucket.burst)
+
+    def reserve(self):
+        with self.lock:
+            now = time.monotonic()
+            self.requests += 1
+            return max(self.paused_until - now, self.bucket.reserve(now))
+
+    def try_reserve(self):
+        with self.lock:
+            now = time.monotonic()
+            if now < self.paused_until or not self.bucket.take(now):
+                return False
+            self.requests += 1
+            return True
+
+    def throttle(self, pause=None):
+        """The server asked us to back off."""
+        with self.lock:
+            self.throttled += 1
+            self.bucket.rate = max(MIN_RATE, self.bucket.rate / 2)
+            if pause:
+                self.paused_until = max(self.paused_until, time.monotonic() + pause)
+
+    def outcome(self, failed):
+        with self.lock:
+            self.error_rate += ERROR_WEIGHT * (failed - self.error_rate)
+            if self.error_rate > ERROR_THRESHOLD:
+                self.bucket.rate = max(MIN_RATE, self.bucket.rate * ERROR_SLOWDOWN)
+            elif not failed:
+                self.bucket.rate = min(self.base_rate, self.bucket.rate + self.base_rate * RECOVERY_STEP)
+
+
+class Politeness:
+    """Per-host token buckets, robots.txt rules and throttling feedback, shared by all fetch workers."""
+
+    def __init__(self, session, rate=DEFAULT_RATE, burst=None, respect_robots=True, user_agent=USER_AGENT):
+        self.session = session
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.respect_robots = respect_robots
+        self.user_agent = user_agent
+        self._policies = {}
+        self._lock = threading.Lock()
+
+    def policy(self, url):
+        parts = urlsplit(url)
+        with self._lock:
+            policy = self._policies.get(parts.netloc)
+            if policy is None:
+                policy = self._policies[parts.netloc] = HostPolicy(parts.netloc, self.rate, self.burst)
+        if self.respect_robots and policy.robots is None:
+            with policy.robots_lock:
+                if policy.robots is None:
+                    self._load_robots(policy, parts.scheme)
+        return policy
+
+    def _load_robots(self, policy, scheme):
+        robots = RobotFileParser()
+        robots_url = urlunsplit((scheme, policy.host, '/robots.txt', '', ''))
+        try:
+            response = self.session.get(robots_url, timeout=ROBOTS_TIMEOUT)
+        except requests.exceptions.RequestException as exc:
+            logger.warning("Could not read %s (%s); assuming everything is allowed.", robots_url, exc)
+            response = None
+        if response is not None and response.status_code == 200:
+            robots.parse(response.text.splitlines())
+        else:
+            # Missing or unreadable robots.txt: nothing is disallowed
+            robots.allow_all = True
+
+        delay = robots.crawl_delay(self.user_agent)
+        request_rate = robots.request_rate(self.user_agent)
+        if delay:
+            policy.set_base_rate(1 / float(delay))
+        if request_rate and request_rate.requests:
+            policy.set_base_rate(request_rate.requests / request_rate.seconds)
+        policy.robots = robots
+
+    def reserve(self, url):
+        """Take the next turn to contact ``url``'s host; returns the seconds to wait for it.
+
+        Raises ``DisallowedByRobots``. Reads robots.txt first if the host is new.
+        """
+        policy = self.policy(url)
+        if self.respect_robots and not policy.robots.can_fetch(self.user_agent, url):
+            raise DisallowedByRobots(f"Disallowed by {policy.host}/robots.txt: {url}")
+        return policy.reserve()
+
+    def acquire(self, url):
+        """Block until ``url``'s host may be contacted. Raises ``DisallowedByRobots``."""
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    def try_acquire(self, url):
+        """Take a turn to contact ``url``'s host only if one is free right now, for optional requests like hedges."""
+        policy = self.policy(url)
+        if self.respect_robots and not policy.robots.can_fetch(self.user_agent, url):
+            return False
+        return policy.try_reserve()
+
+    def record(self, url, status_code=None, retry_after=None, retries=0, error=False):
+        """Adjust ``url``'s host after a request: slow down on throttling or errors, speed up otherwise."""
+        policy = self.policy(url)
+        pause = parse_retry_after(retry_after)
+        if pause is not None or status_code in THROTTLE_STATUSES:
+            policy.throttle(pause)
+        policy.outcome(bool(error or retries or (status_code or 0) >= 500))
+
+    def stats(self):
+        """``{host: (current rate, requests, throttled responses)}``."""
+        with self._lock:
+            policies = list(self._policies.values())
+        return {policy.host: (policy.bucket.rate, policy.requests, policy.throttled) for policy in policies}
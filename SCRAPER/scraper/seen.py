@@ -0,0 +1,158 @@
+"""Compact sets of seen URLs, for crawls of hundreds of thousands of articles.
+
+A Python ``set`` of URL strings costs well over 100 bytes per URL and has to
+hold every URL of every source. Here a URL is reduced to a 64-bit hash of its
+normalized form (``url_hash``) and kept in one of two structures:
+
+``HashSet``
+    An exact set of hashes: a sorted ``array`` of 8 bytes per URL plus a
+    small unsorted buffer that is merged in as it grows. Two different URLs
+    share a hash with probability about n² / 2^65, under one in a million
+    for the first six million URLs, which is treated as exact.
+``SeenUrls``
+    A scalable Bloom filter (1.2 bytes per URL at the default 1%
+    false-positive rate, up to about twice that while its newest filter is
+    filling) in front of an exact store, such as the SQLite
+    table of ``CrawlState``. A URL the filter has never seen is answered
+    without touching the store; only the rare false positive, and the URLs
+    that really were seen, cost a lookup. Answers are exact whenever a store
+    is given; without one, at most ``fp_rate`` of unseen URLs are reported
+    as seen.
+
+The filter starts at ``capacity`` URLs and adds a filter twice as large, with
+half the error rate, each time the last one fills up, so the combined
+false-positive rate stays below ``fp_rate`` however many URLs are added.
+"""
+
+import math
+from array import array
+from bisect import bisect_left
+from hashlib import blake2b
+
+DEFAULT_FP_RATE = 0.01
+DEFAULT_CAPACITY = 1 << 16
+# Each added filter gets this fraction of the previous one's error rate; the rates sum to fp_rate
+TIGHTENING = 0.5
+DEFAULT_PORTS = {'http': ':80', 'https': ':443'}
+
+
+def normalize_url(url):
+    """``url`` with its scheme and host lowercased and the default port and fragment dropped."""
+    scheme, separator, rest = url.strip().partition('://')
+    if not separator:
+        return url.strip().partition('#')[0]
+    scheme = scheme.lower()
+    host, slash, path = rest.partition('/')
+    host = host.lower()
+    if host.endswith(DEFAULT_PORTS.get(scheme, '\0')):
+        host = host.rpartition(':')[0]
+    return f"{scheme}://{host}/{path.partition('#')[0]}"
+
+
+def url_hash(url):
+    """64-bit hash of the normalized ``url``."""
+    return int.from_bytes(blake2b(normalize_url(url).encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class HashSet:
+    """Exact set of 64-bit hashes in a sorted array of 8 bytes each."""
+
+    def __init__(self, hashes=()):
+        self._sorted = array('Q', sorted(set(hashes)))
+        self._recent = set()
+
+    def __len__(self):
+        return len(self._sorted) + len(self._recent)
+
+    def __contains__(self, value):
+        if value in self._recent:
+            return True
+        index = bisect_left(self._sorted, value)
+        return index < len(self._sorted) and self._sorted[index] == value
+
+    def add(self, value):
+        """Add ``value``; True if it was not in the set yet."""
+        if value in self:
+            return False
+        self._recent.add(value)
+        # Merged once the buffer reaches an eighth of the array, so merging stays amortized O(log n) per add
+        if len(self._recent) >= max(4096, len(self._sorted) // 8):
+            self._sorted = array('Q', sorted(self._sorted.tolist() + list(self._recent)))
+            self._recent.clear()
+        return True
+
+    def clear(self):
+        self._sorted = array('Q')
+        self._recent.clear()
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter for ``capacity`` 64-bit hashes at ``fp_rate`` false positives."""
+
+    def __init__(self, capacity, fp_rate):
+        self.capacity = capacity
+        self.bits = max(64, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.probes = max(1, round(self.bits / capacity * math.log(2)))
+        self.count = 0
+        self._array = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, value):
+        # Double hashing (Kirsch-Mitzenmacher): the two 32-bit halves give every probe position
+        first, second = value & 0xFFFFFFFF, (value >> 32) | 1
+        return [(first + probe * second) % self.bits for probe in range(self.probes)]
+
+    def __contains__(self, value):
+        return all(self._array[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self._array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    @property
+    def size_bytes(self):
+        return len(self._array)
+
+
+class SeenUrls:
+    """Seen URLs in a scalable Bloom filter, confirmed by ``exact(url)`` when one is given.
+
+    ``exact`` is a function returning whether a URL is really in the set,
+    usually a database lookup. ``add`` only records the URL in the filter;
+    keeping the exact store up to date is the caller's business.
+    """
+
+    def __init__(self, urls=(), exact=None, capacity=DEFAULT_CAPACITY, fp_rate=DEFAULT_FP_RATE):
+        self.exact = exact
+        self.fp_rate = fp_rate
+        self._filters = [BloomFilter(capacity, fp_rate * (1 - TIGHTENING))]
+        for url in urls:
+            self.add(url)
+
+    def __len__(self):
+        return sum(bloom.count for bloom in self._filters)
+
+    def add(self, url):
+        self.add_hash(url_hash(url))
+
+    def add_hash(self, value):
+        current = self._filters[-1]
+        if current.count >= current.capacity:
+            fp_rate = self.fp_rate * (1 - TIGHTENING) * TIGHTENING ** len(self._filters)
+            current = BloomFilter(current.capacity * 2, fp_rate)
+            self._filters.append(current)
+        current.add(value)
+
+    def might_contain(self, url):
+        """False when ``url`` was certainly never added; True for added URLs and at most ``fp_rate`` of others."""
+        value = url_hash(url)
+        return any(value in bloom for bloom in self._filters)
+
+    def __contains__(self, url):
+        if not self.might_contain(url):
+            return False
+        return self.exact(url) if self.exact is not None else True
+
+    @property
+    def size_bytes(self):
+        return sum(bloom.size_bytes for bloom in self._filters)
@@ -0,0 +1,80 @@
+"""Run options shared by every source of a crawl.
+
+``CrawlSettings`` lives apart from ``engine`` so the command line can build
+its defaults without importing the crawl machinery; ``engine`` re-exports it.
+"""
+
+import os
+from dataclasses import dataclass
+
+from .browser import DEFAULT_BROWSERS
+from .fetch import CONNECT_TIMEOUT, DEFAULT_CONCURRENCY, DEFAULT_PER_HOST, DEFAULT_TIMEOUT, TOTAL_TIMEOUT
+from .output import DEFAULT_BATCH_ROWS, DEFAULT_FLUSH_SECONDS, open_sink
+from .politeness import DEFAULT_RATE
+from .sitemaps import DEFAULT_SHARD_MONTHS
+
+
+@dataclass
+class CrawlSettings:
+    """Run options that apply to every source."""
+
+    # 'http' reads the listing directly and only starts Chrome if it fails; 'selenium' always uses Chrome;
+    # 'sitemap' reads the sources' sitemaps in date shards, for backfills (sources with a sitemap_pattern)
+    discovery_mode: str = 'http'
+    # Months per sitemap date shard; finished shards are not read again by resumed runs
+    shard_months: int = DEFAULT_SHARD_MONTHS
+    # Headless Chrome instances shared by the sources' browser listings, started only when needed
+    browser_instances: int = DEFAULT_BROWSERS
+    # Keep images, media, fonts, ads and other sites' scripts out of those browsers
+    block_browser_resources: bool = True
+    # Number of article pages fetched at the same time, per source and per host
+    fetch_concurrency: int = DEFAULT_CONCURRENCY
+    per_host_limit: int = DEFAULT_PER_HOST
+    # Grow and shrink each host's concurrency up to per_host_limit from its latency and errors,
+    # instead of always using per_host_limit
+    adaptive_concurrency: bool = True
+    # Send an article request again when it is slower than the host's usual p95; the first answer wins
+    hedge_requests: bool = True
+    # Seconds to connect, between reads of a response, and for a whole request
+    connect_timeout: float = CONNECT_TIMEOUT
+    read_timeout: float = DEFAULT_TIMEOUT
+    total_timeout: float = TOTAL_TIMEOUT
+    # Requests per second allowed per host; robots.txt Crawl-delay and throttling lower it
+    requests_per_second: float = DEFAULT_RATE
+    respect_robots: bool = True
+    # HTML parser for article pages: 'html.parser', 'lxml' or 'selectolax'
+    parser_backend: str = 'lxml'
+    # Worker processes that parse article pages; None is one per CPU, 0 parses inline
+    parse_workers: int = None
+    # SQLite file recording which articles are done, so an interrupted run can pick up where it stopped
+    state_path: str = 'crawl_state.sqlite'
+    # Distributed crawls (``distributed``): the shared frontier of article URLs, a SQLite file or a
+    # tcp://HOST:PORT served by serve_frontier, and the directory of the workers' output shards
+    frontier_path: str = 'crawl_frontier.sqlite'
+    shard_dir: str = 'shards'
+    # Append to the existing CSV and skip finished articles instead of starting over
+    resume: bool = True
+    # Only pick up stories published since the last run: start from the first listing page,
+    # request pages seen before conditionally and stop at the first article already saved
+    incremental: bool = False
+    # Directory for the CSV files; the current directory when None
+    output_dir: str = None
+    # 'csv' plus optionally 'parquet' and/or 'arrow' (with url, source, date and extraction version columns)
+    output_formats: tuple = ('csv',)
+    # Rows are written out in batches of this many, or after this many seconds
+    batch_rows: int = DEFAULT_BATCH_ROWS
+    flush_seconds: float = DEFAULT_FLUSH_SECONDS
+    # Compressed archive of every fetched article page, for re-extracting offline; None keeps no copy
+    archive_dir: str = 'html_archive'
+    # 'DEBUG' logs every article as it is handled; 'INFO' only what ends or summarises a crawl
+    log_level: str = 'INFO'
+    # Live one-line summary of the crawl on stderr
+    progress: bool = True
+    # Serve the crawl metrics on http://127.0.0.1:<port>/metrics (Prometheus) and /metrics.json; None is off
+    metrics_port: int = None
+
+    def output_path(self, spec):
+        return os.path.join(self.output_dir, spec.output) if self.output_dir else spec.output
+
+    def open_sink(self, spec, resume):
+        return open_sink(self.output_path(spec), self.output_formats, resume, self.batch_rows, self.flush_seconds)
@@ -0,0 +1,239 @@
+"""Sitemap discovery for bulk backfills, split into date shards.
+
+Scrolling a listing from today back to 2021 means walking years of pages in
+order. The outlets' XML sitemaps list the same articles with their dates, so
+``sitemap_listing`` reads those instead:
+
+1. The sitemap index (``SiteSpec.sitemap_urls``, else the ``Sitemap:`` lines
+   of robots.txt, else ``/sitemap.xml``) is read, following nested indexes.
+2. The date window is cut into shards of ``shard_months`` months. A child
+   sitemap whose URL names its period (``sitemap-2024-05.xml``,
+   ``/2024/05/``, ...) is only read when the first shard it overlaps is
+   crawled; one whose ``lastmod`` is before the window is skipped; any other
+   is read up front. Entries are dealt out to the shards by date. Child sitemaps are fetched concurrently on the
+   ``FetchPool``.
+3. Shards are yielded newest first, in batches. A shard a previous run
+   finished (``CrawlState.finished_shards``) is not read again.
+
+An entry's date is its Google News ``publication_date``, else the date in its
+URL, else its ``lastmod``; only URLs matching the source's
+``sitemap_pattern`` are kept. Entries do not come in publication order, so
+the crawl skips out-of-window articles instead of stopping at them.
+"""
+
+import gzip
+import io
+import logging
+import re
+from dataclasses import dataclass
+from datetime import date, timedelta
+from urllib.parse import urljoin, urlsplit
+from xml.etree import ElementTree
+
+from .dates import parse_date, url_date
+from .discovery import ListingItem
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARD_MONTHS = 1
+DEFAULT_BATCH_SIZE = 200
+# Shard key of the entries that carry no date at all
+UNDATED = 'undated'
+# Child sitemaps that never list articles: taxonomies, authors, static pages, media
+SKIP_SITEMAP_RE = re.compile(r'(taxonom|categor|tag|author|user|page-sitemap|posts-page|image|video)', re.IGNORECASE)
+SITEMAP_PERIOD_RE = re.compile(r'((?:19|20)\d{2})(?:[-/_]?(0[1-9]|1[0-2])(?:[-/_]?(0[1-9]|[12]\d|3[01]))?)?(?=\D|$)')
+
+
+@dataclass(frozen=True)
+class Shard:
+    """A range of publication dates, both ends included."""
+
+    start: date
+    end: date
+
+    @property
+    def key(self):
+        return f'{self.start.isoformat()}/{self.end.isoformat()}'
+
+    def __contains__(self, day):
+        return day is not None and self.start <= day <= self.end
+
+    def overlaps(self, start, end):
+        return start <= self.end and self.start <= end
+
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def date_shards(first, last, months=DEFAULT_SHARD_MONTHS):
+    """Shards of ``months`` calendar months covering ``first`` to ``last``, newest first."""
+    shards = []
+    start = date(first.year, first.month, 1)
+    while start <= last:
+        following = _add_months(start, months)
+        shards.append(Shard(max(start, first), min(following - timedelta(days=1), last)))
+        start = following
+    return shards[::-1]
+
+
+def sitemap_period(url):
+    """``(first, last)`` day a child sitemap covers, judging from its URL, or None."""
+    path = urlsplit(url).path
+    match = None
+    for match in SITEMAP_PERIOD_RE.finditer(path):
+        pass
+    if match is None:
+        return None
+    year, month, day = (int(group) if group else None for group in match.groups())
+    if day:
+        try:
+            return date(year, month, day), date(year, month, day)
+        except ValueError:
+            return None
+    if month:
+        return date(year, month, 1), _add_months(date(year, month, 1), 1) - timedelta(days=1)
+    return date(year, 1, 1), date(year, 12, 31)
+
+
+def parse_sitemap(content):
+    """``(is_index, [(loc, lastmod, publication_date), ...])`` from a sitemap or sitemap index.
+
+    Gzipped sitemaps are decompressed; namespaces are ignored.
+    """
+    if content[:2] == b'\x1f\x8b':
+        content = gzip.decompress(content)
+    entries = []
+    is_index = False
+    fields = {}
+    for _, element in ElementTree.iterparse(io.BytesIO(content), events=('end',)):
+        tag = element.tag.rsplit('}', 1)[-1]
+        if tag in ('loc', 'lastmod', 'publication_date'):
+            fields[tag] = (element.text or '').strip()
+        elif tag in ('url', 'sitemap'):
+            is_index = is_index or tag == 'sitemap'
+            if fields.get('loc'):
+                entries.append((fields['loc'], fields.get('lastmod'), fields.get('publication_date')))
+            fields = {}
+            element.clear()
+    return is_index, entries
+
+
+def entry_date(loc, lastmod=None, publication_date=None):
+    """The date a sitemap entry is filed under: its publication date, else its URL's, else ``lastmod``."""
+    return parse_date(publication_date) or url_date(loc) or parse_date(lastmod)
+
+
+def index_urls(fetch_pool, spec):
+    """Where ``spec``'s sitemaps start: its own list, robots.txt's ``Sitemap:`` lines, or ``/sitemap.xml``."""
+    if spec.sitemap_urls:
+        return list(spec.sitemap_urls)
+    robots = fetch_pool.politeness.policy(spec.base_url).robots if fetch_pool.politeness.respect_robots else None
+    listed = robots.site_maps() if robots is not None else None
+    return listed or [urljoin(spec.base_url, '/sitemap.xml')]
+
+
+def _read(fetch_pool, urls, failed):
+    """Yield ``(url, is_index, entries)`` for the sitemaps in ``urls``, fetched concurrently.
+
+    The URLs of sitemaps that could not be fetched or parsed are added to ``failed``.
+    """
+    for result in fetch_pool.fetch(urls, ordered=False, raw=True):
+        if not result.ok:
+            logger.warning("Could not read sitemap %s: %s", result.url, result.error or result.status_code)
+            failed.append(result.url)
+            continue
+        try:
+            yield (result.url, *parse_sitemap(result.content))
+        except (ElementTree.ParseError, OSError, EOFError) as exc:
+            logger.warning("Could not parse sitemap %s: %s", result.url, exc)
+            failed.append(result.url)
+
+
+def sitemap_listing(fetch_pool, spec, shard_months=DEFAULT_SHARD_MONTHS, finished=(), batch_size=DEFAULT_BATCH_SIZE):
+    """Yield ``(shard_key, items, shard_complete)`` for the unfinished shards of ``spec``'s window, newest first.
+
+    ``items`` are ``ListingItem``s with the entry's date (see ``entry_date``)
+    as ``date_text`` and ``lastmod`` as ``modified``, at most ``batch_size`` per
+    batch; ``shard_complete`` is true on the last batch of a shard, unless
+    a sitemap that shard needed could not be read, so a later run tries the
+    shard again. Entries without any date come last, in the ``UNDATED``
+    shard.
+    """
+    if not spec.sitemap_pattern:
+        raise ValueError(f"{spec.name} has no sitemap_pattern, so its articles cannot be told apart in sitemaps")
+    pattern = re.compile(spec.sitemap_pattern)
+    first, last = spec.window
+    finished = set(finished)
+    shards = [shard for shard in date_shards(first, last, shard_months) if shard.key not in finished]
+    shard_items = {shard.key: [] for shard in shards}
+    if UNDATED not in finished:
+        shard_items[UNDATED] = []
+    if not shard_items:
+        return
+
+    # Walk the indexes down to the sitemaps that list articles. Those named after a period
+    # are kept for their shards; the others are read now and dealt out to every shard
+    by_period = {}
+    # Sitemaps that could not be read; every shard may have had entries in those from the walk
+    walk_failed = []
+    pending, seen = index_urls(fetch_pool, spec), set()
+    while pending:
+        seen.update(pending)
+        children = []
+        for _, is_index, entries in _read(fetch_pool, pending, walk_failed):
+            if not is_index:
+                _deal(entries, shards, shard_items, pattern)
+                continue
+            for loc, lastmod, _ in entries:
+                if loc in seen or SKIP_SITEMAP_RE.search(urlsplit(loc).path):
+                    continue
+                period = sitemap_period(loc)
+                modified = parse_date(lastmod)
+                if period is not None:
+                    if period[1] >= first and period[0] <= last:
+                        by_period[loc] = period
+                elif modified is None or modified >= first:
+                    children.append(loc)
+        pending = children
+
+    if len(walk_failed) == len(seen):
+        logger.warning("No sitemap of %s could be read.", spec.name)
+        return
+
+    # Shards a period sitemap was read for and failed; later shards it spans need it too
+    failed_periods = []
+    for shard in shards:
+        # A sitemap spanning several shards is read once, for the first of them
+        sitemaps = [url for url, (start, end) in by_period.items() if shard.overlaps(start, end)]
+        periods = [by_period.pop(url) for url in sitemaps]
+        failed = []
+        for _, _, entries in _read(fetch_pool, sitemaps, failed):
+            _deal(entries, shards, shard_items, pattern)
+        failed_periods += [period for url, period in zip(sitemaps, periods) if url in failed]
+        complete = not walk_failed and not any(shard.overlaps(*period) for period in failed_periods)
+        yield from _batches(shard.key, shard_items.pop(shard.key), batch_size, complete)
+    if UNDATED in shard_items:
+        yield from _batches(UNDATED, shard_items.pop(UNDATED), batch_size, not walk_failed)
+
+
+def _batches(key, items, batch_size, complete):
+    if not items:
+        yield key, [], complete
+    for start in range(0, len(items), batch_size):
+        yield key, items[start:start + batch_size], complete and start + batch_size >= len(items)
+
+
+def _deal(entries, shards, shard_items, pattern):
+    """Add the article entries that fall in one of ``shards``, or have no date, to their shard's list."""
+    for loc, lastmod, publication_date in entries:
+        if not pattern.search(loc):
+            continue
+        day = entry_date(loc, lastmod, publication_date)
+        if day is None:
+            key = UNDATED
+        else:
+            key = next((shard.key for shard in shards if day in shard), None)
+        if key in shard_items:
+            shard_items[key].append(ListingItem(loc, day.isoformat() if day else None, lastmod or None))
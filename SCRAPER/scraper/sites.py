@@ -0,0 +1,171 @@
+"""Registry of the sources the crawler knows how to scrape.
+
+Each ``SiteSpec`` says where a source lists its articles, where an article
+page states its date and body, which label its rows get and which years are
+kept. ``scraper.engine`` runs any of them; adding an outlet means adding a
+spec here (and, only if its pages need more than selectors, an extractor
+function in ``scraper.extractors``).
+"""
+
+from dataclasses import dataclass
+from datetime import date
+
+from .extractors import EXTRACTION_VERSION, extract_tsek
+
+
+@dataclass(frozen=True)
+class DateRule:
+    """Where an article page states its publication date.
+
+    The text of the first element matching ``selector`` is used, or its
+    ``attr`` attribute when one is given.
+    """
+
+    selector: str
+    attr: str = None
+    strip: bool = False
+
+
+@dataclass(frozen=True)
+class SiteSpec:
+    """Everything source-specific the crawl engine needs."""
+
+    name: str
+    label: str
+    base_url: str
+    # Paged listing (JSON feed or HTML page); {page} starts at 1
+    listing_url: str
+    listing_item_selector: str
+    listing_link_selector: str = 'a[href]'
+    # Date element of a listing card, for listings that show one; JSON feeds carry their own dates
+    listing_date_selector: str = None
+    # "Next page" link for sources the browser fallback pages through instead of scrolling
+    next_selector: str = None
+    # Sitemap discovery: the indexes to start from (robots.txt's Sitemap lines when empty) and a
+    # regex the source's article URLs match; sources without a pattern cannot use it
+    sitemap_urls: tuple = ()
+    sitemap_pattern: str = None
+    # Browser fallback: how long to wait for cards, and how long the page must stop adding
+    # elements before a batch of cards is read
+    browser_wait_seconds: int = 15
+    browser_quiet_seconds: float = 0.5
+    # Hosts besides the source's own domain the browser may load from (a CDN serving its listing script)
+    browser_hosts: tuple = ()
+    # Tried in order until one yields a date
+    date_rules: tuple = ()
+    # The first one found holds the body paragraphs
+    body_selectors: tuple = ()
+    keep_empty_paragraphs: bool = False
+    # Regexes (case-insensitive, matched at the start of a paragraph) for this source's own
+    # boilerplate paragraphs, on top of boilerplate.TEASER_PATTERNS
+    boilerplate_patterns: tuple = ()
+    # Replaces date_rules/body_selectors for pages that need more than selectors
+    extractor: object = None
+    first_year: int = 2021
+    last_year: int = 2025
+    # Reject articles without any date element instead of stopping the crawl there
+    skip_undated: bool = False
+    max_articles: int = None
+    output: str = None
+    # Bump when this source's selectors or extractor change what is extracted
+    rules_version: int = 1
+
+    @property
+    def extraction_version(self):
+        """Stored with every row, so rows from older extraction rules can be told apart."""
+        return f'{EXTRACTION_VERSION}.{self.rules_version}'
+
+    @property
+    def window(self):
+        """First and last publication date kept, inclusive."""
+        return date(self.first_year, 1, 1), date(self.last_year, 12, 31)
+
+    def window_position(self, day):
+        """-1 when ``day`` is before the window, 0 inside it, 1 after it; None when there is no date."""
+        if day is None:
+            return None
+        first, last = self.window
+        return -1 if day < first else 1 if day > last else 0
+
+    def in_window(self, day):
+        return self.window_position(day) == 0
+
+
+# Desk sign-offs ("—KBK, GMA Integrated News") and the app and channel promos under GMA stories
+GMA_BOILERPLATE = (
+    r'[—–-]\s*[A-Z]{2,5}(?:/[A-Z]{2,5})*,\s*GMA (?:Integrated )?News\W*$',
+    r'(?:Download the GMA News app|Subscribe to GMA|Follow GMA (?:Integrated )?News)\b',
+)
+
+SITES = {spec.name: spec for spec in (
+    SiteSpec(
+        name='gma-politics',
+        label='1',
+        base_url='https://www.gmanetwork.com/news/tracking/politics/',
+        listing_url='https://data.gmanetwork.com/gno/widgets/grid_reverse_listing/tracking/politics/{page}.gz',
+        # Story cards in the rendered grid, used by the Selenium fallback
+        listing_item_selector='ul#grid_thumbnail_stories li',
+        listing_link_selector='a.story_link',
+        date_rules=(DateRule('time[datetime]', attr='datetime'), DateRule('div.article-date')),
+        body_selectors=('div.story_main', 'div.article-body'),
+        boilerplate_patterns=GMA_BOILERPLATE,
+        max_articles=1600,
+        output='gma_politics_news.csv',
+    ),
+    SiteSpec(
+        name='gma-nation',
+        label='1',
+        base_url='https://www.gmanetwork.com/news/archives/news-nation/',
+        listing_url='https://data.gmanetwork.com/gno/widgets/grid_reverse_listing/archives/news-nation/{page}.gz',
+        listing_item_selector='li.story.left-grid',
+        listing_link_selector='a.story_link.story',
+        # Nation stories are filed under /news/topstories/nation/<id>/<slug>/story/
+        sitemap_pattern=r'gmanetwork\.com/news/(?:topstories/)?nation/\d+/',
+        browser_wait_seconds=20,
+        browser_quiet_seconds=1,
+        date_rules=(DateRule('time'),),
+        body_selectors=('div.story_main',),
+        keep_empty_paragraphs=True,
+        boilerplate_patterns=GMA_BOILERPLATE,
+        first_year=2024,
+        skip_undated=True,
+        max_articles=80000,
+        output='gma_nation.csv',
+    ),
+    SiteSpec(
+        name='philstar-politics',
+        label='1',
+        base_url='https://www.philstar.com/tags/politics',
+        listing_url='https://www.philstar.com/tags/politics?page={page}',
+        # News entries on Philstar tag pages, in both the listing fragments and the rendered page
+        listing_item_selector='div.titleForFeature',
+        # The date div usually reads like "July 16, 2025 | 12:00am"
+        date_rules=(DateRule('div.article__date-published', strip=True),),
+        body_selectors=('div.article__writeup',),
+        max_articles=1000,
+        output='philstar_politics_news.csv',
+    ),
+    SiteSpec(
+        name='tsek',
+        label='0',
+        base_url='https://www.tsek.ph/category/fact-checks/',
+        # WordPress paginates the category as /page/2/, /page/3/, ... and page 1 is the category itself
+        listing_url='https://www.tsek.ph/category/fact-checks/page/{page}/',
+        listing_item_selector='main article',
+        listing_date_selector='footer.entry-meta time, div.entry-meta time',
+        next_selector='a.next.page-numbers',
+        # Posts live at the top level (tsek.ph/<slug>/); archives and pages are under a prefix
+        sitemap_pattern=r'tsek\.ph/(?!(?:category|tag|author|page|about|contact)\b)[\w-]+/?$',
+        extractor=extract_tsek,
+        output='fake.csv',
+        # 2: only a leading CLAIM label is stripped, no longer every CLAIM word of the first paragraph
+        rules_version=2,
+    ),
+)}
+
+
+def get_site(name):
+    try:
+        return SITES[name]
+    except KeyError:
+        raise ValueError(f"Unknown source {name!r}; expected one of {', '.join(SITES)}") from None
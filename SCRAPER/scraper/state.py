@@ -0,0 +1,277 @@
+"""Persistent crawl state so long runs can be stopped and resumed.
+
+``CrawlState`` keeps, per source, every article URL the scraper has handled
+with its outcome, plus the last listing page that was fully processed. It is
+a single SQLite file (WAL mode), so a crash, a ban or Ctrl-C loses at most the
+batch in flight, and a rerun skips every URL that already reached a final
+status instead of fetching it again.
+
+It also keeps the source's ``ETag``/``Last-Modified`` validators of listing
+pages and of articles with a verdict that an unchanged page keeps, so those
+can be requested conditionally, the date
+shards a sitemap crawl has finished, and the source's table of paragraph
+frequencies for the boilerplate filter (``boilerplate.ParagraphCounts``).
+
+Which URLs are done is answered by a ``seen.SeenUrls`` Bloom filter loaded
+from the database, so the URLs a listing shows for the first time, the
+common case, are told apart without a query; the URLs claimed during a run
+are kept as 64-bit hashes in a ``seen.HashSet``.
+
+Writes are buffered in memory and applied in one short transaction by
+``checkpoint``, so several sources crawled at once, each with its own
+``CrawlState`` on the same file, only hold SQLite's write lock for a moment.
+"""
+
+import sqlite3
+import time
+
+from .boilerplate import ParagraphCounts
+from .seen import HashSet, SeenUrls, url_hash
+
+# Seconds a checkpoint waits for another source's checkpoint to release the write lock
+BUSY_TIMEOUT = 60
+
+# Final outcomes: a rerun never fetches these URLs again
+WRITTEN = 'written'
+REJECTED = 'rejected'
+DONE_STATUSES = (WRITTEN, REJECTED)
+# Retried on the next run
+FAILED = 'failed'
+# The article outside the year window that ended a run; fetched again next time
+OUT_OF_RANGE = 'out_of_range'
+# Verdicts that still hold for a page that has not changed: only pages with one keep their validators,
+# so a 304 never leaves an article without a decision
+VERDICT_STATUSES = DONE_STATUSES + (OUT_OF_RANGE,)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    source TEXT NOT NULL,
+    url TEXT NOT NULL,
+    status TEXT NOT NULL,
+    http_status INTEGER,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (source, url)
+);
+CREATE TABLE IF NOT EXISTS validators (
+    source TEXT NOT NULL,
+    url TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    PRIMARY KEY (source, url)
+);
+CREATE TABLE IF NOT EXISTS cursors (
+    source TEXT PRIMARY KEY,
+    cursor TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shards (
+    source TEXT NOT NULL,
+    shard TEXT NOT NULL,
+    finished_at REAL NOT NULL,
+    PRIMARY KEY (source, shard)
+);
+CREATE TABLE IF NOT EXISTS paragraphs (
+    source TEXT NOT NULL,
+    hash INTEGER NOT NULL,
+    articles INTEGER NOT NULL,
+    PRIMARY KEY (source, hash)
+) WITHOUT ROWID;
+"""
+
+
+def _signed(value):
+    """A 64-bit hash as the signed integer SQLite stores."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class CrawlState:
+    """Seen URLs, fetch outcomes and the listing cursor of one source, stored in SQLite."""
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = source
+        self._db = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        # Validators used to be kept per URL for every source; they are only a cache, so the old table goes
+        columns = [row[1] for row in self._db.execute('PRAGMA table_info(validators)')]
+        if columns and 'source' not in columns:
+            self._db.execute('DROP TABLE validators')
+        self._db.executescript(SCHEMA)
+        self._claimed = HashSet()
+        self._done = self._load_done()
+        # Marks, validators and cursor not yet written to the database
+        self._pending_urls = {}
+        self._pending_validators = {}
+        self._pending_cursor = None
+        self._pending_shards = set()
+        # Loaded on first use: only crawls that write articles need it
+        self._paragraphs = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._flush()
+        self._db.close()
+
+    def _load_done(self):
+        rows = self._db.execute(
+            f'SELECT url FROM urls WHERE source = ? AND status IN ({", ".join("?" * len(DONE_STATUSES))})',
+            (self.source, *DONE_STATUSES),
+        )
+        return SeenUrls((row[0] for row in rows), exact=lambda url: self.status(url) in DONE_STATUSES)
+
+    def is_done(self, url):
+        if url in self._pending_urls:
+            return self._pending_urls[url][0] in DONE_STATUSES
+        return url in self._done
+
+    def status(self, url):
+        if url in self._pending_urls:
+            return self._pending_urls[url][0]
+        row = self._db.execute(
+            'SELECT status FROM urls WHERE source = ? AND url = ?', (self.source, url)
+        ).fetchone()
+        return row[0] if row else None
+
+    def claim(self, url):
+        """True the first time ``url`` comes up in this run, unless a previous run finished it."""
+        hashed = url_hash(url)
+        if hashed in self._claimed or self.is_done(url):
+            return False
+        self._claimed.add(hashed)
+        return True
+
+    def mark(self, url, status, http_status=None):
+        self._pending_urls[url] = (status, http_status, time.time())
+        if status in DONE_STATUSES:
+            self._done.add(url)
+
+    def count(self, status=WRITTEN):
+        self._flush()
+        return self._db.execute(
+            'SELECT COUNT(*) FROM urls WHERE source = ? AND status = ?', (self.source, status)
+        ).fetchone()[0]
+
+    def urls(self, status=WRITTEN):
+        """The URLs of the source that last ended with ``status``."""
+        self._flush()
+        return [row[0] for row in self._db.execute(
+            'SELECT url FROM urls WHERE source = ? AND status = ?', (self.source, status))]
+
+    def cursor(self, default=None):
+        if self._pending_cursor is not None:
+            return self._pending_cursor
+        row = self._db.execute(
+            'SELECT cursor FROM cursors WHERE source = ?', (self.source,)
+        ).fetchone()
+        return row[0] if row and row[0] is not None else default
+
+    def set_cursor(self, cursor):
+        self._pending_cursor = str(cursor)
+
+    def finished_shards(self):
+        """Keys of the sitemap date shards finished by this or earlier runs."""
+        rows = self._db.execute('SELECT shard FROM shards WHERE source = ?', (self.source,))
+        return {row[0] for row in rows} | self._pending_shards
+
+    def finish_shard(self, shard):
+        self._pending_shards.add(shard)
+
+    def has_verdict(self, url):
+        """True when ``url`` has a status that an unchanged copy of the page keeps (``VERDICT_STATUSES``)."""
+        return self.status(url) in VERDICT_STATUSES
+
+    def conditional_headers(self, urls, any_status=False):
+        """Map each of ``urls`` with stored validators to its conditional request headers.
+
+        Only URLs with a verdict an unchanged page keeps get them, unless
+        ``any_status`` (incremental crawls, listing pages) asks for all.
+        """
+        headers = {}
+        for url in urls:
+            if not any_status and not self.has_verdict(url):
+                continue
+            row = self._pending_validators.get(url) or self._db.execute(
+                'SELECT etag, last_modified FROM validators WHERE source = ? AND url = ?', (self.source, url)
+            ).fetchone()
+            if row is None:
+                continue
+            etag, last_modified = row
+            headers[url] = {}
+            if etag:
+                headers[url]['If-None-Match'] = etag
+            if last_modified:
+                headers[url]['If-Modified-Since'] = last_modified
+        return headers
+
+    def save_validators(self, url, etag, last_modified):
+        if etag or last_modified:
+            self._pending_validators[url] = (etag, last_modified)
+
+    def paragraph_counts(self):
+        """The source's ``boilerplate.ParagraphCounts``; counts added to it are saved with the other changes."""
+        if self._paragraphs is None:
+            rows = self._db.execute('SELECT hash, articles FROM paragraphs WHERE source = ?', (self.source,))
+            self._paragraphs = ParagraphCounts((value & ((1 << 64) - 1), count) for value, count in rows)
+        return self._paragraphs
+
+    def _flush(self):
+        """Write the buffered changes in one transaction."""
+        with self._db:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO urls (source, url, status, http_status, updated_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(self.source, url, *outcome) for url, outcome in self._pending_urls.items()],
+            )
+            self._db.executemany(
+                'INSERT OR REPLACE INTO validators (source, url, etag, last_modified) VALUES (?, ?, ?, ?)',
+                [(self.source, url, *validators) for url, validators in self._pending_validators.items()],
+            )
+            if self._pending_cursor is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO cursors (source, cursor, updated_at) VALUES (?, ?, ?)',
+                    (self.source, self._pending_cursor, time.time()),
+                )
+            self._db.executemany(
+                'INSERT OR REPLACE INTO shards (source, shard, finished_at) VALUES (?, ?, ?)',
+                [(self.source, shard, time.time()) for shard in self._pending_shards],
+            )
+            if self._paragraphs is not None:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO paragraphs (source, hash, articles) VALUES (?, ?, ?)',
+                    [(self.source, _signed(value), count) for value, count in self._paragraphs.changes()],
+                )
+        self._pending_urls.clear()
+        self._pending_validators.clear()
+        self._pending_cursor = None
+        self._pending_shards.clear()
+
+    def checkpoint(self, output_file=None):
+        """Make everything marked so far durable, after flushing the rows it describes.
+
+        ``output_file`` is anything with ``flush()``: a file or an output sink.
+        """
+        if output_file is not None:
+            output_file.flush()
+        self._flush()
+
+    def reset(self):
+        """Forget everything recorded for this source, for a fresh (non-resumed) run."""
+        self._pending_urls.clear()
+        self._pending_validators.clear()
+        self._pending_cursor = None
+        self._pending_shards.clear()
+        self._db.execute('DELETE FROM urls WHERE source = ?', (self.source,))
+        self._db.execute('DELETE FROM validators WHERE source = ?', (self.source,))
+        self._db.execute('DELETE FROM cursors WHERE source = ?', (self.source,))
+        self._db.execute('DELETE FROM shards WHERE source = ?', (self.source,))
+        self._db.execute('DELETE FROM paragraphs WHERE source = ?', (self.source,))
+        self._db.commit()
+        self._paragraphs = None
+        self._claimed.clear()
+        self._done = self._load_done()